@@ -1,15 +1,27 @@
 from sqlmodel import SQLModel, create_engine, Session
-from sqlalchemy import event
+from sqlalchemy import event, inspect
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import Any, Callable, TypeVar
+import asyncio
 import logging
+import os
+import time
 
 from app.database.models import init_models
+from app.utils.metrics import DB_QUERY_LATENCY, DB_QUERY_ROWS, statement_operation
 
 logger = logging.getLogger(__name__)
 
-DB_PATH = Path(__file__).parent / "ssa_dashboard.db"
+DB_PATH = Path(os.getenv("SSA_DB_PATH", Path(__file__).parent / "ssa_dashboard.db"))
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 
+# Threads available to async routes for blocking DB work (see run_db).
+DB_THREADS = int(os.getenv("DB_THREADS", "8"))
+
+T = TypeVar("T")
+
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False, "timeout": 60},
@@ -24,12 +36,76 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor.execute("PRAGMA busy_timeout=5000;")
     cursor.close()
 
+
+@event.listens_for(engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context: a statement that raises never
+    # reaches _query_finished, and nothing is left behind on the connection.
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start", None)
+    if started is None:
+        return
+    op = statement_operation(statement)
+    DB_QUERY_LATENCY.observe(time.perf_counter() - started, op)
+    if cursor.rowcount > 0:
+        DB_QUERY_ROWS.inc(cursor.rowcount, op)
+
+
+def _add_missing_columns() -> None:
+    # create_all() never alters existing tables; add columns introduced after
+    # the database was created (they must be nullable or have a server_default).
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                ddl = (
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" '
+                    f"{col.type.compile(engine.dialect)}"
+                )
+                if col.server_default is not None:
+                    ddl += f" NOT NULL DEFAULT {col.server_default.arg}"
+                logger.info(f"Adding column {table.name}.{col.name}")
+                conn.exec_driver_sql(ddl)
+
+
 def init_db() -> None:
     if DB_PATH.exists():
-        logger.info(f"Database {DB_PATH} already exists. Skipping creation.")
-        return
+        logger.info(f"Database {DB_PATH} already exists. Creating missing tables only.")
     init_models()
     SQLModel.metadata.create_all(engine)
+    _add_missing_columns()
 
 def get_session() -> Session:
-    return Session(engine)
\ No newline at end of file
+    return Session(engine)
+
+
+def read_snapshot(session: Session) -> None:
+    """
+    Pin the rest of `session`'s reads to one committed state. The sqlite3
+    driver runs SELECTs outside any transaction, so without this each query
+    of a multi-query read may see a different ingest commit. Call before
+    the session's first query; the snapshot ends when the session closes.
+    Only for read-only sessions: a write after it fails if another
+    connection committed in between.
+    """
+    session.connection().exec_driver_sql("BEGIN")
+
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run blocking session code from an async route on the bounded DB thread
+    pool, so SQLite work never runs on the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, partial(fn, *args, **kwargs))
@@ -1,5 +1,7 @@
+from datetime import datetime, timezone
 from typing import Optional
 from uuid import uuid4
+from sqlalchemy import Column, Index, LargeBinary
 from sqlmodel import SQLModel, Field
 import logging
 
@@ -9,12 +11,19 @@ def _uuid() -> str:
     return str(uuid4())
 
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class WeldGroup(SQLModel, table=True):
     id: str = Field(default_factory=_uuid, primary_key=True)
     name: str = Field(index=True, sa_column_kwargs={"unique": True})
     ingest_complete: bool = False
     ingest_error: Optional[str] = None
     status: Optional[str] = None
+    # Bumped whenever the group's stored data changes (ingest finished or
+    # failed); part of the response cache key.
+    ingest_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
 
 class Layer(SQLModel, table=True):
@@ -23,6 +32,8 @@ class Layer(SQLModel, table=True):
     layer_number: int = Field(index=True)
     scandata_file: Optional[str] = None
     welddat_file: Optional[str] = None
+    # IngestJob that created the layer, so an interrupted append can be undone.
+    job_id: Optional[str] = Field(default=None, index=True)
 
 
 class ScanData(SQLModel, table=True):
@@ -51,5 +62,257 @@ class WeldData(SQLModel, table=True):
     current: Optional[float] = None
     voltage: Optional[float] = None
 
+class LayerColumns(SQLModel, table=True):
+    """
+    Packed per-layer sample storage: one row per (layer, kind) holding every
+    column of that kind as a single little-endian blob, column-major.
+    `seq` is implicit (0..n-1).
+    """
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    kind: str = Field(primary_key=True)  # "scan" | "weld"
+    n: int
+    dtype: str  # numpy dtype string, e.g. "<f8"
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+
+class WeldRollupBase(SQLModel):
+    """
+    Mergeable weld metric rollup: count/sum/min/max per metric, so group
+    rollups can be built from layer rollups without touching samples.
+    """
+    n: int = 0
+    wire_feed_rate_count: int = 0
+    wire_feed_rate_sum: Optional[float] = None
+    wire_feed_rate_min: Optional[float] = None
+    wire_feed_rate_max: Optional[float] = None
+    travel_speed_count: int = 0
+    travel_speed_sum: Optional[float] = None
+    travel_speed_min: Optional[float] = None
+    travel_speed_max: Optional[float] = None
+    voltage_count: int = 0
+    voltage_sum: Optional[float] = None
+    voltage_min: Optional[float] = None
+    voltage_max: Optional[float] = None
+    current_count: int = 0
+    current_sum: Optional[float] = None
+    current_min: Optional[float] = None
+    current_max: Optional[float] = None
+
+
+class LayerSummary(WeldRollupBase, table=True):
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id", index=True)
+    layer_number: int = Field(index=True)
+
+
+class GroupSummary(WeldRollupBase, table=True):
+    group_id: str = Field(foreign_key="weldgroup.id", primary_key=True)
+    layer_count: int = 0
+
+
+class ProcessRollupBase(SQLModel):
+    """
+    Mergeable totals of the derived process metrics (see
+    app/services/process_metrics.py): sums, counts and maxima only, so group
+    totals are plain SUM/MAX over the layers.
+    """
+    samples: int = 0
+    arc_time_s: float = 0.0
+    arc_energy_j: float = 0.0
+    arc_power_count: int = 0
+    arc_power_sum: Optional[float] = None
+    arc_power_max: Optional[float] = None
+    heat_input_count: int = 0
+    heat_input_sum: Optional[float] = None
+    heat_input_max: Optional[float] = None
+    wire_length_mm: float = 0.0
+    deposited_mass_g: float = 0.0
+    path_length_mm: float = 0.0
+
+
+class LayerProcess(ProcessRollupBase, table=True):
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id", index=True)
+    layer_number: int
+    # Hash of the `process_vars` config the totals were computed with.
+    params: str
+
+
+class LayerTile(SQLModel, table=True):
+    """
+    Spatial index cell: the points of one layer and kind ("scan" | "weld")
+    that fall in grid cell (ix, iy) of size SPATIAL_TILE_SIZE in x/y, with
+    their exact bounds and their seq numbers as a packed "<u4" array.
+    """
+    __table_args__ = (
+        Index("ix_layertile_group_kind_layer", "group_id", "kind", "layer_number"),
+    )
+
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    kind: str = Field(primary_key=True)
+    ix: int = Field(primary_key=True)
+    iy: int = Field(primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id")
+    layer_number: int
+    n: int
+    min_x: float
+    max_x: float
+    min_y: float
+    max_y: float
+    min_z: float
+    max_z: float
+    seqs: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+
+class LayerTileRun(SQLModel, table=True):
+    """
+    Marks a layer as indexed into `tiles` LayerTile rows (0 for a layer
+    without samples), so a region query never re-checks an indexed layer.
+    """
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id", index=True)
+    tiles: int
+
+
+class LayerSketch(SQLModel, table=True):
+    """
+    Distribution of one weld metric in one layer: a t-digest (see
+    app/utils/tdigest.py) and a fixed-bin histogram with underflow/overflow
+    counts, both mergeable across layers. `hist_min`/`hist_max`/`bins` are
+    the histogram spec the counts were taken with.
+    """
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    metric: str = Field(primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id", index=True)
+    layer_number: int
+    digest: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    hist_min: float
+    hist_max: float
+    bins: int
+    counts: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # "<i8", bins + 2
+
+
+class LayerAnomaly(SQLModel, table=True):
+    """
+    One run of weld samples whose rolling z-score crossed the threshold
+    (see app/services/anomalies.py). `start_seq`..`end_seq` is inclusive;
+    `peak_*` is the sample with the largest |z| and `direction` its sign.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    layer_id: str = Field(foreign_key="layer.id", index=True)
+    group_id: str = Field(foreign_key="weldgroup.id")
+    layer_number: int
+    metric: str
+    direction: str  # high | low
+    start_seq: int
+    end_seq: int
+    samples: int  # flagged samples in the run
+    peak_seq: int
+    peak_value: float
+    peak_z: float
+    baseline_mean: float
+    baseline_std: float
+
+    __table_args__ = (Index("ix_layeranomaly_group_layer", "group_id", "layer_number"),)
+
+
+class LayerAnomalyRun(SQLModel, table=True):
+    """
+    Marks a layer as checked for anomalies with the given parameters (a
+    hash of the resolved `anomalies` config), so layers without any
+    anomaly are not re-analyzed and a config change triggers a rerun.
+    """
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id", index=True)
+    params: str
+    ranges: int
+
+
+class LayerCorrelation(SQLModel, table=True):
+    """
+    Cached scan-to-weld nearest-neighbour join of one layer at one
+    tolerance (see app/services/correlation.py). `weld_seq` holds, per scan
+    sample in seq order, the matched weld sample's seq (-1 when none lies
+    within the tolerance) and `distance` the match distance. `stats` is the
+    per-metric sufficient statistics as JSON; `config` is the config
+    fingerprint the scan values were transformed with.
+    """
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    tolerance: float = Field(primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id", index=True)
+    layer_number: int
+    config: str
+    scan_count: int
+    weld_count: int
+    matched: int
+    weld_seq: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # "<i8"
+    distance: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # "<f4", NaN = none
+    stats: str
+
+
+class LayerHeightmap(SQLModel, table=True):
+    """
+    Mean scan_value per XY cell of one layer at one cell size (see
+    app/services/heightmaps.py). Cells sit on the global lattice
+    (floor(x / cell), floor(y / cell)); the grid covers columns
+    ix0..ix0+nx-1 and rows iy0..iy0+ny-1, row-major "<f4" with NaN for
+    empty cells. `stats` is the height statistics as JSON; `config` the
+    config fingerprint the scan values were transformed with.
+    """
+    layer_id: str = Field(foreign_key="layer.id", primary_key=True)
+    cell: float = Field(primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id", index=True)
+    layer_number: int
+    config: str
+    ix0: int
+    iy0: int
+    nx: int
+    ny: int
+    heights: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    stats: str
+
+
+class IngestJob(SQLModel, table=True):
+    """
+    One queued ZIP ingest. Progress columns are updated by the worker
+    process after every layer so any API process can report them.
+    """
+    id: str = Field(default_factory=_uuid, primary_key=True)
+    group_id: str = Field(foreign_key="weldgroup.id", index=True)
+    # queued | running | succeeded | failed | cancelled
+    status: str = Field(default="queued", index=True)
+    # None for a new group's ingest; "skip" or "reject" for an append (see
+    # app/services/ingest.py for what happens to already stored layer numbers).
+    append: Optional[str] = None
+    # An append's group status when it was queued, restored if the job is undone.
+    group_status: Optional[str] = None
+    zip_path: str
+    layers_total: int = 0
+    layers_done: int = 0
+    rows_written: int = 0
+    rows_per_sec: float = 0.0
+    attempts: int = 0
+    cancel_requested: bool = False
+    # API process that claimed the job and the last time its worker checked
+    # in; a running job whose heartbeat is older than the lease is orphaned.
+    owner: Optional[str] = None
+    heartbeat: Optional[datetime] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=_utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class LiveSession(SQLModel, table=True):
+    """
+    Lease on a group's live ingest state, which lives in one API process's
+    memory. Another process may take the group over only once `heartbeat`
+    is older than LIVE_SESSION_LEASE.
+    """
+    group_id: str = Field(foreign_key="weldgroup.id", primary_key=True)
+    owner: str
+    heartbeat: datetime = Field(default_factory=_utcnow)
+
+
 def init_models() -> None:
     logger.info("Initializing models")
\ No newline at end of file
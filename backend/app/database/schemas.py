@@ -1,4 +1,5 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 class LayerOut(BaseModel):
@@ -55,6 +56,172 @@ class WeldDataSummary(BaseModel):
     current_max: Optional[float] = None
 
 
+class HistogramOut(BaseModel):
+    min: float
+    max: float
+    bins: int
+    counts: List[int]
+    underflow: int
+    overflow: int
+
+
+class MetricDistributionOut(BaseModel):
+    """Opt-in (`?distributions=true`) extension of the data responses, per weld metric."""
+    n: int
+    percentiles: Dict[str, Optional[float]]  # "p1", "p50", ... (from the t-digest)
+    histogram: HistogramOut
+
+
+class ProcessMetricsOut(BaseModel):
+    """Opt-in (`?process=true`) extension of the data responses; see process_vars.json."""
+    samples: int
+    arc_time_s: float
+    arc_energy_j: float
+    arc_power_avg_w: Optional[float] = None
+    arc_power_max_w: Optional[float] = None
+    heat_input_avg_j_mm: Optional[float] = None
+    heat_input_max_j_mm: Optional[float] = None
+    wire_length_mm: float
+    deposited_mass_g: float
+    deposition_rate_g_s: Optional[float] = None
+    path_length_mm: float
+
+
+class LayerProcessOut(ProcessMetricsOut):
+    layer_id: str
+    layer_number: int
+
+
+class GroupProcessOut(BaseModel):
+    summary: ProcessMetricsOut
+    per_layer: List[LayerProcessOut]
+
+
+class AnomalyOut(BaseModel):
+    layer_id: str
+    layer_number: int
+    metric: str
+    direction: str  # high | low
+    start_seq: int
+    end_seq: int
+    samples: int
+    peak_seq: int
+    peak_value: float
+    peak_z: float
+    baseline_mean: float
+    baseline_std: float
+
+
+class LayerAnomaliesOut(BaseModel):
+    layer_id: str
+    group_id: str
+    layer_number: int
+    anomalies: List[AnomalyOut]
+
+
+class GroupAnomaliesOut(BaseModel):
+    group_id: str
+    total: int  # matching ranges, before `limit`
+    by_metric: Dict[str, int]
+    truncated: bool
+    anomalies: List[AnomalyOut]
+
+
+class CorrelationStatsOut(BaseModel):
+    """Least-squares fit of scan_value on one weld metric over the matched pairs."""
+    n: int
+    r: Optional[float] = None  # Pearson correlation
+    slope: Optional[float] = None  # scan_value per metric unit
+    intercept: Optional[float] = None
+
+
+class CorrelationPointOut(BaseModel):
+    seq: int
+    x: float
+    y: float
+    z: float
+    scan_value: Optional[float] = None
+    weld_seq: int
+    distance: float
+    wire_feed_rate: Optional[float] = None
+    travel_speed: Optional[float] = None
+    voltage: Optional[float] = None
+    current: Optional[float] = None
+
+
+class LayerCorrelationOut(BaseModel):
+    layer_id: str
+    group_id: str
+    layer_number: int
+    tolerance: float
+    scan_count: int
+    weld_count: int
+    matched: int
+    match_rate: Optional[float] = None
+    mean_distance: Optional[float] = None
+    max_distance: Optional[float] = None
+    correlation: Dict[str, CorrelationStatsOut]
+    points: Optional[List[CorrelationPointOut]] = None  # matched scan points only
+
+
+class GroupCorrelationOut(BaseModel):
+    group_id: str
+    tolerance: float
+    scan_count: int
+    weld_count: int
+    matched: int
+    match_rate: Optional[float] = None
+    mean_distance: Optional[float] = None
+    max_distance: Optional[float] = None
+    correlation: Dict[str, CorrelationStatsOut]  # pooled over every layer
+    layers: List[LayerCorrelationOut]
+
+
+class HeightStatsOut(BaseModel):
+    """Over the non-empty cells of a height or delta grid."""
+    cells: int
+    area: float  # cells * cell^2
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    rms: Optional[float] = None
+
+
+class HeightmapLayerOut(BaseModel):
+    layer_id: str
+    layer_number: int
+    stats: HeightStatsOut
+    previous_layer_id: Optional[str] = None
+    delta_stats: Optional[HeightStatsOut] = None
+    heights: List[Optional[float]]  # row-major ny x nx, null = empty cell
+    delta: Optional[List[Optional[float]]] = None  # heights minus the previous layer's
+
+
+class LayerHeightmapOut(HeightmapLayerOut):
+    group_id: str
+    cell: float
+    ix0: int  # first lattice column/row; cell (i, j) spans [i*cell, (i+1)*cell)
+    iy0: int
+    nx: int
+    ny: int
+    x0: float
+    y0: float
+
+
+class HeightmapStackOut(BaseModel):
+    group_id: str
+    cell: float
+    ix0: int
+    iy0: int
+    nx: int
+    ny: int
+    x0: float
+    y0: float
+    count: int
+    layers: List[HeightmapLayerOut]  # on the common extent above
+
+
 class LayerDataOut(BaseModel):
     layer_id: str
     group_id: str
@@ -64,8 +231,78 @@ class LayerDataOut(BaseModel):
     summary: WeldDataSummary
 
 
+class LayersDataOut(BaseModel):
+    group_id: str
+    count: int
+    layers: List[LayerDataOut]
+
+
 class GroupWeldDataOut(BaseModel):
     group_id: str
     name: str
     summary: WeldDataSummary
-    per_layer: List[WeldDataSummary]
\ No newline at end of file
+    per_layer: List[WeldDataSummary]
+
+class ScanValueSummary(BaseModel):
+    n: int
+    avg: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class RegionBox(BaseModel):
+    min_x: Optional[float] = None
+    max_x: Optional[float] = None
+    min_y: Optional[float] = None
+    max_y: Optional[float] = None
+    min_z: Optional[float] = None
+    max_z: Optional[float] = None
+
+
+class RegionOut(BaseModel):
+    group_id: str
+    box: RegionBox
+    layer_min: Optional[int] = None
+    layer_max: Optional[int] = None
+    tiles_scanned: int
+    layers_matched: int
+    scan_count: int
+    weld_count: int
+    truncated: bool
+    scan_value: ScanValueSummary
+    weld_summary: WeldDataSummary
+    scan_data: List[ScanDataOut]
+    weld_data: List[WeldDataOut]
+
+
+class VoxelCloudOut(BaseModel):
+    """Struct of arrays: entry i of every list describes voxel i."""
+    group_id: str
+    voxel_size: float
+    count: int
+    x: List[float]
+    y: List[float]
+    z: List[float]
+    n: List[int]
+    wire_feed_rate: List[Optional[float]]
+    travel_speed: List[Optional[float]]
+    voltage: List[Optional[float]]
+    current: List[Optional[float]]
+    scan_value: List[Optional[float]]
+
+
+class IngestJobOut(BaseModel):
+    id: str
+    group_id: str
+    status: str
+    append: Optional[str] = None
+    layers_total: int
+    layers_done: int
+    rows_written: int
+    rows_per_sec: float
+    attempts: int
+    cancel_requested: bool
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -1,18 +1,34 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database.db import init_db
+from app.database.db import init_db, run_db
+from app.services import ingest_jobs, live_ingest
+from app.utils.metrics import MetricsMiddleware
 from app.utils.config_loader import init_load
 from pathlib import Path
 from app.routers import (
+    cache,
     groups,
     layers,
-    ingest
+    ingest,
+    live,
+    metrics,
 )
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume ingest jobs a previous process left queued or running.
+    await run_db(ingest_jobs.recover_jobs)
+    ingest_jobs.start_sweeper()
+    yield
+    live_ingest.shutdown()
+    ingest_jobs.shutdown()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="AM Spatial Sensing Analytics API")
+    app = FastAPI(title="AM Spatial Sensing Analytics API", lifespan=lifespan)
     init_db()
     init_load(Path(__file__).parent / "config/v0.1")
 
@@ -24,10 +40,15 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # Outermost, so latency covers CORS and error handling too.
+    app.add_middleware(MetricsMiddleware)
 
     app.include_router(groups.router)
     app.include_router(layers.router)
     app.include_router(ingest.router)
+    app.include_router(live.router)
+    app.include_router(cache.router)
+    app.include_router(metrics.router)
     return app
 
 
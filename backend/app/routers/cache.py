@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from app.services.response_cache import response_cache
+
+router = APIRouter(prefix="/api/cache", tags=["cache"])
+
+
+@router.get("/stats")
+async def cache_stats():
+    return response_cache.stats()
@@ -1,25 +1,47 @@
-from typing import List, Dict
-from fastapi import APIRouter, HTTPException, Query
+from typing import List, Dict, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from sqlalchemy import func
 from sqlmodel import select
-from fastapi.concurrency import run_in_threadpool
 
-from app.database.db import get_session
+from app.database.db import get_session, run_db
 from app.database.models import WeldGroup, Layer
 from app.database.schemas import (
+    GroupAnomaliesOut,
+    GroupCorrelationOut,
     GroupOut,
+    HeightmapStackOut,
     LayerOut,
     GroupWeldDataOut,
+    LayersDataOut,
+    RegionOut,
+    VoxelCloudOut,
+)
+from app.services.anomalies import group_anomalies_json
+from app.services.correlation import group_correlation_json
+from app.services.heightmaps import (
+    compute_group_heightmaps,
+    group_heightmaps_binary,
+    group_heightmaps_json,
+)
+from app.services.compute_metrics import (
+    compute_group_data,
+    compute_group_json,
+    compute_layers_json,
+)
+from app.services.spatial import Box, query_region_json
+from app.services.voxels import compute_group_voxels, voxels_binary, voxels_json
+from app.utils.binary_format import MEDIA_TYPE as BINARY_MEDIA_TYPE
+from app.services.response_cache import (
+    group_cache_version,
+    json_body,
+    json_response,
+    serve_cached,
 )
-from app.services.compute_metrics import compute_group_data
 
 router = APIRouter(prefix="/api/groups", tags=["groups"])
 
 
-@router.get("", response_model=List[GroupOut])
-async def list_groups(
-    limit: int = Query(1000, ge=1, le=1000), offset: int = Query(0, ge=0)
-):
+def _list_groups(limit: int, offset: int) -> Response:
     with get_session() as session:
         groups = session.exec(
             select(WeldGroup).order_by(WeldGroup.name).limit(limit).offset(offset)
@@ -45,13 +67,17 @@ async def list_groups(
             )
             for g in groups
         ]
-        return items
+        return json_response(items)
 
 
-@router.get("/{group_id}", response_model=GroupOut)
-async def get_group(
-    group_id: str, limit: int = Query(1000000, ge=1), offset: int = Query(0, ge=0)
+@router.get("", response_model=List[GroupOut])
+async def list_groups(
+    limit: int = Query(1000, ge=1, le=1000), offset: int = Query(0, ge=0)
 ):
+    return await run_db(_list_groups, limit, offset)
+
+
+def _get_group(group_id: str, limit: int, offset: int) -> Response:
     with get_session() as session:
         group = session.get(WeldGroup, group_id)
         if not group:
@@ -64,7 +90,7 @@ async def get_group(
             .limit(limit)
             .offset(offset)
         ).all()
-        return GroupOut(
+        return json_response(GroupOut(
             id=group.id,
             name=group.name,
             ingest_complete=group.ingest_complete,
@@ -79,16 +105,278 @@ async def get_group(
                 )
                 for layer in layers
             ],
-        )
+        ))
+
+
+@router.get("/{group_id}", response_model=GroupOut)
+async def get_group(
+    group_id: str, limit: int = Query(1000000, ge=1), offset: int = Query(0, ge=0)
+):
+    return await run_db(_get_group, group_id, limit, offset)
 
 
 @router.get("/{group_id}/data", response_model=GroupWeldDataOut)
-async def get_group_metrics(group_id: str):
+async def get_group_metrics(
+    group_id: str,
+    request: Request,
+    distributions: bool = Query(
+        False, description="Add per-metric percentiles and histograms (`distributions`)"
+    ),
+    process: bool = Query(
+        False, description="Add group and per-layer arc energy, heat input, wire and path totals (`process`)"
+    ),
+):
+    def build():
+        if distributions or process:
+            body = compute_group_json(group_id, distributions=distributions, process=process)
+            return body, "application/json"
+        return json_body(compute_group_data(group_id)), "application/json"
+
     try:
-        result = await run_in_threadpool(compute_group_data, group_id)
-        print("hello")
+        version = await run_db(group_cache_version, group_id)
+        result = await serve_cached(
+            request, ("group_data", distributions, process), group_id, version, build
+        )
         return result
     except ValueError as ve:
         if str(ve) == "group_not_found":
             raise HTTPException(status_code=404, detail="group not found")
         raise
+
+
+@router.get("/{group_id}/layers/data", response_model=LayersDataOut)
+async def get_group_layers_data(
+    group_id: str,
+    request: Request,
+    layer_ids: Optional[List[str]] = Query(None, description="Layer ids (repeat the parameter)"),
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+    max_points: Optional[int] = Query(
+        None, ge=16, description="Downsample scan and weld points to at most this many each"
+    ),
+    distributions: bool = Query(False, description="Add each layer's `distributions`"),
+    process: bool = Query(False, description="Add each layer's `process` totals and columns"),
+):
+    """
+    Several layers' data in one response: each entry is what
+    /api/layers/{layer_id}/data returns. Pick layers by id, by layer-number
+    range, or both; with neither, every layer of the group is returned.
+    """
+    ids = tuple(sorted(set(layer_ids))) if layer_ids else None
+
+    def build():
+        body = compute_layers_json(
+            group_id,
+            ids,
+            layer_min,
+            layer_max,
+            max_points,
+            distributions=distributions,
+            process=process,
+        )
+        return body, "application/json"
+
+    try:
+        version = await run_db(group_cache_version, group_id)
+        return await serve_cached(
+            request,
+            ("layers_data", ids, layer_min, layer_max, max_points, distributions, process),
+            group_id,
+            version,
+            build,
+        )
+    except ValueError as ve:
+        if str(ve) == "group_not_found":
+            raise HTTPException(status_code=404, detail="group not found")
+        if str(ve) == "layer_not_found":
+            raise HTTPException(status_code=404, detail="layer not found in group")
+        if str(ve) == "too_many_layers":
+            raise HTTPException(status_code=400, detail="too many layers for one request")
+        raise
+
+
+@router.get("/{group_id}/region", response_model=RegionOut)
+async def get_group_region(
+    group_id: str,
+    request: Request,
+    min_x: Optional[float] = None,
+    max_x: Optional[float] = None,
+    min_y: Optional[float] = None,
+    max_y: Optional[float] = None,
+    min_z: Optional[float] = None,
+    max_z: Optional[float] = None,
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+    limit: int = Query(100000, ge=0, le=1000000, description="Max points returned per kind"),
+):
+    """
+    Scan and weld points inside an axis-aligned box and layer range, with
+    aggregates over every matching point. Served from the spatial tile index.
+    """
+    box = Box(min_x, max_x, min_y, max_y, min_z, max_z)
+
+    def build():
+        return query_region_json(group_id, box, layer_min, layer_max, limit), "application/json"
+
+    try:
+        version = await run_db(group_cache_version, group_id)
+        return await serve_cached(
+            request, ("region", box, layer_min, layer_max, limit), group_id, version, build
+        )
+    except ValueError as ve:
+        if str(ve) == "group_not_found":
+            raise HTTPException(status_code=404, detail="group not found")
+        raise
+
+
+@router.get(
+    "/{group_id}/voxels",
+    response_model=VoxelCloudOut,
+    responses={200: {"content": {BINARY_MEDIA_TYPE: {}}}},
+)
+async def get_group_voxels(
+    group_id: str,
+    request: Request,
+    voxel_size: float = Query(2.0, gt=0, description="Voxel edge length (data units, mm)"),
+):
+    """
+    Voxel-downsampled point cloud of the whole group: one point per
+    non-empty voxel with its sample count and mean metrics. JSON by default;
+    `Accept: application/vnd.ssa.layer+octet-stream` returns an SSAL payload
+    with a single "voxels" table.
+    """
+    binary = BINARY_MEDIA_TYPE in request.headers.get("accept", "")
+
+    def build():
+        cloud = compute_group_voxels(group_id, voxel_size)
+        if binary:
+            return voxels_binary(group_id, cloud), BINARY_MEDIA_TYPE
+        return voxels_json(group_id, cloud), "application/json"
+
+    try:
+        version = await run_db(group_cache_version, group_id)
+        return await serve_cached(
+            request,
+            ("voxels", voxel_size, binary),
+            group_id,
+            version,
+            build,
+            headers={"Vary": "Accept"},
+        )
+    except ValueError as ve:
+        if str(ve) == "group_not_found":
+            raise HTTPException(status_code=404, detail="group not found")
+        if str(ve) == "voxel_size_too_small":
+            raise HTTPException(status_code=400, detail="voxel_size too small for this part")
+        raise
+
+
+@router.get("/{group_id}/anomalies", response_model=GroupAnomaliesOut)
+async def get_group_anomalies(
+    group_id: str,
+    request: Request,
+    metric: Optional[Literal["wire_feed_rate", "travel_speed", "voltage", "current"]] = None,
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+    limit: int = Query(1000, ge=0, le=100000, description="Max ranges listed"),
+):
+    """
+    Anomaly ranges of every layer in the range, in layer order, with totals
+    per metric. Ranges come from the rolling z-score stage run at ingest.
+    """
+
+    def build():
+        body = group_anomalies_json(group_id, metric, layer_min, layer_max, limit)
+        return body, "application/json"
+
+    try:
+        version = await run_db(group_cache_version, group_id)
+        return await serve_cached(
+            request,
+            ("anomalies", metric, layer_min, layer_max, limit),
+            group_id,
+            version,
+            build,
+        )
+    except ValueError as ve:
+        if str(ve) == "group_not_found":
+            raise HTTPException(status_code=404, detail="group not found")
+        raise
+
+
+@router.get("/{group_id}/correlation", response_model=GroupCorrelationOut)
+async def get_group_correlation(
+    group_id: str,
+    request: Request,
+    tolerance: Optional[float] = Query(
+        None, gt=0, description="Max scan-to-weld match distance (defaults to CORRELATION_TOLERANCE)"
+    ),
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+):
+    """Per-layer scan-to-weld correlation statistics and their pooled totals."""
+
+    def build():
+        return group_correlation_json(group_id, tolerance, layer_min, layer_max), "application/json"
+
+    try:
+        version = await run_db(group_cache_version, group_id)
+        return await serve_cached(
+            request,
+            ("correlation", tolerance, layer_min, layer_max),
+            group_id,
+            version,
+            build,
+        )
+    except ValueError as ve:
+        if str(ve) == "group_not_found":
+            raise HTTPException(status_code=404, detail="group not found")
+        if str(ve) == "tolerance_too_small":
+            raise HTTPException(status_code=400, detail="tolerance too small for this part")
+        raise
+
+
+@router.get(
+    "/{group_id}/heightmaps",
+    response_model=HeightmapStackOut,
+    responses={200: {"content": {BINARY_MEDIA_TYPE: {}}}},
+)
+async def get_group_heightmaps(
+    group_id: str,
+    request: Request,
+    cell: Optional[float] = Query(
+        None, gt=0, description="Cell edge in x/y (defaults to HEIGHTMAP_CELL_SIZE)"
+    ),
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+    delta: bool = Query(True, description="Include each layer's difference to the previous one"),
+):
+    """
+    Stack of layer height maps on one common XY extent, in layer order.
+    `Accept: application/vnd.ssa.layer+octet-stream` returns an SSAL payload
+    with one table per layer (named by layer id).
+    """
+    binary = BINARY_MEDIA_TYPE in request.headers.get("accept", "")
+
+    def build():
+        stack = compute_group_heightmaps(group_id, cell, layer_min, layer_max, delta)
+        if binary:
+            return group_heightmaps_binary(stack), BINARY_MEDIA_TYPE
+        return group_heightmaps_json(stack), "application/json"
+
+    try:
+        version = await run_db(group_cache_version, group_id)
+        return await serve_cached(
+            request,
+            ("heightmaps", cell, layer_min, layer_max, delta, binary),
+            group_id,
+            version,
+            build,
+            headers={"Vary": "Accept"},
+        )
+    except ValueError as ve:
+        if str(ve) == "group_not_found":
+            raise HTTPException(status_code=404, detail="group not found")
+        if str(ve) in ("cell_size_too_small", "grid_too_large"):
+            raise HTTPException(status_code=400, detail="too many cells; use a larger cell or fewer layers")
+        raise
@@ -1,19 +1,33 @@
 # app/routers/ingest.py
 import os
 import tempfile
+import zipfile
+from typing import List, Literal, Optional
 from fastapi import (
     APIRouter,
     UploadFile,
     File,
     Form,
     HTTPException,
-    BackgroundTasks,
+    Query,
+    Response,
 )
 from sqlalchemy.exc import IntegrityError
 
-from app.database.db import get_session
-from app.database.models import WeldGroup
-from app.services.ingest import ingest_zip_into_group
+from app.database.db import get_session, run_db
+from app.database.models import IngestJob, WeldGroup
+from app.database.schemas import IngestJobOut
+from app.services.ingest import conflicting_layers
+from app.services.ingest_jobs import (
+    cancel_job,
+    check_capacity,
+    create_job,
+    get_job,
+    list_jobs,
+    spool_path,
+    submit_job,
+)
+from app.services.response_cache import json_response, response_cache
 
 router = APIRouter(prefix="/api/ingest", tags=["ingest"])
 
@@ -32,50 +46,184 @@ def _reserve_group(group_name: str) -> WeldGroup:
         return group
 
 
-def _run_ingest_and_cleanup(zip_path: str, group_id: str) -> None:
+def _delete_group(group_id: str) -> None:
+    with get_session() as session:
+        group = session.get(WeldGroup, group_id)
+        if group:
+            session.delete(group)
+            session.commit()
+
+
+def _enqueue(group_id: str, zip_path: str) -> IngestJob:
     try:
-        ingest_zip_into_group(zip_path, group_id=group_id)
-    except Exception as e:
-        with get_session() as s:
-            g = s.get(WeldGroup, group_id)
-            if g:
-                g.status = "failed"
-                g.ingest_error = str(e)
-                s.commit()
-        pass
-    finally:
-        try:
-            os.remove(zip_path)
-        except FileNotFoundError:
-            pass
+        return create_job(group_id, zip_path)
+    except ValueError:
+        _delete_group(group_id)
+        os.remove(zip_path)
+        raise
 
 
 @router.post("/upload-zip", status_code=202)
 async def upload_zip(
-    background_tasks: BackgroundTasks,
     zip_file: UploadFile = File(
         ..., description="ZIP with wXXX_scandata.txt and wXXX_welddat.txt"
     ),
     group_name: str = Form("default"),
 ):
     try:
-        group = _reserve_group(group_name)
+        await run_db(check_capacity)
+        group = await run_db(_reserve_group, group_name)
     except ValueError as ve:
         if str(ve) == "group_name_exists":
             raise HTTPException(status_code=409, detail="group name already exists")
+        if str(ve) == "ingest_queue_full":
+            raise HTTPException(status_code=503, detail="ingest queue is full")
+        raise
+
+    try:
+        temp_zip_path = await _spool_upload(zip_file)
+    except BaseException:
+        # Client gone or disk full: free the reserved name.
+        await run_db(_delete_group, group.id)
+        raise
+
+    try:
+        job = await run_db(_enqueue, group.id, temp_zip_path)
+    except ValueError as ve:
+        if str(ve) == "ingest_queue_full":
+            raise HTTPException(status_code=503, detail="ingest queue is full")
         raise
+    submit_job(job.id, group.id)
 
+    return {"group": group.name, "groupId": group.id, "jobId": job.id, "status": "accepted"}
+
+
+async def _spool_upload(zip_file: UploadFile) -> str:
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tf:
-            while True:
-                chunk = await zip_file.read(1024 * 1024)
-                if not chunk:
-                    break
-                tf.write(chunk)
-            temp_zip_path = tf.name
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip", dir=spool_path()) as tf:
+            try:
+                while True:
+                    chunk = await zip_file.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    tf.write(chunk)
+            except BaseException:
+                tf.close()
+                os.remove(tf.name)
+                raise
+            return tf.name
     finally:
         await zip_file.close()
 
-    background_tasks.add_task(_run_ingest_and_cleanup, temp_zip_path, group.id)
 
-    return {"group": group.name, "groupId": group.id, "status": "accepted"}
\ No newline at end of file
+def _enqueue_append(group_id: str, zip_path: str, on_existing: str) -> IngestJob:
+    try:
+        if on_existing == "reject":
+            clash = conflicting_layers(zip_path, group_id)
+            if clash:
+                raise ValueError(f"layers_exist: {clash}")
+        return create_job(group_id, zip_path, append=on_existing)
+    except Exception:
+        os.remove(zip_path)
+        raise
+
+
+@router.post("/groups/{group_id}/append-zip", status_code=202)
+async def append_zip(
+    group_id: str,
+    zip_file: UploadFile = File(..., description="ZIP with only the new wXXX pairs"),
+    on_existing: Literal["skip", "reject"] = Form("skip"),
+):
+    """
+    Queue new layers for an existing group. Layer numbers the group already
+    has are skipped, or with on_existing=reject the upload is refused (409)
+    before a job is created.
+    """
+    def _check(group_id: str) -> None:
+        check_capacity()
+        with get_session() as session:
+            group = session.get(WeldGroup, group_id)
+            if not group:
+                raise ValueError("group_not_found")
+            if not group.ingest_complete:
+                raise ValueError("group_not_ingested")
+
+    try:
+        await run_db(_check, group_id)
+    except ValueError as ve:
+        if str(ve) == "group_not_found":
+            raise HTTPException(status_code=404, detail="group not found")
+        if str(ve) == "group_not_ingested":
+            raise HTTPException(status_code=409, detail="group has not finished ingesting")
+        if str(ve) == "ingest_queue_full":
+            raise HTTPException(status_code=503, detail="ingest queue is full")
+        raise
+
+    temp_zip_path = await _spool_upload(zip_file)
+    try:
+        job = await run_db(_enqueue_append, group_id, temp_zip_path, on_existing)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="not a valid zip file")
+    except ValueError as ve:
+        msg = str(ve)
+        if msg.startswith("layers_exist: "):
+            raise HTTPException(
+                status_code=409, detail=f"layers already exist: {msg.split(': ', 1)[1]}"
+            )
+        if msg.startswith("Illegal path in archive"):
+            raise HTTPException(status_code=400, detail=msg)
+        if msg == "group_busy":
+            raise HTTPException(status_code=409, detail="group has an active ingest job")
+        if msg == "group_not_ingested":
+            raise HTTPException(status_code=409, detail="group has not finished ingesting")
+        if msg == "group_not_found":
+            raise HTTPException(status_code=404, detail="group not found")
+        if msg == "ingest_queue_full":
+            raise HTTPException(status_code=503, detail="ingest queue is full")
+        raise
+    submit_job(job.id, group_id)
+
+    return {"groupId": group_id, "jobId": job.id, "status": "accepted"}
+
+
+def _job_out(job: IngestJob) -> IngestJobOut:
+    return IngestJobOut.model_validate(job.model_dump())
+
+
+def _list_jobs(group_id: Optional[str], status: Optional[str], limit: int) -> Response:
+    return json_response([_job_out(j) for j in list_jobs(group_id, status, limit)])
+
+
+@router.get("/jobs", response_model=List[IngestJobOut])
+async def get_jobs(
+    group_id: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    return await run_db(_list_jobs, group_id, status, limit)
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobOut)
+async def get_ingest_job(job_id: str):
+    try:
+        job = await run_db(get_job, job_id)
+    except ValueError as ve:
+        if str(ve) == "job_not_found":
+            raise HTTPException(status_code=404, detail="job not found")
+        raise
+    return json_response(_job_out(job))
+
+
+@router.post("/jobs/{job_id}/cancel", status_code=202, response_model=IngestJobOut)
+async def cancel_ingest_job(job_id: str):
+    try:
+        job = await run_db(cancel_job, job_id)
+    except ValueError as ve:
+        if str(ve) == "job_not_found":
+            raise HTTPException(status_code=404, detail="job not found")
+        if str(ve) == "job_not_active":
+            raise HTTPException(status_code=409, detail="job is not queued or running")
+        raise
+    if job.status == "cancelled":
+        response_cache.invalidate_group(job.group_id)
+    return json_response(_job_out(job), status_code=202)
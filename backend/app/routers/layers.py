@@ -1,39 +1,198 @@
-from typing import List
-from fastapi import APIRouter, HTTPException
-from fastapi.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from sqlmodel import select
 
-from app.services.compute_metrics import compute_layer_data
-from app.database.db import get_session
+from app.services.anomalies import layer_anomalies_json
+from app.services.correlation import layer_correlation_json
+from app.services.heightmaps import (
+    compute_layer_heightmap,
+    layer_heightmap_binary,
+    layer_heightmap_json,
+)
+from app.services.compute_metrics import compute_layer_binary, compute_layer_json
+from app.services.response_cache import (
+    json_response,
+    layer_cache_version,
+    serve_cached,
+)
+from app.database.db import get_session, run_db
 from app.database.models import Layer, ScanData
-from app.database.schemas import LayerDataOut, LayerOut
+from app.database.schemas import (
+    LayerAnomaliesOut,
+    LayerCorrelationOut,
+    LayerDataOut,
+    LayerHeightmapOut,
+    LayerOut,
+)
+from app.utils.binary_format import MEDIA_TYPE as LAYER_BINARY_MEDIA_TYPE
 
 router = APIRouter(prefix="/api/layers", tags=["layers"])
 
 
-@router.get("/{layer_id}", response_model=LayerOut)
-async def get_layer(layer_id: str):
+def _get_layer(layer_id: str) -> Response:
     with get_session() as session:
         layer = session.get(Layer, layer_id)
         if not layer:
             raise HTTPException(status_code=404, detail="layer not found")
-        return LayerOut(
+        return json_response(LayerOut(
             id=layer.id,
             group_id=layer.group_id,
             layer_number=layer.layer_number,
             scandata_file=layer.scandata_file,
             welddat_file=layer.welddat_file,
+        ))
+
+
+@router.get("/{layer_id}", response_model=LayerOut)
+async def get_layer(layer_id: str):
+    return await run_db(_get_layer, layer_id)
+
+
+@router.get(
+    "/{layer_id}/data",
+    response_model=LayerDataOut,
+    responses={200: {"content": {LAYER_BINARY_MEDIA_TYPE: {}}}},
+)
+async def get_metrics(
+    request: Request,
+    layer_id: str,
+    max_points: Optional[int] = Query(
+        None, ge=16, description="Downsample scan and weld points to at most this many each"
+    ),
+    distributions: bool = Query(
+        False, description="Add per-metric percentiles and histograms (`distributions`)"
+    ),
+    process: bool = Query(
+        False,
+        description="Add arc power, heat input, energy, wire and path columns and totals (`process`)",
+    ),
+):
+    """
+    JSON by default. Clients sending `Accept: application/vnd.ssa.layer+octet-stream`
+    get the packed columnar encoding from app/utils/binary_format.py instead.
+    """
+    binary = LAYER_BINARY_MEDIA_TYPE in request.headers.get("accept", "")
+
+    def build():
+        if binary:
+            return (
+                compute_layer_binary(
+                    layer_id, max_points, distributions=distributions, process=process
+                ),
+                LAYER_BINARY_MEDIA_TYPE,
+            )
+        body = compute_layer_json(
+            layer_id, max_points, distributions=distributions, process=process
         )
+        return body, "application/json"
 
+    try:
+        group_id, version = await run_db(layer_cache_version, layer_id)
+        return await serve_cached(
+            request,
+            ("layer_data", layer_id, max_points, binary, distributions, process),
+            group_id,
+            version,
+            build,
+            headers={"Vary": "Accept"},
+        )
+    except ValueError as ve:
+        if str(ve) == "layer_not_found":
+            raise HTTPException(status_code=404, detail="layer not found")
+        raise
+
+
+@router.get("/{layer_id}/anomalies", response_model=LayerAnomaliesOut)
+async def get_layer_anomalies(
+    layer_id: str,
+    request: Request,
+    metric: Optional[Literal["wire_feed_rate", "travel_speed", "voltage", "current"]] = None,
+):
+    """Sample ranges whose rolling z-score crossed the configured threshold."""
+
+    def build():
+        return layer_anomalies_json(layer_id, metric), "application/json"
 
-@router.get("/{layer_id}/data", response_model=LayerDataOut)
-async def get_metrics(layer_id: str):
     try:
-        result = await run_in_threadpool(
-            compute_layer_data, layer_id
+        group_id, version = await run_db(layer_cache_version, layer_id)
+        return await serve_cached(
+            request, ("layer_anomalies", layer_id, metric), group_id, version, build
         )
-        return result
     except ValueError as ve:
-        if str(ve) == "group_not_found":
-            raise HTTPException(status_code=404, detail="group not found")
-        raise
\ No newline at end of file
+        if str(ve) == "layer_not_found":
+            raise HTTPException(status_code=404, detail="layer not found")
+        raise
+
+
+@router.get("/{layer_id}/correlation", response_model=LayerCorrelationOut)
+async def get_layer_correlation(
+    layer_id: str,
+    request: Request,
+    tolerance: Optional[float] = Query(
+        None, gt=0, description="Max scan-to-weld match distance (defaults to CORRELATION_TOLERANCE)"
+    ),
+    points: bool = Query(True, description="Include the matched points"),
+):
+    """
+    Each scan point joined to its nearest weld sample within `tolerance`,
+    with the fit of scan_value on every weld metric over the matched pairs.
+    """
+
+    def build():
+        return layer_correlation_json(layer_id, tolerance, points), "application/json"
+
+    try:
+        group_id, version = await run_db(layer_cache_version, layer_id)
+        return await serve_cached(
+            request, ("layer_correlation", layer_id, tolerance, points), group_id, version, build
+        )
+    except ValueError as ve:
+        if str(ve) == "layer_not_found":
+            raise HTTPException(status_code=404, detail="layer not found")
+        if str(ve) == "tolerance_too_small":
+            raise HTTPException(status_code=400, detail="tolerance too small for this part")
+        raise
+
+
+@router.get(
+    "/{layer_id}/heightmap",
+    response_model=LayerHeightmapOut,
+    responses={200: {"content": {LAYER_BINARY_MEDIA_TYPE: {}}}},
+)
+async def get_layer_heightmap(
+    layer_id: str,
+    request: Request,
+    cell: Optional[float] = Query(
+        None, gt=0, description="Cell edge in x/y (defaults to HEIGHTMAP_CELL_SIZE)"
+    ),
+    delta: bool = Query(True, description="Include the difference to the previous layer"),
+):
+    """
+    Mean scan_value per XY cell, row-major. JSON by default;
+    `Accept: application/vnd.ssa.layer+octet-stream` returns an SSAL payload
+    with a single "grid" table.
+    """
+    binary = LAYER_BINARY_MEDIA_TYPE in request.headers.get("accept", "")
+
+    def build():
+        m = compute_layer_heightmap(layer_id, cell, delta)
+        if binary:
+            return layer_heightmap_binary(m), LAYER_BINARY_MEDIA_TYPE
+        return layer_heightmap_json(m), "application/json"
+
+    try:
+        group_id, version = await run_db(layer_cache_version, layer_id)
+        return await serve_cached(
+            request,
+            ("layer_heightmap", layer_id, cell, delta, binary),
+            group_id,
+            version,
+            build,
+            headers={"Vary": "Accept"},
+        )
+    except ValueError as ve:
+        if str(ve) == "layer_not_found":
+            raise HTTPException(status_code=404, detail="layer not found")
+        if str(ve) == "cell_size_too_small":
+            raise HTTPException(status_code=400, detail="cell too small for this layer")
+        raise
@@ -0,0 +1,127 @@
+# app/routers/live.py
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, Body, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.database.db import run_db
+from app.services.live_ingest import (
+    create_group,
+    feed_chunk,
+    finish_layer,
+    snapshot_json,
+    start_watch,
+    stop_watch,
+    subscribe,
+    unsubscribe,
+)
+from app.services.response_cache import response_cache
+
+router = APIRouter(prefix="/api/live", tags=["live"])
+
+# Seconds between SSE keep-alive comments when no event arrives.
+KEEPALIVE_SECONDS = 15.0
+
+_ERRORS = {
+    "group_not_found": (404, "group not found"),
+    "live_layer_not_found": (404, "layer is not open"),
+    "group_name_exists": (409, "group name already exists"),
+    "layer_exists": (409, "layer already exists"),
+    "layer_finishing": (409, "layer is being stored"),
+    "live_group_elsewhere": (409, "group is live in another API process"),
+    "group_busy": (409, "group has an active ingest job"),
+    "already_watching": (409, "group is already watching a directory"),
+    "not_watching": (409, "group is not watching a directory"),
+    "watch_disabled": (403, "directory watching is disabled (LIVE_WATCH_ROOT)"),
+    "watch_path_outside_root": (403, "path is outside LIVE_WATCH_ROOT"),
+    "watch_path_not_found": (404, "directory not found"),
+}
+
+
+async def _call(fn, *args):
+    try:
+        return await run_db(fn, *args)
+    except ValueError as ve:
+        if str(ve) in _ERRORS:
+            status, detail = _ERRORS[str(ve)]
+            raise HTTPException(status_code=status, detail=detail)
+        raise
+
+
+@router.post("/groups", status_code=201)
+async def post_group(name: str = Body(..., embed=True)):
+    """Create an empty group to stream layers into."""
+    group = await _call(create_group, name)
+    return {"group": group.name, "groupId": group.id}
+
+
+@router.post("/groups/{group_id}/layers/{layer_number}/finish", status_code=201)
+async def post_finish(group_id: str, layer_number: int):
+    layer_id = await _call(finish_layer, group_id, layer_number)
+    response_cache.invalidate_group(group_id)
+    return {"groupId": group_id, "layerId": layer_id, "layer_number": layer_number}
+
+
+@router.post("/groups/{group_id}/layers/{layer_number}/{kind}", status_code=202)
+async def post_chunk(
+    group_id: str,
+    layer_number: int,
+    kind: Literal["scandata", "welddat"],
+    request: Request,
+):
+    """
+    Append raw lines (request body, text) to an open layer. An unterminated
+    last line is held until the next chunk or until the layer is finished.
+    """
+    text = (await request.body()).decode("utf-8", "replace")
+    return await _call(feed_chunk, group_id, layer_number, kind, text)
+
+
+@router.get("/groups/{group_id}")
+async def get_live(group_id: str):
+    body = await _call(snapshot_json, group_id)
+    return Response(content=body, media_type="application/json")
+
+
+@router.post("/groups/{group_id}/watch", status_code=202)
+async def post_watch(group_id: str, path: str = Body(..., embed=True)):
+    """Tail a directory below LIVE_WATCH_ROOT into the group."""
+    return {"groupId": group_id, "watching": await _call(start_watch, group_id, path)}
+
+
+@router.delete("/groups/{group_id}/watch")
+async def delete_watch(group_id: str):
+    """Stop watching; open layers are stored after a last poll."""
+    await _call(stop_watch, group_id)
+    response_cache.invalidate_group(group_id)
+    return {"groupId": group_id, "watching": None}
+
+
+@router.get("/groups/{group_id}/events")
+async def get_events(group_id: str, request: Request):
+    """
+    Server-sent events: `snapshot` once on connect, then `chunk` for every
+    parsed batch of lines and `layer_finished` when a layer is stored.
+    """
+    sub = await _call(subscribe, group_id, asyncio.get_running_loop())
+    first = await _call(snapshot_json, group_id)
+
+    async def stream():
+        try:
+            yield f"event: snapshot\ndata: {first}\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(sub.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+        finally:
+            unsubscribe(group_id, sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from app.utils.metrics import CONTENT_TYPE, render
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of this process's metrics."""
+    return Response(content=render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,231 @@
+# app/services/anomalies.py
+"""
+Rolling z-score anomaly detection over each layer's weld signals.
+
+Every weld metric of a layer is scanned in seq order: each sample is compared
+with the mean and standard deviation of the `window` samples before it
+(app/utils/rolling.py, cumulative sums, O(n)). Samples with |z| at or above
+`threshold`, once the window holds `min_periods` samples, are flagged; flagged
+samples no more than `merge_gap` apart form one LayerAnomaly range. High z is
+a spike (current, voltage), low z a dropout (wire feed, travel speed).
+
+Parameters come from `anomalies` in the config (app/config/v0.1/anomalies.json);
+`metrics.<name>` overrides them per metric. Ingest writes the ranges together
+with a LayerAnomalyRun marker holding a hash of the parameters; layers with
+no marker, or one from other parameters, are re-analyzed on request once the
+group's ingest is complete.
+"""
+import hashlib
+import json
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlmodel import Session, delete, select
+
+import app.utils.config_loader as cfg
+from app.database.db import get_session
+from app.database.models import Layer, LayerAnomaly, LayerAnomalyRun, WeldGroup
+from app.database.schemas import AnomalyOut
+from app.services.storage import load_weld_columns
+from app.services.summaries import SUMMARY_METRICS
+from app.utils.json_format import dumps
+from app.utils.parsers import WeldColumns
+from app.utils.rolling import flag_ranges, rolling_zscore
+
+DEFAULT_ANOMALIES = {
+    "window": 200,
+    "min_periods": 50,
+    "threshold": 6.0,
+    "merge_gap": 10,
+    "min_std": 0.0,
+}
+
+
+class AnomalyParams(NamedTuple):
+    window: int
+    min_periods: int
+    threshold: float
+    merge_gap: int
+    min_std: float
+
+
+def anomaly_params() -> Dict[str, AnomalyParams]:
+    conf = cfg.CONFIG.get("anomalies", {})
+    base = {k: conf.get(k, v) for k, v in DEFAULT_ANOMALIES.items()}
+    out = {}
+    for metric in SUMMARY_METRICS:
+        p = {**base, **conf.get("metrics", {}).get(metric, {})}
+        out[metric] = AnomalyParams(
+            int(p["window"]),
+            int(p["min_periods"]),
+            float(p["threshold"]),
+            int(p["merge_gap"]),
+            float(p["min_std"]),
+        )
+    return out
+
+
+def _params_hash(params: Dict[str, AnomalyParams]) -> str:
+    blob = json.dumps({m: p._asdict() for m, p in params.items()}, sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()[:12]
+
+
+def detect_anomalies(
+    layer: Layer, weld: WeldColumns, params: Dict[str, AnomalyParams]
+) -> List[LayerAnomaly]:
+    """LayerAnomaly rows (unsaved) for one layer's weld samples."""
+    seq = weld.seq
+    order = None
+    if seq.size > 1 and np.any(np.diff(seq) < 0):
+        order = np.argsort(seq, kind="stable")
+        seq = seq[order]
+
+    out: List[LayerAnomaly] = []
+    for metric, column in SUMMARY_METRICS.items():
+        p = params[metric]
+        vals = getattr(weld, column)
+        if order is not None:
+            vals = vals[order]
+        r = rolling_zscore(vals, p.window, p.min_std)
+        absz = np.abs(r.z)
+        mask = (r.count >= p.min_periods) & (absz >= p.threshold)  # NaN z compares False
+        starts, ends = flag_ranges(mask, p.merge_gap)
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            peak = s + int(np.argmax(np.where(mask[s : e + 1], absz[s : e + 1], -1.0)))
+            out.append(
+                LayerAnomaly(
+                    layer_id=layer.id,
+                    group_id=layer.group_id,
+                    layer_number=layer.layer_number,
+                    metric=metric,
+                    direction="high" if r.z[peak] > 0 else "low",
+                    start_seq=int(seq[s]),
+                    end_seq=int(seq[e]),
+                    samples=int(mask[s : e + 1].sum()),
+                    peak_seq=int(seq[peak]),
+                    peak_value=float(vals[peak]),
+                    peak_z=float(r.z[peak]),
+                    baseline_mean=float(r.mean[peak]),
+                    baseline_std=float(r.std[peak]),
+                )
+            )
+    return out
+
+
+def write_layer_anomalies(session: Session, layer: Layer, weld: WeldColumns) -> None:
+    """Add a freshly written layer's LayerAnomaly rows and run marker (no commit)."""
+    params = anomaly_params()
+    rows = detect_anomalies(layer, weld, params)
+    session.add_all(rows)
+    session.add(
+        LayerAnomalyRun(
+            layer_id=layer.id, group_id=layer.group_id, params=_params_hash(params), ranges=len(rows)
+        )
+    )
+
+
+def build_layer_anomalies(session: Session, layers: Sequence[Layer]) -> int:
+    """
+    Re-analyze the layers among `layers` that have no run marker or one from
+    other parameters, one layer in memory at a time. Commits per layer;
+    returns the number of layers analyzed.
+    """
+    current = _params_hash(anomaly_params())
+    ids = [layer.id for layer in layers]
+    done = set(
+        session.exec(
+            select(LayerAnomalyRun.layer_id)
+            .where(LayerAnomalyRun.layer_id.in_(ids))  # type: ignore
+            .where(LayerAnomalyRun.params == current)
+        ).all()
+    )
+    built = 0
+    for layer in layers:
+        if layer.id in done:
+            continue
+        for table in (LayerAnomaly, LayerAnomalyRun):
+            session.exec(delete(table).where(table.layer_id == layer.id))  # type: ignore
+        write_layer_anomalies(session, layer, load_weld_columns(session, layer.id))
+        session.commit()
+        built += 1
+    return built
+
+
+def _out(row: LayerAnomaly) -> dict:
+    return AnomalyOut.model_validate(row, from_attributes=True).model_dump(mode="json")
+
+
+def _query(
+    session: Session,
+    group_id: str,
+    metric: Optional[str],
+    layer_min: Optional[int],
+    layer_max: Optional[int],
+    layer_id: Optional[str] = None,
+):
+    stmt = select(LayerAnomaly).where(LayerAnomaly.group_id == group_id)
+    if layer_id is not None:
+        stmt = stmt.where(LayerAnomaly.layer_id == layer_id)
+    if metric is not None:
+        stmt = stmt.where(LayerAnomaly.metric == metric)
+    if layer_min is not None:
+        stmt = stmt.where(LayerAnomaly.layer_number >= layer_min)
+    if layer_max is not None:
+        stmt = stmt.where(LayerAnomaly.layer_number <= layer_max)
+    return stmt.order_by(LayerAnomaly.layer_number, LayerAnomaly.metric, LayerAnomaly.start_seq)
+
+
+def layer_anomalies_json(layer_id: str, metric: Optional[str] = None) -> bytes:
+    """A layer's anomaly ranges as a LayerAnomaliesOut JSON body."""
+    with get_session() as session:
+        layer = session.get(Layer, layer_id)
+        if not layer:
+            raise ValueError("layer_not_found")
+        group = session.get(WeldGroup, layer.group_id)
+        if group and group.ingest_complete:
+            build_layer_anomalies(session, [layer])
+        rows = session.exec(_query(session, layer.group_id, metric, None, None, layer_id)).all()
+        body = {
+            "layer_id": layer.id,
+            "group_id": layer.group_id,
+            "layer_number": layer.layer_number,
+            "anomalies": [_out(r) for r in rows],
+        }
+    return dumps(body).encode("utf-8")
+
+
+def group_anomalies_json(
+    group_id: str,
+    metric: Optional[str] = None,
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+    limit: int = 1000,
+) -> bytes:
+    """
+    Anomaly ranges of a group's layers in layer order, as a
+    GroupAnomaliesOut JSON body. `total` and `by_metric` count every match;
+    at most `limit` ranges are listed.
+    """
+    with get_session() as session:
+        group = session.get(WeldGroup, group_id)
+        if not group:
+            raise ValueError("group_not_found")
+        if group.ingest_complete:
+            stmt = select(Layer).where(Layer.group_id == group_id)
+            if layer_min is not None:
+                stmt = stmt.where(Layer.layer_number >= layer_min)
+            if layer_max is not None:
+                stmt = stmt.where(Layer.layer_number <= layer_max)
+            build_layer_anomalies(session, session.exec(stmt).all())
+        rows = session.exec(_query(session, group_id, metric, layer_min, layer_max)).all()
+        by_metric: Dict[str, int] = {}
+        for r in rows:
+            by_metric[r.metric] = by_metric.get(r.metric, 0) + 1
+        body = {
+            "group_id": group_id,
+            "total": len(rows),
+            "by_metric": by_metric,
+            "truncated": len(rows) > limit,
+            "anomalies": [_out(r) for r in rows[:limit]],
+        }
+    return dumps(body).encode("utf-8")
@@ -1,214 +1,455 @@
-from typing import Dict, List, Optional
-from statistics import fmean
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
 from sqlmodel import select
 
-from app.database.db import get_session
-from app.database.models import Layer, ScanData, WeldGroup, WeldData
+from app.database.db import get_session, read_snapshot
+from app.database.models import (
+    GroupSummary,
+    Layer,
+    LayerSummary,
+    WeldGroup,
+    WeldRollupBase,
+)
 from app.database.schemas import (
     GroupWeldDataOut,
     LayerDataOut,
+    MetricDistributionOut,
+    ProcessMetricsOut,
     ScanDataOut,
     WeldDataOut,
     WeldDataSummary,
 )
+from app.services.distributions import (
+    compute_distributions,
+    compute_layer_distributions,
+    distributions_json,
+)
+from app.services.process_metrics import (
+    SAMPLE_COLUMNS,
+    group_process,
+    layers_process,
+    sample_metrics,
+)
+from app.services.storage import (
+    StoredScanColumns,
+    load_scan_columns,
+    load_scan_columns_many,
+    load_weld_columns,
+    load_weld_columns_many,
+)
+from app.services.summaries import (
+    SUMMARY_METRICS,
+    build_group_summaries,
+    merge_rollups,
+    rollup_fields,
+    rollup_to_summary,
+    stream_layer_rollups,
+)
+from app.utils.binary_format import encode_columns
+from app.utils.downsample import lttb_union_indices, minmax_indices
+from app.utils.json_format import dumps, encode_object, encode_rows
+from app.utils.parsers import WeldColumns
 
+# Most layers one batch request may return.
+BATCH_MAX_LAYERS = int(os.getenv("BATCH_MAX_LAYERS", "200"))
+# Threads that downsample and encode the layers of a batch request.
+LAYER_ASSEMBLY_THREADS = int(os.getenv("LAYER_ASSEMBLY_THREADS", str(min(4, os.cpu_count() or 1))))
 
-def _min_or_none(vals: List[Optional[float]]) -> Optional[float]:
-    clean = [v for v in vals if v is not None]
-    return min(clean) if clean else None
+_assembly_pool = ThreadPoolExecutor(
+    max_workers=LAYER_ASSEMBLY_THREADS, thread_name_prefix="layer-assembly"
+)
 
 
-def _max_or_none(vals: List[Optional[float]]) -> Optional[float]:
-    clean = [v for v in vals if v is not None]
-    return max(clean) if clean else None
+def _nullable(vals: np.ndarray) -> List[Optional[float]]:
+    # NaN (SQL NULL) -> None for the response models.
+    out = vals.tolist()
+    if np.isnan(vals).any():
+        out = [None if v != v else v for v in out]
+    return out
 
 
-def _avg_or_none(vals: List[Optional[float]]) -> Optional[float]:
-    clean = [v for v in vals if v is not None]
-    return fmean(clean) if clean else None
+def _summarize(weld: WeldColumns) -> WeldDataSummary:
+    return rollup_to_summary(WeldRollupBase(**rollup_fields(weld)))
 
 
-def compute_layer_data(layer_id: str) -> LayerDataOut:
+def _reduce_layer(
+    scan: StoredScanColumns,
+    weld: WeldColumns,
+    max_points: Optional[int],
+    process: bool = False,
+) -> Tuple[StoredScanColumns, WeldColumns, WeldDataSummary, Dict[str, np.ndarray]]:
     """
-    Build a LayerDataOut using WeldData rows for a single layer.
+    With `process`, the derived per-sample process columns (see
+    `sample_metrics`) are computed over every weld sample and reduced with
+    the same indices as the weld columns; otherwise the dict is empty.
+    """
+    summary = _summarize(weld)
+    derived = sample_metrics(weld) if process else {}
+    if max_points is not None:
+        weld_idx = lttb_union_indices(
+            weld.seq, [getattr(weld, c) for c in SUMMARY_METRICS.values()], max_points
+        )
+        weld = WeldColumns(*(c[weld_idx] for c in weld))
+        derived = {name: col[weld_idx] for name, col in derived.items()}
+        scan_idx = minmax_indices(scan.scan_value, max_points)
+        scan = StoredScanColumns(*(c[scan_idx] for c in scan))
+    return scan, weld, summary, derived
+
+
+def _load_layer(
+    layer_id: str, max_points: Optional[int], process: bool = False
+) -> Tuple[Layer, StoredScanColumns, WeldColumns, WeldDataSummary, Dict[str, np.ndarray]]:
+    """
+    Load a layer's columns and summary. With `max_points`, weld samples are
+    reduced with LTTB over the metric series and scan samples with
+    min/max-per-bucket on scan_value, each to at most `max_points` points;
+    the summary always uses every sample. `process`: see `_reduce_layer`.
     """
     with get_session() as session:
         layer = session.get(Layer, layer_id)
         if not layer:
             raise ValueError("layer_not_found")
 
-        weld_rows: List[WeldData] = (
-            session.exec(
-                select(WeldData)
-                .where(WeldData.layer_id == layer_id)
-                .order_by(WeldData.seq)  # type: ignore
-            )
-        ).all()
-        
-        scan_rows: List[ScanData] = (
-            session.exec(
-                select(ScanData)
-                .where(ScanData.layer_id == layer_id)
-                .order_by(ScanData.seq)  # type: ignore
-            )
-        ).all()
+        weld = load_weld_columns(session, layer_id)
+        scan = load_scan_columns(session, layer_id)
 
-        weld_points: List[WeldDataOut] = []
-        for r in weld_rows:
-            weld_points.append(
-                WeldDataOut(
-                    layer_id=r.layer_id,
-                    layer_number=layer.layer_number,
-                    seq=r.seq,
-                    x=r.x,
-                    y=r.y,
-                    z=r.z,
-                    wire_feed_rate=r.wire_feed_rate,
-                    travel_speed=r.robot_speed,  # map robot_speed -> travel_speed
-                    voltage=r.voltage,
-                    current=r.current,
-                )
-            )
+    return (layer, *_reduce_layer(scan, weld, max_points, process))
 
-        wire_feed_rate_vals: List[Optional[float]] = [
-            p.wire_feed_rate for p in weld_points
-        ]
-        travel_speed_vals: List[Optional[float]] = [
-            p.travel_speed for p in weld_points
+
+def compute_layer_binary(
+    layer_id: str,
+    max_points: Optional[int] = None,
+    distributions: bool = False,
+    process: bool = False,
+) -> bytes:
+    """
+    Same content as `compute_layer_data`, encoded as a packed SSAL columnar
+    payload (see app/utils/binary_format.py). `distributions` and the
+    `process` totals go in the header, the per-sample process columns in
+    the weld_data table.
+    """
+    layer, scan, weld, summary, derived = _load_layer(layer_id, max_points, process)
+    meta = {
+        "layer_id": layer.id,
+        "group_id": layer.group_id,
+        "layer_number": layer.layer_number,
+        "summary": summary.model_dump(),
+    }
+    if distributions:
+        meta["distributions"] = {
+            metric: d.model_dump(mode="json") for metric, d in _layer_distributions(layer).items()
+        }
+    if process:
+        meta["process"] = _layer_process(layer).model_dump(mode="json")
+    tables = {
+        "scan_data": {
+            "seq": scan.seq,
+            "x": scan.x,
+            "y": scan.y,
+            "z": scan.z,
+            "scan_value": scan.scan_value,
+        },
+        "weld_data": {
+            "seq": weld.seq,
+            "x": weld.x,
+            "y": weld.y,
+            "z": weld.z,
+            "wire_feed_rate": weld.wire_feed_rate,
+            "travel_speed": weld.robot_speed,
+            "voltage": weld.voltage,
+            "current": weld.current,
+            **derived,
+        },
+    }
+    return encode_columns(meta, tables)
+
+
+def _layer_distributions(layer: Layer) -> Dict[str, MetricDistributionOut]:
+    with get_session() as session:
+        return compute_distributions(session, layer.group_id, [layer])
+
+
+def _layer_process(layer: Layer) -> ProcessMetricsOut:
+    with get_session() as session:
+        group = session.get(WeldGroup, layer.group_id)
+        complete = bool(group and group.ingest_complete)
+        return layers_process(session, [layer], complete)[layer.id]
+
+
+def _layer_json(
+    layer: Layer,
+    scan: StoredScanColumns,
+    weld: WeldColumns,
+    summary: WeldDataSummary,
+    distributions: Optional[Dict[str, MetricDistributionOut]] = None,
+    derived: Optional[Dict[str, np.ndarray]] = None,
+    process: Optional[ProcessMetricsOut] = None,
+) -> str:
+    point = {"layer_id": layer.id, "layer_number": layer.layer_number}
+    scan_json = encode_rows(
+        point,
+        [
+            ("seq", scan.seq, "int"),
+            ("x", scan.x, "float"),
+            ("y", scan.y, "float"),
+            ("z", scan.z, "float"),
+            ("scan_value", scan.scan_value, "float?"),
+        ],
+    )
+    weld_json = encode_rows(
+        point,
+        [
+            ("seq", weld.seq, "int"),
+            ("x", weld.x, "float"),
+            ("y", weld.y, "float"),
+            ("z", weld.z, "float"),
+            ("wire_feed_rate", weld.wire_feed_rate, "float?"),
+            ("travel_speed", weld.robot_speed, "float?"),
+            ("voltage", weld.voltage, "float?"),
+            ("current", weld.current, "float?"),
+            *((name, derived[name], "float?") for name in SAMPLE_COLUMNS if derived),
+        ],
+    )
+    raw = {
+        "scan_data": scan_json,
+        "weld_data": weld_json,
+        "summary": dumps(summary.model_dump(mode="json")),
+    }
+    if distributions is not None:
+        raw["distributions"] = distributions_json(distributions)
+    if process is not None:
+        raw["process"] = dumps(process.model_dump(mode="json"))
+    return encode_object(
+        {"layer_id": layer.id, "group_id": layer.group_id, "layer_number": layer.layer_number},
+        raw,
+    )
+
+
+def compute_layer_json(
+    layer_id: str,
+    max_points: Optional[int] = None,
+    distributions: bool = False,
+    process: bool = False,
+) -> bytes:
+    """
+    Fast path for `compute_layer_data`: the same response, byte for byte,
+    encoded straight from the column arrays without building a Pydantic
+    model per point. `distributions` adds the per-metric percentiles and
+    histograms (see app/services/distributions.py); `process` the layer's
+    process totals and per-sample process columns on every weld point
+    (see app/services/process_metrics.py).
+    """
+    layer, scan, weld, summary, derived = _load_layer(layer_id, max_points, process)
+    dists = _layer_distributions(layer) if distributions else None
+    totals = _layer_process(layer) if process else None
+    return _layer_json(layer, scan, weld, summary, dists, derived, totals).encode("utf-8")
+
+
+def compute_layers_json(
+    group_id: str,
+    layer_ids: Optional[Sequence[str]] = None,
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+    max_points: Optional[int] = None,
+    distributions: bool = False,
+    process: bool = False,
+) -> bytes:
+    """
+    Several layers of a group in one LayersDataOut body, each entry exactly
+    what /api/layers/{id}/data returns. Layers are picked by id or by
+    layer-number range (both may be combined) and come in layer order.
+    Samples are read with two set-based queries per kind (see
+    `load_*_columns_many`); per-layer downsampling and encoding then run
+    on LAYER_ASSEMBLY_THREADS threads.
+    """
+    with get_session() as session:
+        if not session.get(WeldGroup, group_id):
+            raise ValueError("group_not_found")
+        stmt = select(Layer).where(Layer.group_id == group_id)
+        if layer_ids:
+            stmt = stmt.where(Layer.id.in_(layer_ids))  # type: ignore
+        layers = session.exec(stmt.order_by(Layer.layer_number)).all()  # type: ignore
+        if layer_ids and len(layers) < len(set(layer_ids)):
+            raise ValueError("layer_not_found")
+        layers = [
+            layer
+            for layer in layers
+            if (layer_min is None or layer.layer_number >= layer_min)
+            and (layer_max is None or layer.layer_number <= layer_max)
         ]
-        voltage_vals: List[Optional[float]] = [p.voltage for p in weld_points]
-        current_vals: List[Optional[float]] = [p.current for p in weld_points]
-
-        summary = WeldDataSummary(
-            n=len(weld_points),
-            wire_feed_rate_avg=_avg_or_none(wire_feed_rate_vals),
-            wire_feed_rate_min=_min_or_none(wire_feed_rate_vals),
-            wire_feed_rate_max=_max_or_none(wire_feed_rate_vals),
-            travel_speed_avg=_avg_or_none(travel_speed_vals),
-            travel_speed_min=_min_or_none(travel_speed_vals),
-            travel_speed_max=_max_or_none(travel_speed_vals),
-            voltage_avg=_avg_or_none(voltage_vals),
-            voltage_min=_min_or_none(voltage_vals),
-            voltage_max=_max_or_none(voltage_vals),
-            current_avg=_avg_or_none(current_vals),
-            current_min=_min_or_none(current_vals),
-            current_max=_max_or_none(current_vals),
+        if len(layers) > BATCH_MAX_LAYERS:
+            raise ValueError("too_many_layers")
+        complete = session.get(WeldGroup, group_id).ingest_complete
+        ids = [layer.id for layer in layers]
+        scans = load_scan_columns_many(session, ids)
+        welds = load_weld_columns_many(session, ids)
+        dists = compute_layer_distributions(session, group_id, layers) if distributions else {}
+    procs = {}
+    if process:
+        # Own session: a backfill commits, which would expire `layers` above.
+        with get_session() as session:
+            procs = layers_process(session, layers, complete)
+
+    def assemble(layer: Layer) -> str:
+        scan, weld, summary, derived = _reduce_layer(
+            scans[layer.id], welds[layer.id], max_points, process
+        )
+        return _layer_json(
+            layer, scan, weld, summary, dists.get(layer.id), derived, procs.get(layer.id)
         )
 
-        return LayerDataOut(
+    parts = list(_assembly_pool.map(assemble, layers))
+    return encode_object(
+        {"group_id": group_id, "count": len(parts)}, {"layers": "[" + ",".join(parts) + "]"}
+    ).encode("utf-8")
+
+
+def compute_layer_data(layer_id: str, max_points: Optional[int] = None) -> LayerDataOut:
+    """
+    Build a LayerDataOut using WeldData rows for a single layer
+    (optionally downsampled, see `_load_layer`).
+    """
+    layer, scan, weld, summary, _ = _load_layer(layer_id, max_points)
+
+    weld_points: List[WeldDataOut] = [
+        WeldDataOut(
             layer_id=layer.id,
-            group_id=layer.group_id,
             layer_number=layer.layer_number,
-            scan_data=[
-                ScanDataOut(
-                    layer_id=r.layer_id,
-                    layer_number=layer.layer_number,
-                    seq=r.seq,
-                    x=r.x,
-                    y=r.y,
-                    z=r.z,
-                    scan_value=r.scan_value,
-                )
-                for r in scan_rows
-            ],
-            weld_data=weld_points,
-            summary=summary,
+            seq=seq,
+            x=x,
+            y=y,
+            z=z,
+            wire_feed_rate=wfr,
+            travel_speed=rs,  # map robot_speed -> travel_speed
+            voltage=volt,
+            current=cur,
+        )
+        for seq, x, y, z, wfr, rs, volt, cur in zip(
+            weld.seq.tolist(),
+            weld.x.tolist(),
+            weld.y.tolist(),
+            weld.z.tolist(),
+            _nullable(weld.wire_feed_rate),
+            _nullable(weld.robot_speed),
+            _nullable(weld.voltage),
+            _nullable(weld.current),
         )
+    ]
+
+    return LayerDataOut(
+        layer_id=layer.id,
+        group_id=layer.group_id,
+        layer_number=layer.layer_number,
+        scan_data=[
+            ScanDataOut(
+                layer_id=layer.id,
+                layer_number=layer.layer_number,
+                seq=seq,
+                x=x,
+                y=y,
+                z=z,
+                scan_value=value,
+            )
+            for seq, x, y, z, value in zip(
+                scan.seq.tolist(),
+                scan.x.tolist(),
+                scan.y.tolist(),
+                scan.z.tolist(),
+                _nullable(scan.scan_value),
+            )
+        ],
+        weld_data=weld_points,
+        summary=summary,
+    )
 
 
 def compute_group_data(group_id: str) -> GroupWeldDataOut:
     """
     Build a GroupWeldDataOut summary for a group, including per-layer summaries
-    (ordered by layer_number).
+    (ordered by layer_number). Served from the materialized LayerSummary /
+    GroupSummary rollups once ingest has completed; groups still ingesting are
+    summarized from their samples.
     """
     with get_session() as session:
         group = session.get(WeldGroup, group_id)
         if not group:
             raise ValueError("group_not_found")
+        if group.ingest_complete and session.get(GroupSummary, group_id) is None:
+            build_group_summaries(session, group_id)
 
-        rows: List[tuple[WeldData, str, int]] = session.exec(
-            select(WeldData, Layer.id, Layer.layer_number)
-            .join(Layer, Layer.id == WeldData.layer_id)  # type: ignore
-            .where(Layer.group_id == group_id)
-            .order_by(Layer.layer_number, WeldData.seq)  # type: ignore
-        ).all()
+    with get_session() as session:
+        # Group and layer rollups from the same commit, even mid-ingest.
+        read_snapshot(session)
+        group = session.get(WeldGroup, group_id)
+        if not group:
+            raise ValueError("group_not_found")
+        group_row = session.get(GroupSummary, group_id)
 
-        per_layer_vals: Dict[str, Dict[str, List[Optional[float]]]] = {}
-        per_layer_number: Dict[str, int] = {}
-
-        group_wire_feed_rate: List[Optional[float]] = []
-        group_travel_speed: List[Optional[float]] = []
-        group_voltage: List[Optional[float]] = []
-        group_current: List[Optional[float]] = []
-
-        for sample, l_id, l_num in rows:
-            bucket = per_layer_vals.setdefault(
-                l_id,
-                {
-                    "wire_feed_rate": [],
-                    "travel_speed": [],
-                    "voltage": [],
-                    "current": [],
-                },
+        if group_row is not None:
+            layer_rows = session.exec(
+                select(LayerSummary)
+                .where(LayerSummary.group_id == group_id)
+                .where(LayerSummary.n > 0)
+                .order_by(LayerSummary.layer_number)  # type: ignore
+            ).all()
+            # An append job commits its layers before folding them into the
+            # GroupSummary; until it finishes, summarize the listed layers.
+            summary = (
+                rollup_to_summary(group_row)
+                if group.ingest_complete
+                else rollup_to_summary(WeldRollupBase(**merge_rollups(layer_rows)))
             )
-            per_layer_number[l_id] = l_num
-
-            bucket["wire_feed_rate"].append(sample.wire_feed_rate)
-            bucket["travel_speed"].append(sample.robot_speed)
-            bucket["voltage"].append(sample.voltage)
-            bucket["current"].append(sample.current)
-
-            group_wire_feed_rate.append(sample.wire_feed_rate)
-            group_travel_speed.append(sample.robot_speed)
-            group_voltage.append(sample.voltage)
-            group_current.append(sample.current)
-
-        per_layer_entries: List[tuple[int, WeldDataSummary]] = []
-        for l_id, vals in per_layer_vals.items():
-            wire_feed_rate = vals["wire_feed_rate"]
-            travel_speed = vals["travel_speed"]
-            voltage = vals["voltage"]
-            current = vals["current"]
-
-            summary = WeldDataSummary(
-                n=len(wire_feed_rate),
-                wire_feed_rate_avg=_avg_or_none(wire_feed_rate),
-                wire_feed_rate_min=_min_or_none(wire_feed_rate),
-                wire_feed_rate_max=_max_or_none(wire_feed_rate),
-                travel_speed_avg=_avg_or_none(travel_speed),
-                travel_speed_min=_min_or_none(travel_speed),
-                travel_speed_max=_max_or_none(travel_speed),
-                voltage_avg=_avg_or_none(voltage),
-                voltage_min=_min_or_none(voltage),
-                voltage_max=_max_or_none(voltage),
-                current_avg=_avg_or_none(current),
-                current_min=_min_or_none(current),
-                current_max=_max_or_none(current),
+            return GroupWeldDataOut(
+                group_id=group.id,
+                name=group.name,
+                summary=summary,
+                per_layer=[rollup_to_summary(r) for r in layer_rows],
             )
-            per_layer_entries.append((per_layer_number[l_id], summary))
-
-        per_layer_entries.sort(key=lambda t: t[0])
-        per_layer_summaries: List[WeldDataSummary] = [t[1] for t in per_layer_entries]
-
-        group_summary = WeldDataSummary(
-            n=len(group_wire_feed_rate),
-            wire_feed_rate_avg=_avg_or_none(group_wire_feed_rate),
-            wire_feed_rate_min=_min_or_none(group_wire_feed_rate),
-            wire_feed_rate_max=_max_or_none(group_wire_feed_rate),
-            travel_speed_avg=_avg_or_none(group_travel_speed),
-            travel_speed_min=_min_or_none(group_travel_speed),
-            travel_speed_max=_max_or_none(group_travel_speed),
-            voltage_avg=_avg_or_none(group_voltage),
-            voltage_min=_min_or_none(group_voltage),
-            voltage_max=_max_or_none(group_voltage),
-            current_avg=_avg_or_none(group_current),
-            current_min=_min_or_none(group_current),
-            current_max=_max_or_none(group_current),
-        )
+
+        layers = session.exec(
+            select(Layer)
+            .where(Layer.group_id == group_id)
+            .order_by(Layer.layer_number)  # type: ignore
+        ).all()
+
+        # Groups still ingesting: one layer's rollup at a time, merged at the end.
+        per_layer_summaries: List[WeldDataSummary] = []
+        rollups: List[WeldRollupBase] = []
+        for _, fields in stream_layer_rollups(session, group_id, layers):
+            if not fields["n"]:
+                continue
+            rollup = WeldRollupBase(**fields)
+            per_layer_summaries.append(rollup_to_summary(rollup))
+            rollups.append(rollup)
 
         return GroupWeldDataOut(
             group_id=group.id,
             name=group.name,
-            summary=group_summary,
+            summary=rollup_to_summary(WeldRollupBase(**merge_rollups(rollups))),
             per_layer=per_layer_summaries,
-        )
\ No newline at end of file
+        )
+
+
+def compute_group_json(
+    group_id: str, distributions: bool = False, process: bool = False
+) -> bytes:
+    """
+    `compute_group_data` as a JSON body; `distributions` adds the group's
+    per-metric percentiles and histograms, merged from the layer sketches,
+    and `process` the group and per-layer process totals.
+    """
+    data = compute_group_data(group_id).model_dump(mode="json")
+    if not distributions and not process:
+        return dumps(data).encode("utf-8")
+    raw = {}
+    with get_session() as session:
+        if distributions:
+            raw["distributions"] = distributions_json(compute_distributions(session, group_id))
+        if process:
+            group = session.get(WeldGroup, group_id)
+            layers = session.exec(select(Layer).where(Layer.group_id == group_id)).all()
+            out = group_process(session, group_id, layers, group.ingest_complete)
+            raw["process"] = dumps(out.model_dump(mode="json"))
+    return encode_object(data, raw).encode("utf-8")
@@ -0,0 +1,254 @@
+# app/services/correlation.py
+"""
+Scan-to-weld correlation by nearest-neighbour join on position.
+
+Scan and weld samples of a layer are recorded on separate seq timelines; the
+only link between them is where they were taken. Each scan point is matched
+to the nearest weld sample within `tolerance` (a grid-hash search, see
+app/utils/gridhash.py, O(n log n)), which pairs every bead-height
+`scan_value` with the wire feed, travel speed, voltage and current at that
+spot. Per metric the join keeps the sufficient statistics of the pairs
+(n, sums, sums of squares and products). From those come Pearson r and a
+least-squares fit, and the statistics merge exactly across layers for the
+group totals.
+
+The join is stored per layer and tolerance in LayerCorrelation once the
+group's ingest is complete, so only the first request pays for it. Rows
+built under another config fingerprint are rebuilt, because scan values
+depend on the transform config.
+"""
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+import app.utils.config_loader as cfg
+from app.database.db import get_session
+from app.database.models import Layer, LayerCorrelation, WeldGroup
+from app.services.storage import StoredScanColumns, load_scan_columns, load_weld_columns
+from app.services.summaries import SUMMARY_METRICS
+from app.utils.gridhash import nearest_within
+from app.utils.json_format import dumps, encode_object, encode_rows
+from app.utils.parsers import WeldColumns
+
+# Default match radius (data units, mm) when a request does not give one.
+CORRELATION_TOLERANCE = float(os.getenv("CORRELATION_TOLERANCE", "1.0"))
+
+
+def _join(
+    scan: StoredScanColumns, weld: WeldColumns, tolerance: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Per scan sample: position of the matched weld sample (-1 for none) and distance."""
+    ref = np.column_stack((weld.x, weld.y, weld.z)).astype(np.float64, copy=False)
+    query = np.column_stack((scan.x, scan.y, scan.z)).astype(np.float64, copy=False)
+    return nearest_within(ref, query, tolerance)
+
+
+def _pair_stats(scan: StoredScanColumns, weld: WeldColumns, idx: np.ndarray) -> Dict[str, List[float]]:
+    """Per metric [n, sx, sy, sxx, syy, sxy] over the matched pairs, x = metric, y = scan_value."""
+    hit = idx >= 0
+    y_all = np.asarray(scan.scan_value, dtype=np.float64)[hit]
+    out = {}
+    for metric, column in SUMMARY_METRICS.items():
+        x = np.asarray(getattr(weld, column), dtype=np.float64)[idx[hit]]
+        ok = ~(np.isnan(x) | np.isnan(y_all))
+        x, y = x[ok], y_all[ok]
+        out[metric] = [
+            float(x.size),
+            float(x.sum()),
+            float(y.sum()),
+            float((x * x).sum()),
+            float((y * y).sum()),
+            float((x * y).sum()),
+        ]
+    return out
+
+
+def _fit(s: Sequence[float]) -> dict:
+    n, sx, sy, sxx, syy, sxy = s
+    out = {"n": int(n), "r": None, "slope": None, "intercept": None}
+    if n < 2:
+        return out
+    vx = n * sxx - sx * sx
+    vy = n * syy - sy * sy
+    cov = n * sxy - sx * sy
+    if vx > 0:
+        out["slope"] = cov / vx
+        out["intercept"] = (sy - out["slope"] * sx) / n
+        if vy > 0:
+            out["r"] = float(np.clip(cov / np.sqrt(vx * vy), -1.0, 1.0))
+    return out
+
+
+def _build(
+    layer: Layer, scan: StoredScanColumns, weld: WeldColumns, tolerance: float
+) -> LayerCorrelation:
+    idx, dist = _join(scan, weld, tolerance)
+    hit = idx >= 0
+    weld_seq = np.full(idx.shape[0], -1, dtype="<i8")
+    weld_seq[hit] = weld.seq[idx[hit]]
+    stats = {
+        "distance_sum": float(dist[hit].sum()),
+        "distance_max": float(dist[hit].max()) if hit.any() else None,
+        "metrics": _pair_stats(scan, weld, idx),
+    }
+    return LayerCorrelation(
+        layer_id=layer.id,
+        tolerance=tolerance,
+        group_id=layer.group_id,
+        layer_number=layer.layer_number,
+        config=cfg.fingerprint(),
+        scan_count=int(scan.seq.shape[0]),
+        weld_count=int(weld.seq.shape[0]),
+        matched=int(hit.sum()),
+        weld_seq=weld_seq.tobytes(),
+        distance=dist.astype("<f4").tobytes(),
+        stats=dumps(stats),
+    )
+
+
+def _correlations(
+    session: Session, layers: Sequence[Layer], tolerance: float, persist: bool
+) -> Dict[str, LayerCorrelation]:
+    """
+    layer id -> its join at `tolerance`, building missing or outdated ones
+    one layer in memory at a time. With `persist` they are stored (commits).
+    """
+    ids = [layer.id for layer in layers]
+    rows = {
+        r.layer_id: r
+        for r in session.exec(
+            select(LayerCorrelation)
+            .where(LayerCorrelation.layer_id.in_(ids))  # type: ignore
+            .where(LayerCorrelation.tolerance == tolerance)
+        ).all()
+    }
+    fingerprint = cfg.fingerprint()
+    for layer in layers:
+        row = rows.get(layer.id)
+        if row is not None and row.config == fingerprint:
+            continue
+        fresh = _build(
+            layer, load_scan_columns(session, layer.id), load_weld_columns(session, layer.id), tolerance
+        )
+        if persist:
+            if row is not None:
+                session.delete(row)
+                session.flush()
+            session.add(fresh)
+            try:
+                session.commit()
+            except IntegrityError:
+                # Another request stored it first; ours is just as good.
+                session.rollback()
+        rows[layer.id] = fresh
+    return rows
+
+
+def _summary(scan_count: int, weld_count: int, matched: int, stats: List[dict]) -> dict:
+    dist_sum = sum(s["distance_sum"] for s in stats)
+    maxes = [s["distance_max"] for s in stats if s["distance_max"] is not None]
+    metrics = {
+        metric: _fit(np.sum([s["metrics"][metric] for s in stats], axis=0).tolist() if stats else [0] * 6)
+        for metric in SUMMARY_METRICS
+    }
+    return {
+        "scan_count": scan_count,
+        "weld_count": weld_count,
+        "matched": matched,
+        "match_rate": matched / scan_count if scan_count else None,
+        "mean_distance": dist_sum / matched if matched else None,
+        "max_distance": max(maxes) if maxes else None,
+        "correlation": metrics,
+    }
+
+
+def _layer_fields(row: LayerCorrelation) -> dict:
+    return {
+        "layer_id": row.layer_id,
+        "group_id": row.group_id,
+        "layer_number": row.layer_number,
+        "tolerance": row.tolerance,
+        **_summary(row.scan_count, row.weld_count, row.matched, [json.loads(row.stats)]),
+    }
+
+
+def _points_json(row: LayerCorrelation, scan: StoredScanColumns, weld: WeldColumns) -> str:
+    weld_seq = np.frombuffer(row.weld_seq, dtype="<i8")
+    dist = np.frombuffer(row.distance, dtype="<f4").astype(np.float64)
+    hit = np.flatnonzero(weld_seq >= 0)
+    wpos = np.searchsorted(weld.seq, weld_seq[hit])
+    columns = [
+        ("seq", scan.seq[hit], "int"),
+        ("x", scan.x[hit], "float"),
+        ("y", scan.y[hit], "float"),
+        ("z", scan.z[hit], "float"),
+        ("scan_value", scan.scan_value[hit], "float?"),
+        ("weld_seq", weld_seq[hit], "int"),
+        ("distance", dist[hit], "float"),
+    ]
+    columns += [
+        (metric, getattr(weld, column)[wpos], "float?") for metric, column in SUMMARY_METRICS.items()
+    ]
+    return encode_rows({}, columns)
+
+
+def layer_correlation_json(layer_id: str, tolerance: Optional[float] = None, points: bool = True) -> bytes:
+    """
+    One layer's scan-to-weld join as a LayerCorrelationOut JSON body; with
+    `points`, the matched scan points and their weld values too.
+    """
+    tolerance = CORRELATION_TOLERANCE if tolerance is None else tolerance
+    with get_session() as session:
+        layer = session.get(Layer, layer_id)
+        if not layer:
+            raise ValueError("layer_not_found")
+        group = session.get(WeldGroup, layer.group_id)
+        row = _correlations(session, [layer], tolerance, persist=bool(group and group.ingest_complete))[layer.id]
+        fields = _layer_fields(row)
+        if not points:
+            return dumps(fields).encode("utf-8")
+        scan = load_scan_columns(session, layer.id)
+        weld = load_weld_columns(session, layer.id)
+    return encode_object(fields, {"points": _points_json(row, scan, weld)}).encode("utf-8")
+
+
+def group_correlation_json(
+    group_id: str,
+    tolerance: Optional[float] = None,
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+) -> bytes:
+    """
+    Per-layer join statistics of a group, plus the statistics pooled over
+    every layer in the range, as a GroupCorrelationOut JSON body.
+    """
+    tolerance = CORRELATION_TOLERANCE if tolerance is None else tolerance
+    with get_session() as session:
+        group = session.get(WeldGroup, group_id)
+        if not group:
+            raise ValueError("group_not_found")
+        stmt = select(Layer).where(Layer.group_id == group_id)
+        if layer_min is not None:
+            stmt = stmt.where(Layer.layer_number >= layer_min)
+        if layer_max is not None:
+            stmt = stmt.where(Layer.layer_number <= layer_max)
+        layers = session.exec(stmt.order_by(Layer.layer_number)).all()
+        rows = _correlations(session, layers, tolerance, persist=group.ingest_complete)
+        ordered = [rows[layer.id] for layer in layers]
+        pooled = _summary(
+            sum(r.scan_count for r in ordered),
+            sum(r.weld_count for r in ordered),
+            sum(r.matched for r in ordered),
+            [json.loads(r.stats) for r in ordered],
+        )
+        body = {
+            "group_id": group_id,
+            "tolerance": tolerance,
+            **pooled,
+            "layers": [_layer_fields(r) for r in ordered],
+        }
+    return dumps(body).encode("utf-8")
@@ -0,0 +1,186 @@
+# app/services/distributions.py
+"""
+Per-metric distributions: percentiles from mergeable t-digests and
+fixed-bin histograms.
+
+Ingest writes one LayerSketch per layer and weld metric. A layer's
+distribution is read straight from its sketches; a group's is the merge of
+its layers' digests and the sum of their histogram counts, so no request
+ever sorts samples. Percentiles, digest compression and histogram bins come
+from `analytics` in the config (app/config/v0.1/analytics.json); sketches
+taken with other histogram bins, or missing for layers ingested before
+sketches existed, are rebuilt from the samples one layer at a time.
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, delete, select
+
+import app.utils.config_loader as cfg
+from app.database.models import Layer, LayerSketch, WeldGroup
+from app.database.schemas import HistogramOut, MetricDistributionOut
+from app.services.storage import load_weld_columns
+from app.services.summaries import SUMMARY_METRICS
+from app.utils import tdigest
+from app.utils.json_format import dumps
+from app.utils.parsers import WeldColumns
+
+DEFAULT_ANALYTICS = {
+    "percentiles": [1, 50, 99],
+    "sketch_compression": 200,
+    "histograms": {},
+}
+DEFAULT_HISTOGRAM = {"min": 0.0, "max": 100.0, "bins": 50}
+
+
+def _analytics() -> dict:
+    return {**DEFAULT_ANALYTICS, **cfg.CONFIG.get("analytics", {})}
+
+
+def histogram_spec(metric: str) -> tdigest.HistogramSpec:
+    spec = {**DEFAULT_HISTOGRAM, **_analytics()["histograms"].get(metric, {})}
+    return tdigest.HistogramSpec(float(spec["min"]), float(spec["max"]), int(spec["bins"]))
+
+
+def _compression() -> float:
+    return float(_analytics()["sketch_compression"])
+
+
+def _layer_sketches(layer: Layer, weld: WeldColumns) -> List[LayerSketch]:
+    out = []
+    for metric, column in SUMMARY_METRICS.items():
+        vals = getattr(weld, column)
+        spec = histogram_spec(metric)
+        out.append(
+            LayerSketch(
+                layer_id=layer.id,
+                metric=metric,
+                group_id=layer.group_id,
+                layer_number=layer.layer_number,
+                digest=tdigest.to_bytes(tdigest.build(vals, _compression())),
+                hist_min=spec.min,
+                hist_max=spec.max,
+                bins=spec.bins,
+                counts=tdigest.histogram(vals, spec).astype("<i8").tobytes(),
+            )
+        )
+    return out
+
+
+def write_layer_sketches(session: Session, layer: Layer, weld: WeldColumns) -> None:
+    """Add the LayerSketch rows for a freshly written layer (no commit)."""
+    session.add_all(_layer_sketches(layer, weld))
+
+
+def _current(row: LayerSketch) -> bool:
+    return tdigest.HistogramSpec(row.hist_min, row.hist_max, row.bins) == histogram_spec(row.metric)
+
+
+def _sketches(
+    session: Session, layers: Sequence[Layer], persist: bool
+) -> Dict[str, List[LayerSketch]]:
+    """
+    metric -> the sketches of `layers`, rebuilding missing or outdated ones
+    from the samples. With `persist` the rebuilt rows are stored (commits).
+    """
+    ids = [layer.id for layer in layers]
+    rows = session.exec(
+        select(LayerSketch).where(LayerSketch.layer_id.in_(ids))  # type: ignore
+    ).all()
+    by_layer: Dict[str, Dict[str, LayerSketch]] = {}
+    for row in rows:
+        by_layer.setdefault(row.layer_id, {})[row.metric] = row
+
+    rebuilt: List[LayerSketch] = []
+    for layer in layers:
+        have = by_layer.get(layer.id, {})
+        if len(have) == len(SUMMARY_METRICS) and all(map(_current, have.values())):
+            continue
+        fresh = _layer_sketches(layer, load_weld_columns(session, layer.id))
+        by_layer[layer.id] = {row.metric: row for row in fresh}
+        rebuilt += fresh
+
+    if rebuilt and persist:
+        stale = {row.layer_id for row in rebuilt}
+        session.exec(delete(LayerSketch).where(LayerSketch.layer_id.in_(stale)))  # type: ignore
+        session.add_all(rebuilt)
+        try:
+            session.commit()
+        except IntegrityError:
+            # Another request stored them first; ours are just as good.
+            session.rollback()
+
+    out: Dict[str, List[LayerSketch]] = {metric: [] for metric in SUMMARY_METRICS}
+    for layer in layers:
+        for metric, row in by_layer[layer.id].items():
+            out[metric].append(row)
+    return out
+
+
+def _distribution(
+    digest: tdigest.Digest, counts: np.ndarray, spec: tdigest.HistogramSpec
+) -> MetricDistributionOut:
+    qs = [float(p) for p in _analytics()["percentiles"]]
+    values = tdigest.quantiles(digest, [q / 100 for q in qs])
+    return MetricDistributionOut(
+        n=int(round(digest.count)),
+        percentiles={
+            f"p{q:g}": (None if np.isnan(v) else float(v)) for q, v in zip(qs, values.tolist())
+        },
+        histogram=HistogramOut(
+            min=spec.min,
+            max=spec.max,
+            bins=spec.bins,
+            counts=counts[1:-1].tolist(),
+            underflow=int(counts[0]),
+            overflow=int(counts[-1]),
+        ),
+    )
+
+
+def _merged(rows: Sequence[LayerSketch], metric: str) -> MetricDistributionOut:
+    spec = histogram_spec(metric)
+    digest = tdigest.merge([tdigest.from_bytes(r.digest) for r in rows], _compression())
+    counts = np.zeros(spec.bins + 2, dtype=np.int64)
+    for r in rows:
+        counts += np.frombuffer(r.counts, dtype="<i8")
+    return _distribution(digest, counts, spec)
+
+
+def _group_layers(
+    session: Session, group_id: str, layers: Optional[Sequence[Layer]]
+) -> tuple:
+    group = session.get(WeldGroup, group_id)
+    if not group:
+        raise ValueError("group_not_found")
+    if layers is None:
+        layers = session.exec(select(Layer).where(Layer.group_id == group_id)).all()
+    return layers, _sketches(session, layers, persist=group.ingest_complete)
+
+
+def compute_distributions(
+    session: Session, group_id: str, layers: Optional[Sequence[Layer]] = None
+) -> Dict[str, MetricDistributionOut]:
+    """
+    Distributions of every weld metric over `layers` (default: the whole
+    group). Rebuilt sketches are persisted once the group's ingest is complete.
+    """
+    _, sketches = _group_layers(session, group_id, layers)
+    return {metric: _merged(sketches[metric], metric) for metric in SUMMARY_METRICS}
+
+
+def compute_layer_distributions(
+    session: Session, group_id: str, layers: Sequence[Layer]
+) -> Dict[str, Dict[str, MetricDistributionOut]]:
+    """layer id -> that layer's distributions, for several layers of a group at once."""
+    layers, sketches = _group_layers(session, group_id, layers)
+    out: Dict[str, Dict[str, MetricDistributionOut]] = {layer.id: {} for layer in layers}
+    for metric, rows in sketches.items():
+        for row in rows:
+            out[row.layer_id][metric] = _merged([row], metric)
+    return out
+
+
+def distributions_json(dists: Dict[str, MetricDistributionOut]) -> str:
+    return dumps({metric: d.model_dump(mode="json") for metric, d in dists.items()})
@@ -0,0 +1,375 @@
+# app/services/heightmaps.py
+"""
+Per-layer height maps: scan_value binned onto a regular XY grid.
+
+Every scan sample falls into the cell (floor(x / cell), floor(y / cell)) of a
+global lattice, and a cell's height is the mean scan_value of its samples
+(one `bincount` pass per layer). Because the lattice is shared, any two
+layers' grids line up without a common extent: the delta of a layer is its
+grid minus the previous layer's, on the cells both cover.
+
+Grids are stored per layer and cell size in LayerHeightmap as float32 blobs
+with their height statistics. Ingest writes the HEIGHTMAP_CELL_SIZE grid;
+other sizes are built on first request and stored once the group's ingest
+is complete. Grids built under another config fingerprint are rebuilt, since
+scan values depend on the transform config.
+"""
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, delete, select
+
+import app.utils.config_loader as cfg
+from app.database.db import get_session
+from app.database.models import Layer, LayerHeightmap, WeldGroup
+from app.services.storage import load_scan_columns
+from app.utils.binary_format import encode_columns
+from app.utils.json_format import dumps, encode_array, encode_object
+from app.utils.parsers import ScanColumns
+from app.utils.transforms import transform_scan_values
+
+# Default cell edge in x/y (data units, mm); grids of this size are built at ingest.
+HEIGHTMAP_CELL_SIZE = float(os.getenv("HEIGHTMAP_CELL_SIZE", "1.0"))
+# Most cells one response may carry (grid cells times layers).
+HEIGHTMAP_MAX_CELLS = int(os.getenv("HEIGHTMAP_MAX_CELLS", "4000000"))
+
+
+class Grid(NamedTuple):
+    cell: float
+    ix0: int
+    iy0: int
+    heights: np.ndarray  # (ny, nx) float64, NaN for empty cells
+
+    @property
+    def nx(self) -> int:
+        return int(self.heights.shape[1])
+
+    @property
+    def ny(self) -> int:
+        return int(self.heights.shape[0])
+
+
+def bin_heights(x: np.ndarray, y: np.ndarray, values: np.ndarray, cell: float) -> Grid:
+    """Mean of `values` per lattice cell over the samples' bounding cells."""
+    ok = ~(np.isnan(x) | np.isnan(y) | np.isnan(values))
+    if not ok.any():
+        return Grid(cell, 0, 0, np.empty((0, 0)))
+    ix = np.floor(x[ok] / cell).astype(np.int64)
+    iy = np.floor(y[ok] / cell).astype(np.int64)
+    ix0, iy0 = int(ix.min()), int(iy.min())
+    nx, ny = int(ix.max()) - ix0 + 1, int(iy.max()) - iy0 + 1
+    if nx * ny > HEIGHTMAP_MAX_CELLS:
+        raise ValueError("cell_size_too_small")
+    flat = (iy - iy0) * nx + (ix - ix0)
+    sums = np.bincount(flat, weights=values[ok], minlength=nx * ny)
+    counts = np.bincount(flat, minlength=nx * ny)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        heights = np.where(counts > 0, sums / counts, np.nan)
+    return Grid(cell, ix0, iy0, heights.reshape(ny, nx))
+
+
+def place(grid: Grid, ix0: int, iy0: int, nx: int, ny: int) -> np.ndarray:
+    """`grid`'s heights on the extent ix0..ix0+nx-1, iy0..iy0+ny-1 (NaN outside it)."""
+    out = np.full((ny, nx), np.nan)
+    x_lo, x_hi = max(ix0, grid.ix0), min(ix0 + nx, grid.ix0 + grid.nx)
+    y_lo, y_hi = max(iy0, grid.iy0), min(iy0 + ny, grid.iy0 + grid.ny)
+    if x_lo < x_hi and y_lo < y_hi:
+        out[y_lo - iy0 : y_hi - iy0, x_lo - ix0 : x_hi - ix0] = grid.heights[
+            y_lo - grid.iy0 : y_hi - grid.iy0, x_lo - grid.ix0 : x_hi - grid.ix0
+        ]
+    return out
+
+
+def height_stats(heights: np.ndarray, cell: float) -> dict:
+    """Statistics over the non-empty cells of a height (or delta) grid."""
+    vals = heights[~np.isnan(heights)]
+    if vals.size == 0:
+        return {"cells": 0, "area": 0.0, "mean": None, "std": None, "min": None, "max": None, "rms": None}
+    return {
+        "cells": int(vals.size),
+        "area": float(vals.size * cell * cell),
+        "mean": float(vals.mean()),
+        "std": float(vals.std()),
+        "min": float(vals.min()),
+        "max": float(vals.max()),
+        "rms": float(np.sqrt((vals * vals).mean())),
+    }
+
+
+class _LayerRef(NamedTuple):
+    id: str
+    group_id: str
+    layer_number: int
+
+
+class StoredMap(NamedTuple):
+    layer_id: str
+    group_id: str
+    layer_number: int
+    grid: Grid
+    stats: dict
+
+
+def _row(layer: StoredMap) -> LayerHeightmap:
+    grid = layer.grid
+    return LayerHeightmap(
+        layer_id=layer.layer_id,
+        cell=grid.cell,
+        group_id=layer.group_id,
+        layer_number=layer.layer_number,
+        config=cfg.fingerprint(),
+        ix0=grid.ix0,
+        iy0=grid.iy0,
+        nx=grid.nx,
+        ny=grid.ny,
+        heights=grid.heights.astype("<f4").tobytes(),
+        stats=dumps(layer.stats),
+    )
+
+
+def _stored(layer, grid: Grid) -> StoredMap:
+    return StoredMap(layer.id, layer.group_id, layer.layer_number, grid, height_stats(grid.heights, grid.cell))
+
+
+def _from_row(row: LayerHeightmap) -> StoredMap:
+    heights = np.frombuffer(row.heights, dtype="<f4").astype(np.float64).reshape(row.ny, row.nx)
+    grid = Grid(row.cell, row.ix0, row.iy0, heights)
+    return StoredMap(row.layer_id, row.group_id, row.layer_number, grid, json.loads(row.stats))
+
+
+def write_layer_heightmap(session: Session, layer: Layer, scan: ScanColumns) -> None:
+    """Add the HEIGHTMAP_CELL_SIZE grid of a freshly written layer (no commit)."""
+    values = transform_scan_values(scan.raw)
+    try:
+        grid = bin_heights(scan.x, scan.y, values, HEIGHTMAP_CELL_SIZE)
+    except ValueError:
+        return  # too large at the default size; built on request at a coarser one
+    session.add(_row(_stored(layer, grid)))
+
+
+def _heightmaps(
+    session: Session, layers: Sequence[Layer], cell: float, persist: bool
+) -> Dict[str, StoredMap]:
+    """
+    layer id -> its grid at `cell`, building missing or outdated ones one
+    layer in memory at a time. With `persist` they are stored (commits).
+    """
+    # Plain copies up front: every commit below expires the ORM objects.
+    refs = [_LayerRef(layer.id, layer.group_id, layer.layer_number) for layer in layers]
+    fingerprint = cfg.fingerprint()
+    stale: Dict[str, bool] = {}
+    out: Dict[str, StoredMap] = {}
+    for row in session.exec(
+        select(LayerHeightmap)
+        .where(LayerHeightmap.layer_id.in_([r.id for r in refs]))  # type: ignore
+        .where(LayerHeightmap.cell == cell)
+    ).all():
+        if row.config == fingerprint:
+            out[row.layer_id] = _from_row(row)
+        else:
+            stale[row.layer_id] = True
+    for layer in refs:
+        if layer.id in out:
+            continue
+        scan = load_scan_columns(session, layer.id)
+        fresh = _stored(layer, bin_heights(scan.x, scan.y, scan.scan_value, cell))
+        if persist:
+            if stale.get(layer.id):
+                session.exec(
+                    delete(LayerHeightmap)
+                    .where(LayerHeightmap.layer_id == layer.id)  # type: ignore
+                    .where(LayerHeightmap.cell == cell)
+                )
+            session.add(_row(fresh))
+            try:
+                session.commit()
+            except IntegrityError:
+                # Another request stored it first; ours is just as good.
+                session.rollback()
+        out[layer.id] = fresh
+    return out
+
+
+def _previous(session: Session, layer: Layer) -> Optional[Layer]:
+    return session.exec(
+        select(Layer)
+        .where(Layer.group_id == layer.group_id)
+        .where(Layer.layer_number < layer.layer_number)
+        .order_by(Layer.layer_number.desc())  # type: ignore
+        .limit(1)
+    ).first()
+
+
+def _delta(cur: Grid, prev: Optional[Grid]) -> Optional[np.ndarray]:
+    if prev is None:
+        return None
+    return cur.heights - place(prev, cur.ix0, cur.iy0, cur.nx, cur.ny)
+
+
+class LayerMap(NamedTuple):
+    stored: StoredMap
+    previous_layer_id: Optional[str]
+    delta: Optional[np.ndarray]  # on the layer grid's extent
+
+
+def _layer_fields(m: LayerMap) -> dict:
+    return {
+        "layer_id": m.stored.layer_id,
+        "layer_number": m.stored.layer_number,
+        "stats": m.stored.stats,
+        "previous_layer_id": m.previous_layer_id,
+        "delta_stats": None if m.delta is None else height_stats(m.delta, m.stored.grid.cell),
+    }
+
+
+def _extent(m: LayerMap) -> dict:
+    g = m.stored.grid
+    return {
+        "cell": g.cell,
+        "ix0": g.ix0,
+        "iy0": g.iy0,
+        "nx": g.nx,
+        "ny": g.ny,
+        "x0": g.ix0 * g.cell,
+        "y0": g.iy0 * g.cell,
+    }
+
+
+def compute_layer_heightmap(layer_id: str, cell: Optional[float] = None, delta: bool = True) -> LayerMap:
+    cell = HEIGHTMAP_CELL_SIZE if cell is None else cell
+    with get_session() as session:
+        layer = session.get(Layer, layer_id)
+        if not layer:
+            raise ValueError("layer_not_found")
+        group = session.get(WeldGroup, layer.group_id)
+        persist = bool(group and group.ingest_complete)
+        prev = _previous(session, layer) if delta else None
+        prev_id = prev.id if prev else None
+        maps = _heightmaps(session, [layer] if prev is None else [layer, prev], cell, persist)
+    cur = maps[layer_id]
+    prev_grid = maps[prev_id].grid if prev_id else None
+    return LayerMap(cur, prev_id, _delta(cur.grid, prev_grid))
+
+
+def layer_heightmap_json(m: LayerMap) -> bytes:
+    """LayerHeightmapOut JSON: the grid row-major, null for empty cells."""
+    raw = {"heights": encode_array(m.stored.grid.heights.ravel(), "float?")}
+    if m.delta is not None:
+        raw["delta"] = encode_array(m.delta.ravel(), "float?")
+    fields = {"group_id": m.stored.group_id, **_extent(m), **_layer_fields(m)}
+    return encode_object(fields, raw).encode("utf-8")
+
+
+def layer_heightmap_binary(m: LayerMap) -> bytes:
+    """The same grid as an SSAL payload: table "grid" with "height" (and "delta") columns."""
+    cols = {"height": m.stored.grid.heights.ravel()}
+    if m.delta is not None:
+        cols["delta"] = m.delta.ravel()
+    return encode_columns(
+        {"group_id": m.stored.group_id, **_extent(m), **_layer_fields(m)}, {"grid": cols}
+    )
+
+
+class HeightmapStack(NamedTuple):
+    group_id: str
+    cell: float
+    ix0: int
+    iy0: int
+    nx: int
+    ny: int
+    layers: List[dict]  # per layer: _layer_fields
+    heights: List[np.ndarray]  # per layer, on the common extent
+    deltas: List[Optional[np.ndarray]]
+
+
+def compute_group_heightmaps(
+    group_id: str,
+    cell: Optional[float] = None,
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+    delta: bool = True,
+) -> HeightmapStack:
+    """
+    Height maps of the group's layers in the range, placed on one common
+    extent (the union of their grids), each with its delta to the previous
+    layer of the group.
+    """
+    cell = HEIGHTMAP_CELL_SIZE if cell is None else cell
+    with get_session() as session:
+        group = session.get(WeldGroup, group_id)
+        if not group:
+            raise ValueError("group_not_found")
+        stmt = select(Layer).where(Layer.group_id == group_id)
+        if layer_min is not None:
+            stmt = stmt.where(Layer.layer_number >= layer_min)
+        if layer_max is not None:
+            stmt = stmt.where(Layer.layer_number <= layer_max)
+        layers = session.exec(stmt.order_by(Layer.layer_number)).all()
+        # The first layer's delta needs the layer just below the range.
+        below = _previous(session, layers[0]) if layers and delta else None
+        order = ([below.id] if below else []) + [layer.id for layer in layers]
+        maps = _heightmaps(session, ([below] if below else []) + list(layers), cell, group.ingest_complete)
+
+    shown = [maps[i] for i in order[1 if below else 0 :]]
+    filled = [m.grid for m in shown if m.grid.heights.size]
+    if filled:
+        ix0 = min(g.ix0 for g in filled)
+        iy0 = min(g.iy0 for g in filled)
+        nx = max(g.ix0 + g.nx for g in filled) - ix0
+        ny = max(g.iy0 + g.ny for g in filled) - iy0
+    else:
+        ix0 = iy0 = nx = ny = 0
+    if nx * ny * len(layers) * (2 if delta else 1) > HEIGHTMAP_MAX_CELLS:
+        raise ValueError("grid_too_large")
+
+    out_layers, heights, deltas = [], [], []
+    prev = maps[order[0]] if below else None
+    for cur in shown:
+        d = _delta(cur.grid, prev.grid) if prev else None
+        out_layers.append(_layer_fields(LayerMap(cur, prev.layer_id if prev else None, d)))
+        heights.append(place(cur.grid, ix0, iy0, nx, ny))
+        deltas.append(None if d is None else place(cur.grid._replace(heights=d), ix0, iy0, nx, ny))
+        prev = cur if delta else None
+    return HeightmapStack(group_id, cell, ix0, iy0, nx, ny, out_layers, heights, deltas)
+
+
+def _stack_fields(stack: HeightmapStack) -> dict:
+    return {
+        "group_id": stack.group_id,
+        "cell": stack.cell,
+        "ix0": stack.ix0,
+        "iy0": stack.iy0,
+        "nx": stack.nx,
+        "ny": stack.ny,
+        "x0": stack.ix0 * stack.cell,
+        "y0": stack.iy0 * stack.cell,
+        "count": len(stack.layers),
+    }
+
+
+def group_heightmaps_json(stack: HeightmapStack) -> bytes:
+    """HeightmapStackOut JSON: every layer's grid on the common extent."""
+    items = []
+    for fields, heights, d in zip(stack.layers, stack.heights, stack.deltas):
+        raw = {"heights": encode_array(heights.ravel(), "float?")}
+        if d is not None:
+            raw["delta"] = encode_array(d.ravel(), "float?")
+        items.append(encode_object(fields, raw))
+    return encode_object(_stack_fields(stack), {"layers": "[" + ",".join(items) + "]"}).encode("utf-8")
+
+
+def group_heightmaps_binary(stack: HeightmapStack) -> bytes:
+    """
+    The stack as an SSAL payload: one table per layer, named by layer id,
+    with "height" (and "delta") columns on the common extent.
+    """
+    tables = {}
+    for fields, heights, d in zip(stack.layers, stack.heights, stack.deltas):
+        cols = {"height": heights.ravel()}
+        if d is not None:
+            cols["delta"] = d.ravel()
+        tables[fields["layer_id"]] = cols
+    return encode_columns({**_stack_fields(stack), "layers": stack.layers}, tables)
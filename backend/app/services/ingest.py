@@ -1,16 +1,83 @@
 # app/services/ingest.py
+import io
 import os
 import re
+import contextlib
+import posixpath
+import time
+import logging
 import zipfile
 import tempfile
-from typing import Dict, Optional, Tuple
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import delete, select
 
 from app.database.db import get_session
-from app.database.models import Layer, ScanData, WeldData, WeldGroup
-from app.utils.parsers import parse_scandata, parse_welddat
-from app.utils.transforms import transform_scan_value
+from app.database.models import (
+    GroupSummary,
+    Layer,
+    LayerAnomaly,
+    LayerAnomalyRun,
+    LayerColumns,
+    LayerCorrelation,
+    LayerHeightmap,
+    LayerProcess,
+    LayerSketch,
+    LayerSummary,
+    LayerTile,
+    LayerTileRun,
+    ScanData,
+    WeldData,
+    WeldGroup,
+    _uuid,
+)
+from app.services.anomalies import write_layer_anomalies
+from app.services.distributions import write_layer_sketches
+from app.services.heightmaps import write_layer_heightmap
+from app.services.process_metrics import write_layer_process
+from app.services.storage import SAMPLE_STORAGE, write_layer_columns
+from app.services.spatial import write_layer_tiles
+from app.services.summaries import (
+    append_group_summary,
+    rebuild_group_summary,
+    write_layer_summary,
+)
+from app.utils.parsers import (
+    ScanColumns,
+    WeldColumns,
+    parse_scandata_columns,
+    parse_welddat_columns,
+)
+from app.utils.metrics import INGEST_PHASES, record_ingest
+from app.utils.transforms import transform_scan_values
+
+logger = logging.getLogger(__name__)
 
 PAIR_RE = re.compile(r"^w(\d+)_([a-zA-Z]+)\.txt$")
+DRIVE_RE = re.compile(r"^[a-zA-Z]:")
+
+# Rows per executemany() call on the bulk write path.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "20000"))
+# Parser processes per ingest; 1 parses inline in the writer.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+
+# progress(layers_done, layers_total, rows_written)
+ProgressCallback = Callable[[int, int, int], None]
+
+SCAN_COLUMNS = [
+    "id", "layer_id", "layer_number", "seq", "x", "y", "z",
+    "scan_raw", "scan_value", "speed",
+]
+WELD_COLUMNS = [
+    "id", "layer_id", "layer_number", "seq", "x", "y", "z",
+    "wire_feed_rate", "robot_speed", "current", "voltage",
+]
 
 
 def _safe_extractall(zf: zipfile.ZipFile, dest: str) -> None:
@@ -42,69 +109,342 @@ def _pair_files(root_dir: str) -> Dict[int, Dict[str, Optional[str]]]:
     return layers
 
 
-def _ingest_pair_into_layer(
+def _member_is_safe(name: str) -> bool:
+    # Same rule as _safe_extractall, evaluated on the archive name alone:
+    # the member must resolve to somewhere inside the extraction root.
+    norm = posixpath.normpath(name.replace("\\", "/"))
+    if norm.startswith("/") or DRIVE_RE.match(norm):
+        return False
+    return norm != ".." and not norm.startswith("../")
+
+
+def _pair_members(zf: zipfile.ZipFile) -> Dict[int, Dict[str, Optional[str]]]:
+    """
+    Pair w###_scandata/w###_welddat members straight from the archive index.
+    Values are member names to be opened with `zf.open()`.
+    """
+    layers: Dict[int, Dict[str, Optional[str]]] = {}
+    for member in zf.infolist():
+        if not _member_is_safe(member.filename):
+            raise ValueError(f"Illegal path in archive: {member.filename}")
+        if member.is_dir():
+            continue
+        fname = posixpath.basename(member.filename.replace("\\", "/"))
+        if not fname.lower().endswith(".txt"):
+            continue
+        m = PAIR_RE.match(fname)
+        if not m:
+            continue
+        num = int(m.group(1))
+        kind = m.group(2).lower()
+        entry = layers.setdefault(num, {"scandata": None, "welddat": None})
+        if "scan" in kind:
+            entry["scandata"] = member.filename
+        elif "weld" in kind:
+            entry["welddat"] = member.filename
+    return layers
+
+
+def _none_if_nan(vals: np.ndarray) -> list:
+    out = vals.tolist()
+    if np.isnan(vals).any():
+        out = [None if v != v else v for v in out]
+    return out
+
+
+def _scan_rows(layer: Layer, scan: ScanColumns, scan_value: np.ndarray) -> Iterator[tuple]:
+    return zip(
+        (_uuid() for _ in range(scan.seq.shape[0])),
+        repeat(layer.id),
+        repeat(layer.layer_number),
+        scan.seq.tolist(),
+        scan.x.tolist(),
+        scan.y.tolist(),
+        scan.z.tolist(),
+        scan.raw.tolist(),
+        scan_value.tolist(),
+        _none_if_nan(scan.v),
+    )
+
+
+def _weld_rows(layer: Layer, weld: WeldColumns) -> Iterator[tuple]:
+    return zip(
+        (_uuid() for _ in range(weld.seq.shape[0])),
+        repeat(layer.id),
+        repeat(layer.layer_number),
+        weld.seq.tolist(),
+        weld.x.tolist(),
+        weld.y.tolist(),
+        weld.z.tolist(),
+        weld.wire_feed_rate.tolist(),
+        weld.robot_speed.tolist(),
+        weld.current.tolist(),
+        weld.voltage.tolist(),
+    )
+
+
+def _bulk_insert(session, table, columns: List[str], rows: Iterator[tuple]) -> None:
+    stmt = insert(table)
+    while True:
+        batch = [dict(zip(columns, r)) for r in islice(rows, INGEST_BATCH_SIZE)]
+        if not batch:
+            break
+        session.execute(stmt, batch)
+
+
+def _open_text(name: str, zf: Optional[zipfile.ZipFile]) -> TextIO:
+    if zf is None:
+        return open(name, "r")
+    return io.TextIOWrapper(zf.open(name, "r"))
+
+
+class ParsedPair(NamedTuple):
+    scan: ScanColumns
+    weld: WeldColumns
+    parse_seconds: float
+    nbytes: int
+
+
+def _file_size(name: str, zf: Optional[zipfile.ZipFile]) -> int:
+    return zf.getinfo(name).file_size if zf is not None else os.path.getsize(name)
+
+
+def _parse_pair(
+    scandata: str, welddat: str, zip_path: Optional[str] = None
+) -> ParsedPair:
+    """
+    Parse one layer's pair of files. With `zip_path` the names are archive
+    members and are streamed with `zf.open()` instead of read from disk.
+    Runs in pool workers: pure parsing, no DB or config access.
+    """
+    started = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        zf = None
+        if zip_path is not None:
+            zf = stack.enter_context(zipfile.ZipFile(zip_path, "r"))
+        with _open_text(scandata, zf) as f:
+            scan = parse_scandata_columns(f)
+        with _open_text(welddat, zf) as f:
+            weld = parse_welddat_columns(f)
+        nbytes = _file_size(scandata, zf) + _file_size(welddat, zf)
+    return ParsedPair(scan, weld, time.perf_counter() - started, nbytes)
+
+
+def _parsed_pairs(
+    jobs: List[Tuple[str, str, Optional[str]]], workers: int
+) -> Iterator[ParsedPair]:
+    """
+    Yield the parsed columns for each job, in job order. With more
+    than one worker the parsing happens in a process pool, keeping at most
+    2 * workers layers in flight so memory stays bounded.
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield _parse_pair(*job)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        it = iter(jobs)
+        pending = deque(pool.submit(_parse_pair, *job) for job in islice(it, 2 * workers))
+        while pending:
+            fut = pending.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append(pool.submit(_parse_pair, *nxt))
+            yield fut.result()
+
+
+def _write_layer_derived(
+    session,
+    layer: Layer,
+    scan: ScanColumns,
+    weld: WeldColumns,
+) -> None:
+    # Per-layer tables computed from the parsed columns, written in the same
+    # transaction as the samples so a layer is never half-summarized.
+    write_layer_summary(session, layer, weld)
+    write_layer_tiles(session, layer, scan, weld)
+    write_layer_sketches(session, layer, weld)
+    write_layer_anomalies(session, layer, weld)
+    write_layer_heightmap(session, layer, scan)
+    write_layer_process(session, layer, weld)
+
+
+def _write_layer_samples(
     session,
     layer: Layer,
-    scandata_path: str,
-    welddat_path: str,
+    scan: ScanColumns,
+    weld: WeldColumns,
+    timings: Optional[Dict[str, float]] = None,
+    commit: bool = True,
 ) -> Tuple[int, int]:
-    with open(scandata_path, "r") as f:
-        scan_rows = parse_scandata(f)
-
-    waypoints: list[ScanData] = []
-    for seq, raw, x, y, z, v in scan_rows:
-        waypoints.append(
-            ScanData(
-                layer_id=layer.id,
-                layer_number=layer.layer_number,
-                seq=seq,
-                x=x,
-                y=y,
-                z=z,
-                scan_raw=raw,
-                scan_value=transform_scan_value(raw),
-                speed=v,
-            )
+    """
+    Write and commit one layer (`commit=False` leaves the commit to the
+    caller). Adds the time spent to `timings` ("transform": scan transform
+    and derived tables, "insert": sample writes and commit).
+    """
+    t0 = time.perf_counter()
+    scan_value = transform_scan_values(scan.raw)
+    t1 = time.perf_counter()
+    if SAMPLE_STORAGE == "columnar":
+        write_layer_columns(session, layer, scan, weld, scan_value=scan_value)
+    else:
+        _bulk_insert(
+            session, ScanData.__table__, SCAN_COLUMNS, _scan_rows(layer, scan, scan_value)
         )
-    session.add_all(waypoints)
-
-    with open(welddat_path, "r") as f:
-        weld_rows = parse_welddat(f)
-
-    metrics: list[WeldData] = []
-    for seq, wfr, rs, cur, volt, x, y, z in weld_rows:
-        metrics.append(
-            WeldData(
-                layer_id=layer.id,
-                layer_number=layer.layer_number,
-                seq=seq,
-                wire_feed_rate=wfr,
-                robot_speed=rs,
-                current=cur,
-                voltage=volt,
-                x=x,
-                y=y,
-                z=z,
-            )
-        )
-    session.add_all(metrics)
+        _bulk_insert(session, WeldData.__table__, WELD_COLUMNS, _weld_rows(layer, weld))
+    t2 = time.perf_counter()
+    _write_layer_derived(session, layer, scan, weld)
+    t3 = time.perf_counter()
+    if commit:
+        session.commit()
+    t4 = time.perf_counter()
+    if timings is not None:
+        timings["transform_seconds"] += (t1 - t0) + (t3 - t2)
+        timings["insert_seconds"] += (t2 - t1) + (t4 - t3)
+    return (int(scan.seq.shape[0]), int(weld.seq.shape[0]))
+
+
+def delete_group_layers(session, group_id: str, job_id: Optional[str] = None) -> int:
+    """
+    Remove every layer of a group together with its samples and derived
+    rows (no commit), e.g. to discard a cancelled or interrupted ingest.
+    With `job_id`, only the layers that job created are removed and the
+    GroupSummary is left for the caller to rebuild.
+    Tables written by `_write_layer_samples` must be cleared here too.
+    """
+    layer_ids = select(Layer.id).where(Layer.group_id == group_id)
+    if job_id is not None:
+        layer_ids = layer_ids.where(Layer.job_id == job_id)
+    for table in (
+        ScanData,
+        WeldData,
+        LayerColumns,
+        LayerSummary,
+        LayerTile,
+        LayerTileRun,
+        LayerSketch,
+        LayerAnomaly,
+        LayerAnomalyRun,
+        LayerCorrelation,
+        LayerHeightmap,
+        LayerProcess,
+    ):
+        session.exec(delete(table).where(table.layer_id.in_(layer_ids)))  # type: ignore
+    if job_id is None:
+        session.exec(delete(GroupSummary).where(GroupSummary.group_id == group_id))  # type: ignore
+    result = session.exec(delete(Layer).where(Layer.id.in_(layer_ids)))  # type: ignore
+    return result.rowcount
+
+
+def existing_layer_numbers(session, group_id: str) -> set:
+    return set(session.exec(select(Layer.layer_number).where(Layer.group_id == group_id)).all())
+
+
+def conflicting_layers(zip_path: str, group_id: str) -> List[int]:
+    """Layer numbers in the ZIP that the group already has (reads the archive index only)."""
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        numbers = set(_pair_members(zf))
+    with get_session() as session:
+        return sorted(numbers & existing_layer_numbers(session, group_id))
+
+
+def append_layer(
+    session,
+    group: WeldGroup,
+    layer_number: int,
+    scan: ScanColumns,
+    weld: WeldColumns,
+    scandata_file: Optional[str] = None,
+    welddat_file: Optional[str] = None,
+) -> Layer:
+    """
+    Write one complete layer into an already ingested group: samples and
+    derived tables, the new LayerSummary merged into the GroupSummary and
+    `ingest_version` bumped, all in one commit so readers never see the
+    layer without its group rollup. Raises `layer_exists` if the group
+    already has `layer_number`.
+    """
+    if layer_number in existing_layer_numbers(session, group.id):
+        raise ValueError("layer_exists")
+    layer = Layer(
+        group_id=group.id,
+        layer_number=layer_number,
+        scandata_file=scandata_file,
+        welddat_file=welddat_file,
+    )
+    session.add(layer)
+    session.flush()
+    _write_layer_samples(session, layer, scan, weld, commit=False)
+    session.flush()
+    summary = session.get(LayerSummary, layer.id)
+    append_group_summary(session, group.id, [summary] if summary else [])
+    group.ingest_version += 1
+    session.add(group)
     session.commit()
-    return (len(waypoints), len(metrics))
+    session.refresh(layer)
+    return layer
 
 
-def ingest_directory_into_group(data_dir: str, group_id: str) -> dict:
-    assert os.path.isdir(data_dir), f"Directory not found: {data_dir}"
-    pairs = _pair_files(data_dir)
+def _ingest_stats(rows: int, seconds: float, counters: Dict[str, float]) -> dict:
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else 0.0,
+        "layers": int(counters["layers"]),
+        "files": int(counters["files"]),
+        "bytes": int(counters["bytes"]),
+        **{f"{p}_seconds": round(counters[f"{p}_seconds"], 3) for p in INGEST_PHASES},
+    }
+
 
-    created, errors = 0, 0
+def _ingest_pairs(
+    pairs: Dict[int, Dict[str, Optional[str]]],
+    group_id: str,
+    workers: int,
+    zip_path: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+    append: Optional[str] = None,
+    job_id: Optional[str] = None,
+) -> dict:
+    created, errors, skipped = 0, 0, 0
     details: list[dict] = []
+    rows_written = 0
+    started = time.perf_counter()
+    counters: Dict[str, float] = dict.fromkeys(
+        ["layers", "files", "bytes", *(f"{p}_seconds" for p in INGEST_PHASES)], 0
+    )
+    new_layer_ids: List[str] = []
 
+    # This session is the only DB writer; pool workers just parse.
     with get_session() as session:
         group = session.get(WeldGroup, group_id)
         if not group:
             raise ValueError(f"group_not_found: {group_id}")
 
-        for layer_number, files in sorted(pairs.items()):
+        existing = existing_layer_numbers(session, group_id) if append else set()
+        clash = sorted(existing & pairs.keys())
+        if clash and append == "reject":
+            raise ValueError(f"layers_exist: {clash}")
+        for layer_number in clash:
+            skipped += 1
+            details.append(
+                {"layer_number": layer_number, "status": "skipped", "reason": "layer_exists"}
+            )
+
+        ordered = sorted((n, files) for n, files in pairs.items() if n not in existing)
+        jobs = [
+            (files["scandata"], files["welddat"], zip_path)
+            for _, files in ordered
+            if files.get("scandata") and files.get("welddat")
+        ]
+
+        if progress is not None:
+            progress(0, len(ordered), 0)
+
+        parsed = _parsed_pairs(jobs, workers)
+        for done, (layer_number, files) in enumerate(ordered, start=1):
             scandata = files.get("scandata")
             welddat = files.get("welddat")
             if not scandata or not welddat:
@@ -116,22 +456,29 @@ def ingest_directory_into_group(data_dir: str, group_id: str) -> dict:
                         "reason": "missing_pair",
                     }
                 )
+                if progress is not None:
+                    progress(done, len(ordered), rows_written)
                 continue
 
+            scan, weld, parse_seconds, nbytes = next(parsed)
+            counters["parse_seconds"] += parse_seconds
+            counters["files"] += 2
+            counters["bytes"] += nbytes
             layer = Layer(
                 group_id=group.id,
                 layer_number=layer_number,
                 scandata_file=os.path.basename(scandata),
                 welddat_file=os.path.basename(welddat),
+                job_id=job_id,
             )
             session.add(layer)
-            session.commit()
-            session.refresh(layer)
+            session.flush()
+            new_layer_ids.append(layer.id)
 
-            wp_count, sm_count = _ingest_pair_into_layer(
-                session, layer, scandata, welddat
-            )
+            wp_count, sm_count = _write_layer_samples(session, layer, scan, weld, counters)
+            rows_written += wp_count + sm_count
             created += 1
+            counters["layers"] += 1
             details.append(
                 {
                     "layer_number": layer_number,
@@ -140,25 +487,111 @@ def ingest_directory_into_group(data_dir: str, group_id: str) -> dict:
                     "metrics": sm_count,
                 }
             )
+            if progress is not None:
+                progress(done, len(ordered), rows_written)
 
+        if append:
+            # Only the new layers' rollups are read; existing ones are already
+            # folded into the GroupSummary.
+            new_rows = session.exec(
+                select(LayerSummary).where(LayerSummary.layer_id.in_(new_layer_ids))  # type: ignore
+            ).all()
+            append_group_summary(session, group.id, list(new_rows))
+        else:
+            rebuild_group_summary(session, group.id)
         group.ingest_complete = True
         group.status = "ingested"
+        group.ingest_version += 1
         session.commit()
         session.refresh(group)
 
+    stats = _ingest_stats(rows_written, time.perf_counter() - started, counters)
+    record_ingest(stats)
+    logger.info(
+        "Ingested group %s: %d layers, %d rows in %.2fs (%.0f rows/s)",
+        group_id,
+        created,
+        stats["rows"],
+        stats["seconds"],
+        stats["rows_per_sec"],
+    )
     return {
         "groupId": group_id,
         "created": created,
+        "skipped": skipped,
         "errors": errors,
         "details": details,
+        "stats": stats,
     }
 
 
-def ingest_zip_into_group(zip_path: str, group_id: str) -> dict:
+def ingest_directory_into_group(
+    data_dir: str,
+    group_id: str,
+    workers: Optional[int] = None,
+    progress: Optional[ProgressCallback] = None,
+    append: Optional[str] = None,
+    job_id: Optional[str] = None,
+) -> dict:
+    """
+    Ingest every w###_scandata/w###_welddat pair under `data_dir`.
+    `workers` > 1 parses layers in a process pool (defaults to INGEST_WORKERS).
+    `progress(layers_done, layers_total, rows_written)` is called before the
+    first layer and after each committed layer; raising from it aborts the
+    ingest.
+
+    `append` adds the pairs to a group that already has layers: "skip"
+    leaves layer numbers the group already has alone (reported as
+    "skipped"), "reject" raises `layers_exist` before anything is written.
+    The GroupSummary is then updated from the new layers only. `job_id` is
+    stamped on the created layers so they can be discarded on their own.
+    """
+    assert os.path.isdir(data_dir), f"Directory not found: {data_dir}"
+    pairs = _pair_files(data_dir)
+    return _ingest_pairs(
+        pairs,
+        group_id,
+        workers or INGEST_WORKERS,
+        progress=progress,
+        append=append,
+        job_id=job_id,
+    )
+
+
+def ingest_zip_into_group(
+    zip_path: str,
+    group_id: str,
+    workers: Optional[int] = None,
+    stream: bool = True,
+    progress: Optional[ProgressCallback] = None,
+    append: Optional[str] = None,
+    job_id: Optional[str] = None,
+) -> dict:
+    """
+    Ingest a ZIP of w###_scandata/w###_welddat pairs. By default members are
+    parsed straight out of the archive one layer at a time; `stream=False`
+    extracts everything to a temporary directory first. See
+    `ingest_directory_into_group` for `progress`, `append` and `job_id`.
+    """
     if not os.path.isfile(zip_path):
         raise FileNotFoundError(f"Missing file: {zip_path}")
 
+    if stream:
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            pairs = _pair_members(zf)
+        return _ingest_pairs(
+            pairs,
+            group_id,
+            workers or INGEST_WORKERS,
+            zip_path=zip_path,
+            progress=progress,
+            append=append,
+            job_id=job_id,
+        )
+
     with tempfile.TemporaryDirectory() as td:
         with zipfile.ZipFile(zip_path, "r") as zf:
             _safe_extractall(zf, td)
-        return ingest_directory_into_group(td, group_id)
\ No newline at end of file
+        return ingest_directory_into_group(
+            td, group_id, workers=workers, progress=progress, append=append, job_id=job_id
+        )
@@ -0,0 +1,610 @@
+# app/services/ingest_jobs.py
+"""
+Background ingest jobs.
+
+Uploads are spooled to INGEST_SPOOL_DIR and recorded as IngestJob rows; a
+process pool of INGEST_JOB_WORKERS runs them. The queue is bounded: once
+INGEST_JOB_WORKERS + INGEST_QUEUE_SIZE jobs are queued or running, new
+uploads are refused. Workers write progress (layers done/total, rows, rows/s)
+to the job row after every layer and check it for a cancel request.
+
+Append jobs (`IngestJob.append` set) add layers to a group that is already
+ingested. Their layers carry the job id, so cancelling, failing or
+recovering an append job discards only what that job wrote and the group
+keeps its earlier layers. A group has at most one active job at a time.
+
+Several API processes (uvicorn --workers) may share the queue. A job is
+claimed with a conditional UPDATE (queued -> running), so only one process
+runs it, and its worker refreshes `IngestJob.heartbeat` every quarter of
+INGEST_JOB_LEASE seconds. A running job is orphaned once its lease has
+expired, or at once when its owner was an API process of this host that no
+longer runs (earlier boot, exited pid, or this process's pid reused after a
+restart). On startup `recover_jobs` requeues orphaned jobs (after discarding
+their partially written layers) and submits every queued job; while the API
+runs, `sweep_jobs` does the same every INGEST_JOB_LEASE / 2 seconds for
+orphans and for queued jobs nobody has picked up. A job submitted by several
+processes still runs once. A worker that finds its job taken over stops
+writing.
+"""
+import os
+import time
+import logging
+import threading
+import multiprocessing
+import socket
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+from uuid import uuid4
+
+from sqlalchemy import and_, func, or_, update
+from sqlmodel import select
+
+from app.database.db import DB_PATH, get_session
+from app.database.models import IngestJob, WeldGroup, _utcnow
+from app.services.ingest import delete_group_layers, ingest_zip_into_group
+from app.services.summaries import rebuild_group_summary
+from app.utils.metrics import record_ingest
+
+logger = logging.getLogger(__name__)
+
+# Jobs running at once, each in its own process.
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+# Jobs allowed to wait behind the running ones.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+# Uploaded ZIPs are kept here until their job finishes, so a restart can resume them.
+INGEST_SPOOL_DIR = Path(os.getenv("INGEST_SPOOL_DIR", str(DB_PATH.parent / "ingest_spool")))
+# Seconds a running job's heartbeat may age before it counts as orphaned.
+INGEST_JOB_LEASE = float(os.getenv("INGEST_JOB_LEASE", "60"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+
+def _boot_id() -> str:
+    try:
+        return Path("/proc/sys/kernel/random/boot_id").read_text().strip()[:8]
+    except OSError:
+        return ""
+
+
+HOST = socket.gethostname()
+BOOT = _boot_id()
+# This API process, recorded as the owner of the jobs its pool claims:
+# host:pid:boot:nonce.
+OWNER = f"{HOST}:{os.getpid()}:{BOOT}:{uuid4().hex[:8]}"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Jobs this process has submitted and not seen finish.
+_submitted: Set[str] = set()
+_sweeper_stop = threading.Event()
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+class IngestLeaseLost(Exception):
+    """The job was recovered by another process; stop without touching it."""
+
+
+def _init_worker() -> None:
+    from app.utils.config_loader import init_load
+
+    logging.basicConfig(level=logging.INFO)
+    init_load(Path(__file__).resolve().parents[1] / "config/v0.1")
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=INGEST_JOB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def _drop_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a broken pool so the next submit starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown() -> None:
+    """Stop handing out queued jobs; they stay queued in the DB for the next start."""
+    global _pool
+    _sweeper_stop.set()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _remove_spool(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _active_jobs(session) -> int:
+    return session.exec(
+        select(func.count()).select_from(IngestJob).where(IngestJob.status.in_(ACTIVE_STATUSES))  # type: ignore
+    ).one()
+
+
+def check_capacity() -> None:
+    with get_session() as session:
+        if _active_jobs(session) >= INGEST_JOB_WORKERS + INGEST_QUEUE_SIZE:
+            raise ValueError("ingest_queue_full")
+
+
+def spool_path() -> Path:
+    INGEST_SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    return INGEST_SPOOL_DIR
+
+
+def create_job(group_id: str, zip_path: str, append: Optional[str] = None) -> IngestJob:
+    """
+    Record a queued job for an already spooled ZIP (raises ingest_queue_full,
+    group_busy if the group already has an active job, or group_not_ingested
+    for an append to a group whose own ingest never completed).
+    """
+    with get_session() as session:
+        if _active_jobs(session) >= INGEST_JOB_WORKERS + INGEST_QUEUE_SIZE:
+            raise ValueError("ingest_queue_full")
+        group = session.get(WeldGroup, group_id)
+        if not group:
+            raise ValueError("group_not_found")
+        busy = session.exec(
+            select(IngestJob.id)
+            .where(IngestJob.group_id == group_id)
+            .where(IngestJob.status.in_(ACTIVE_STATUSES))  # type: ignore
+        ).first()
+        if busy is not None:
+            raise ValueError("group_busy")
+        if append is not None and not group.ingest_complete:
+            raise ValueError("group_not_ingested")
+        job = IngestJob(
+            group_id=group_id,
+            zip_path=zip_path,
+            append=append,
+            group_status=group.status if append is not None else None,
+        )
+        if append is None:
+            # An append leaves the group readable until its job starts.
+            group.status = "queued"
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+
+def submit_job(job_id: str, group_id: str) -> Future:
+    _submitted.add(job_id)
+    pool = _get_pool()
+    try:
+        future = pool.submit(_run_job, job_id, OWNER)
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        pool = _get_pool()
+        future = pool.submit(_run_job, job_id, OWNER)
+
+    def _done(f: Future) -> None:
+        # The cache key carries ingest_version, so this only frees memory early.
+        from app.services.response_cache import response_cache
+
+        response_cache.invalidate_group(group_id)
+        _submitted.discard(job_id)
+        if f.cancelled():
+            return
+        exc = f.exception()
+        if exc is not None:
+            logger.error("Ingest job %s crashed: %s", job_id, exc)
+            if isinstance(exc, BrokenProcessPool):
+                _drop_pool(pool)
+            _fail_crashed(job_id, f"worker_crashed: {exc}")
+            return
+        _, stats = f.result()
+        if stats is not None:
+            record_ingest(stats)
+
+    future.add_done_callback(_done)
+    return future
+
+
+def get_job(job_id: str) -> IngestJob:
+    with get_session() as session:
+        job = session.get(IngestJob, job_id)
+        if not job:
+            raise ValueError("job_not_found")
+        return job
+
+
+def list_jobs(
+    group_id: Optional[str] = None, status: Optional[str] = None, limit: int = 100
+) -> List[IngestJob]:
+    with get_session() as session:
+        stmt = select(IngestJob).order_by(IngestJob.created_at.desc()).limit(limit)  # type: ignore
+        if group_id is not None:
+            stmt = stmt.where(IngestJob.group_id == group_id)
+        if status is not None:
+            stmt = stmt.where(IngestJob.status == status)
+        return list(session.exec(stmt).all())
+
+
+def _discard_job_data(session, job: IngestJob, group: WeldGroup, status: str) -> None:
+    """
+    Undo what `job` wrote. A new group's layers all go and the group takes
+    `status`; an append removes only its own layers and the group is back
+    to its previous, complete state (appends are only queued for complete
+    groups).
+    """
+    if job.append is None:
+        delete_group_layers(session, group.id)
+        group.ingest_complete = False
+        group.status = status
+    else:
+        delete_group_layers(session, group.id, job_id=job.id)
+        rebuild_group_summary(session, group.id)
+        group.ingest_complete = True
+        group.status = job.group_status or "ingested"
+    group.ingest_version += 1
+
+
+def cancel_job(job_id: str) -> IngestJob:
+    """
+    Cancel a job. Queued jobs are cancelled immediately; running ones are
+    flagged and stop after the layer in progress, discarding what they wrote.
+    """
+    with get_session() as session:
+        job = session.get(IngestJob, job_id)
+        if not job:
+            raise ValueError("job_not_found")
+        if job.status not in ACTIVE_STATUSES:
+            raise ValueError("job_not_active")
+        job.cancel_requested = True
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished_at = _utcnow()
+            group = session.get(WeldGroup, job.group_id)
+            if group and job.append is None:
+                _discard_job_data(session, job, group, "cancelled")
+            _remove_spool(job.zip_path)
+        session.commit()
+        session.refresh(job)
+        return job
+
+
+def _owned(job_id: str, owner: str):
+    """Condition: `job_id` is running under `owner`."""
+    return and_(
+        IngestJob.id == job_id, IngestJob.status == "running", IngestJob.owner == owner
+    )
+
+
+def _finish_job(
+    job_id: str, status: str, error: Optional[str] = None, owner: Optional[str] = None, **fields
+) -> bool:
+    """
+    Record a job's final status and undo its data on cancel/failure. With
+    `owner`, only if the job is still running under that owner; returns
+    whether the job was finished.
+    """
+    with get_session() as session:
+        if owner is not None:
+            # Conditional write first, so a concurrent recovery cannot interleave.
+            claimed = session.exec(
+                update(IngestJob).where(_owned(job_id, owner)).values(status=status)
+            ).rowcount
+            if not claimed:
+                session.rollback()
+                return False
+        job = session.get(IngestJob, job_id)
+        job.status = status
+        job.error = error
+        job.finished_at = _utcnow()
+        for name, value in fields.items():
+            setattr(job, name, value)
+        group = session.get(WeldGroup, job.group_id)
+        if group and status == "cancelled":
+            _discard_job_data(session, job, group, "cancelled")
+        elif group and status == "failed" and job.append is not None:
+            _discard_job_data(session, job, group, "failed")
+            group.ingest_error = error
+        elif group and status == "failed":
+            group.status = "failed"
+            group.ingest_error = error
+            group.ingest_version += 1
+        session.commit()
+        return True
+
+
+def _fail_crashed(job_id: str, error: str) -> None:
+    """
+    Fail a job whose worker process died: still queued (it will never run on
+    this pool) or running under this process. Jobs another process has
+    claimed are left to it.
+    """
+    with get_session() as session:
+        claimed = session.exec(
+            update(IngestJob)
+            .where(IngestJob.id == job_id)
+            .where(
+                or_(
+                    IngestJob.status == "queued",
+                    and_(IngestJob.status == "running", IngestJob.owner == OWNER),
+                )
+            )
+            .values(status="running", owner=OWNER)
+        ).rowcount
+        session.commit()
+    if claimed:
+        _finish_job(job_id, "failed", error=error, owner=OWNER)
+        with get_session() as session:
+            job = session.get(IngestJob, job_id)
+            _remove_spool(job.zip_path)
+
+
+def _heartbeat(job_id: str, owner: str, stop: threading.Event) -> None:
+    while not stop.wait(INGEST_JOB_LEASE / 4):
+        try:
+            with get_session() as session:
+                session.exec(
+                    update(IngestJob).where(_owned(job_id, owner)).values(heartbeat=_utcnow())
+                )
+                session.commit()
+        except Exception:
+            logger.warning("Heartbeat for ingest job %s failed", job_id, exc_info=True)
+
+
+def _run_job(job_id: str, owner: str) -> Tuple[str, Optional[dict]]:
+    """
+    Worker-process entry point, running the job on behalf of API process
+    `owner`. Returns the job's final status and, on success, the ingest
+    stats for the API process's metrics.
+    """
+    with get_session() as session:
+        now = _utcnow()
+        claimed = session.exec(
+            update(IngestJob)
+            .where(IngestJob.id == job_id)
+            .where(IngestJob.status == "queued")
+            .values(
+                status="running",
+                owner=owner,
+                heartbeat=now,
+                started_at=now,
+                attempts=IngestJob.attempts + 1,
+            )
+        ).rowcount
+        if not claimed:
+            # Cancelled, or already claimed by another process.
+            session.rollback()
+            job = session.get(IngestJob, job_id)
+            return (job.status if job else "missing"), None
+        job = session.get(IngestJob, job_id)
+        group = session.get(WeldGroup, job.group_id)
+        if group:
+            # Layers land one commit at a time; an incomplete group is never
+            # served from the response cache.
+            group.ingest_complete = False
+            group.status = "ingesting" if job.append is None else "appending"
+        session.commit()
+        zip_path, group_id, append = job.zip_path, job.group_id, job.append
+
+    started = time.perf_counter()
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(job_id, owner, stop), daemon=True)
+    beat.start()
+
+    def progress(layers_done: int, layers_total: int, rows_written: int) -> None:
+        with get_session() as session:
+            job = session.get(IngestJob, job_id)
+            if job.status != "running" or job.owner != owner:
+                raise IngestLeaseLost()
+            job.layers_done = layers_done
+            job.layers_total = layers_total
+            job.rows_written = rows_written
+            elapsed = time.perf_counter() - started
+            job.rows_per_sec = round(rows_written / elapsed, 1) if elapsed > 0 else 0.0
+            cancel = job.cancel_requested
+            session.commit()
+        if cancel:
+            raise IngestCancelled()
+
+    try:
+        result = ingest_zip_into_group(
+            zip_path, group_id=group_id, progress=progress, append=append, job_id=job_id
+        )
+    except IngestLeaseLost:
+        # The recovering process discarded our layers and owns the spool file.
+        logger.warning("Ingest job %s was taken over; stopping", job_id)
+        stop.set()
+        return "lost", None
+    except IngestCancelled:
+        logger.info("Ingest job %s cancelled", job_id)
+        stop.set()
+        _finish_job(job_id, "cancelled", owner=owner)
+        _remove_spool(zip_path)
+        return "cancelled", None
+    except Exception as e:
+        logger.exception("Ingest job %s failed", job_id)
+        stop.set()
+        _finish_job(job_id, "failed", error=str(e), owner=owner)
+        _remove_spool(zip_path)
+        return "failed", None
+
+    stop.set()
+    if not _finish_job(
+        job_id,
+        "succeeded",
+        owner=owner,
+        rows_written=result["stats"]["rows"],
+        rows_per_sec=result["stats"]["rows_per_sec"],
+    ):
+        logger.warning("Ingest job %s was taken over before it finished", job_id)
+        return "lost", None
+    _remove_spool(zip_path)
+    return "succeeded", result["stats"]
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name != "posix":
+        # os.kill would terminate the process on Windows; rely on the lease there.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_dead(owner: Optional[str]) -> bool:
+    """
+    Whether `owner` is an API process of this host that no longer runs. An
+    owner on another host is only known dead once its lease expires.
+    """
+    if not owner or owner == OWNER:
+        return False
+    parts = owner.split(":")
+    if len(parts) != 4 or parts[0] != HOST or not parts[1].isdigit():
+        return False
+    pid = int(parts[1])
+    return parts[2] != BOOT or pid == os.getpid() or not _pid_alive(pid)
+
+
+def _orphaned_jobs() -> List[Tuple[str, Optional[datetime]]]:
+    """(id, heartbeat) of running jobs whose lease expired or whose owner is dead."""
+    expired = _utcnow() - timedelta(seconds=INGEST_JOB_LEASE)
+    with get_session() as session:
+        stale = session.exec(
+            select(IngestJob.id, IngestJob.heartbeat)
+            .where(IngestJob.status == "running")
+            .where(or_(IngestJob.heartbeat.is_(None), IngestJob.heartbeat < expired))  # type: ignore
+        ).all()
+        live = session.exec(
+            select(IngestJob.id, IngestJob.heartbeat, IngestJob.owner)
+            .where(IngestJob.status == "running")
+            .where(IngestJob.heartbeat >= expired)  # type: ignore
+        ).all()
+    return [*stale, *((job_id, beat) for job_id, beat, owner in live if _owner_dead(owner))]
+
+
+def _recover_job(job_id: str, heartbeat: Optional[datetime]) -> Optional[str]:
+    """
+    Requeue one orphaned running job, unless its worker checked in or
+    another process recovered it since `heartbeat` was read. Returns the
+    group id if the job is queued again.
+    """
+    with get_session() as session:
+        beat = IngestJob.heartbeat.is_(None) if heartbeat is None else IngestJob.heartbeat == heartbeat  # type: ignore
+        claimed = session.exec(
+            update(IngestJob)
+            .where(IngestJob.id == job_id)
+            .where(IngestJob.status == "running")
+            .where(beat)
+            .values(status="queued", owner=None, heartbeat=None)
+        ).rowcount
+        if not claimed:
+            session.rollback()
+            return None
+        job = session.get(IngestJob, job_id)
+        group = session.get(WeldGroup, job.group_id)
+        if group:
+            _discard_job_data(session, job, group, "queued")
+        job.layers_done = job.layers_total = job.rows_written = 0
+        job.rows_per_sec = 0.0
+        job.started_at = None
+        if job.cancel_requested:
+            job.status = "cancelled"
+            job.finished_at = _utcnow()
+            if group and job.append is None:
+                group.status = "cancelled"
+            _remove_spool(job.zip_path)
+        elif not os.path.isfile(job.zip_path):
+            job.status = "failed"
+            job.error = "spool_file_missing"
+            job.finished_at = _utcnow()
+            if group and job.append is None:
+                group.status = "failed"
+            if group:
+                group.ingest_error = job.error
+        else:
+            logger.info("Requeued interrupted ingest job %s", job.id)
+        session.commit()
+        return job.group_id if job.status == "queued" else None
+
+
+def recover_jobs() -> int:
+    """
+    Requeue orphaned running jobs (their process died or was restarted, see
+    `_orphaned_jobs`) and submit every queued job, oldest first. Safe to run
+    in every API process. Returns the number of jobs submitted.
+    """
+    for job_id, heartbeat in _orphaned_jobs():
+        _recover_job(job_id, heartbeat)
+
+    with get_session() as session:
+        queued = session.exec(
+            select(IngestJob)
+            .where(IngestJob.status == "queued")
+            .order_by(IngestJob.created_at)  # type: ignore
+        ).all()
+        pending = [(job.id, job.group_id) for job in queued]
+
+    for job_id, group_id in pending:
+        submit_job(job_id, group_id)
+    return len(pending)
+
+
+def sweep_jobs() -> int:
+    """
+    `recover_jobs` for a running API: requeue and submit orphaned jobs, and
+    submit queued jobs older than the lease that this process has not
+    submitted (their submitting process went away). Returns the number of
+    jobs submitted.
+    """
+    pending = []
+    for job_id, heartbeat in _orphaned_jobs():
+        group_id = _recover_job(job_id, heartbeat)
+        if group_id is not None:
+            pending.append((job_id, group_id))
+    expired = _utcnow() - timedelta(seconds=INGEST_JOB_LEASE)
+    with get_session() as session:
+        waiting = session.exec(
+            select(IngestJob.id, IngestJob.group_id)
+            .where(IngestJob.status == "queued")
+            .where(IngestJob.created_at < expired)  # type: ignore
+            .order_by(IngestJob.created_at)  # type: ignore
+        ).all()
+    seen = {job_id for job_id, _ in pending}
+    pending += [(j, g) for j, g in waiting if j not in _submitted and j not in seen]
+    for job_id, group_id in pending:
+        submit_job(job_id, group_id)
+    return len(pending)
+
+
+def _sweep_loop() -> None:
+    while not _sweeper_stop.wait(INGEST_JOB_LEASE / 2):
+        try:
+            sweep_jobs()
+        except Exception:
+            logger.exception("Sweeping ingest jobs failed")
+
+
+def start_sweeper() -> None:
+    """Run `sweep_jobs` every INGEST_JOB_LEASE / 2 seconds until `shutdown`."""
+    _sweeper_stop.clear()
+    threading.Thread(target=_sweep_loop, name="ingest-sweep", daemon=True).start()
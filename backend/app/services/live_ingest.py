@@ -0,0 +1,608 @@
+# app/services/live_ingest.py
+"""
+Live ingest of layers that are still being written.
+
+Lines arrive either as POSTed chunks or from a watcher tailing a local
+directory of w###_scandata/w###_welddat files. Each open layer keeps a
+buffer of its parsed columns (same line rules as the file parsers; a chunk's
+unterminated last line waits for the next chunk) and a running weld rollup,
+so the layer and group summaries are updated per chunk without re-reading
+anything. Every chunk is pushed to the group's subscribers as a delta event.
+
+A layer is written to the database when it is finished: explicitly, or by
+the watcher once a higher-numbered layer has started. Until then it lives
+only in this process's memory, so a group's live state is served by one API
+process: the first to use the group takes its LiveSession lease and renews
+it every LIVE_SESSION_LEASE/4 seconds. Other processes answer
+`live_group_elsewhere` until the lease is released on shutdown or expires.
+"""
+import asyncio
+import os
+import threading
+import logging
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import delete, select
+
+from app.database.db import get_session
+from app.database.models import (
+    GroupSummary,
+    IngestJob,
+    LiveSession,
+    WeldGroup,
+    WeldRollupBase,
+    _utcnow,
+)
+from app.services.ingest import PAIR_RE, append_layer, existing_layer_numbers
+from app.services.ingest_jobs import OWNER
+from app.services.summaries import merge_rollups, rollup_fields, rollup_to_summary
+from app.utils.json_format import dumps, encode_array, encode_object
+from app.utils.parsers import (
+    ScanColumns,
+    WeldColumns,
+    parse_scandata_columns,
+    parse_welddat_columns,
+)
+from app.utils.transforms import transform_scan_values
+
+logger = logging.getLogger(__name__)
+
+# Seconds between directory polls of a watcher.
+LIVE_POLL_INTERVAL = float(os.getenv("LIVE_POLL_INTERVAL", "0.25"))
+# Directories may only be watched below this root; unset disables watching.
+LIVE_WATCH_ROOT = os.getenv("LIVE_WATCH_ROOT")
+# Events buffered per subscriber; a slow client loses the oldest ones.
+LIVE_SUBSCRIBER_QUEUE = int(os.getenv("LIVE_SUBSCRIBER_QUEUE", "256"))
+# Seconds a group's live state stays with a process that stopped renewing its lease.
+LIVE_SESSION_LEASE = float(os.getenv("LIVE_SESSION_LEASE", "60"))
+
+KINDS = ("scandata", "welddat")
+
+
+def _empty_rollup() -> WeldRollupBase:
+    return WeldRollupBase(**merge_rollups([]))
+
+
+class LiveLayer:
+    """Parsed columns and running rollup of one layer still being written."""
+
+    def __init__(self, layer_number: int) -> None:
+        self.layer_number = layer_number
+        self._tail: Dict[str, str] = dict.fromkeys(KINDS, "")
+        self._parts: Dict[str, list] = {k: [] for k in KINDS}
+        self.counts: Dict[str, int] = dict.fromkeys(KINDS, 0)
+        self.rollup = _empty_rollup()
+
+    def feed(self, kind: str, text: str, final: bool = False):
+        """
+        Parse the complete lines of `text` (plus the tail held back from the
+        previous chunk). Returns the new rows as Scan/WeldColumns with seq
+        continuing from the rows already buffered.
+        """
+        text = self._tail[kind] + text
+        if final:
+            lines, self._tail[kind] = text.split("\n"), ""
+        else:
+            head, _, self._tail[kind] = text.rpartition("\n")
+            lines = head.split("\n") if head else []
+        parse = parse_scandata_columns if kind == "scandata" else parse_welddat_columns
+        cols = parse(lines)
+        cols = cols._replace(seq=cols.seq + self.counts[kind])
+        self.counts[kind] += int(cols.seq.shape[0])
+        if cols.seq.shape[0]:
+            self._parts[kind].append(cols)
+            if kind == "welddat":
+                self.rollup = WeldRollupBase(
+                    **merge_rollups([self.rollup, WeldRollupBase(**rollup_fields(cols))])
+                )
+        return cols
+
+    def columns(self) -> Tuple[ScanColumns, WeldColumns]:
+        """Every buffered row, flushing unterminated last lines first."""
+        for kind in KINDS:
+            if self._tail[kind]:
+                self.feed(kind, "", final=True)
+        scan = self._concat(ScanColumns, self._parts["scandata"])
+        weld = self._concat(WeldColumns, self._parts["welddat"])
+        return scan, weld
+
+    @staticmethod
+    def _concat(cls, parts):
+        if not parts:
+            return cls(seq=np.empty(0, dtype=np.int64), **{f: np.empty(0) for f in cls._fields[1:]})
+        return cls(*(np.concatenate(cols) for cols in zip(*parts)))
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_SUBSCRIBER_QUEUE)
+
+    def offer(self, event: str) -> None:
+        # Runs on the subscriber's loop. Drops the oldest event when full;
+        # summaries in every event are cumulative, so later ones catch up.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class LiveGroup:
+    def __init__(self, group_id: str) -> None:
+        self.group_id = group_id
+        self.layers: Dict[int, LiveLayer] = {}
+        # Layers being written by finish_layer; still counted in the group rollup.
+        self.finishing: Dict[int, LiveLayer] = {}
+        self.stored = _empty_rollup()  # GroupSummary as of the last load/finish
+        self.lock = threading.RLock()
+        # Serializes finish_layer's database writes without blocking chunks.
+        self.write_lock = threading.Lock()
+        self.subscribers: Set[_Subscriber] = set()
+        self.watcher: Optional["_Watcher"] = None
+
+    def group_rollup(self) -> WeldRollupBase:
+        return WeldRollupBase(
+            **merge_rollups(
+                [
+                    self.stored,
+                    *(layer.rollup for layer in self.layers.values()),
+                    *(layer.rollup for layer in self.finishing.values()),
+                ]
+            )
+        )
+
+    def publish(self, event: str, data: str) -> None:
+        message = f"event: {event}\ndata: {data}\n\n"
+        for sub in list(self.subscribers):
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, message)
+            except RuntimeError:  # loop closed
+                self.subscribers.discard(sub)
+
+
+_groups: Dict[str, LiveGroup] = {}
+_groups_lock = threading.Lock()
+_renewer: Optional[threading.Thread] = None
+_renewer_stop = threading.Event()
+
+
+def _stored_rollup(group_id: str) -> WeldRollupBase:
+    with get_session() as session:
+        row = session.get(GroupSummary, group_id)
+    return WeldRollupBase(**merge_rollups([row] if row else []))
+
+
+def create_group(name: str) -> WeldGroup:
+    """An empty group to stream layers into (raises group_name_exists)."""
+    with get_session() as session:
+        group = WeldGroup(name=name, ingest_complete=True, status="ingested")
+        session.add(group)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            raise ValueError("group_name_exists")
+        session.refresh(group)
+        return group
+
+
+def _claim(group_id: str) -> None:
+    """
+    Take the group's LiveSession lease for this process. Raises
+    group_not_found, or live_group_elsewhere while another process holds an
+    unexpired lease.
+    """
+    now = _utcnow()
+    expired = now - timedelta(seconds=LIVE_SESSION_LEASE)
+    with get_session() as session:
+        if not session.get(WeldGroup, group_id):
+            raise ValueError("group_not_found")
+        taken = session.exec(
+            update(LiveSession)
+            .where(LiveSession.group_id == group_id)
+            .where(or_(LiveSession.owner == OWNER, LiveSession.heartbeat < expired))
+            .values(owner=OWNER, heartbeat=now)
+        ).rowcount
+        if not taken:
+            session.add(LiveSession(group_id=group_id, owner=OWNER, heartbeat=now))
+        try:
+            session.commit()
+        except IntegrityError:
+            raise ValueError("live_group_elsewhere")
+    _start_renewer()
+
+
+def _start_renewer() -> None:
+    global _renewer
+    with _groups_lock:
+        if _renewer is None:
+            _renewer_stop.clear()
+            _renewer = threading.Thread(target=_renew_leases, name="live-lease", daemon=True)
+            _renewer.start()
+
+
+def _renew_leases() -> None:
+    while not _renewer_stop.wait(LIVE_SESSION_LEASE / 4):
+        with _groups_lock:
+            group_ids = list(_groups)
+        if not group_ids:
+            continue
+        try:
+            with get_session() as session:
+                held = set(
+                    session.exec(
+                        select(LiveSession.group_id)
+                        .where(LiveSession.owner == OWNER)
+                        .where(LiveSession.group_id.in_(group_ids))  # type: ignore
+                    ).all()
+                )
+                session.exec(
+                    update(LiveSession)
+                    .where(LiveSession.owner == OWNER)
+                    .where(LiveSession.group_id.in_(held))  # type: ignore
+                    .values(heartbeat=_utcnow())
+                )
+                session.commit()
+        except Exception:
+            logger.warning("Renewing live session leases failed", exc_info=True)
+            continue
+        for group_id in set(group_ids) - held:
+            _drop_group(group_id)
+
+
+def _drop_group(group_id: str) -> None:
+    # The lease expired and another process took the group over: its state
+    # there starts from the database, so this copy must not write anything.
+    with _groups_lock:
+        live = _groups.pop(group_id, None)
+    if live is None:
+        return
+    logger.warning("Live session of %s was taken over; dropping its open layers", group_id)
+    with live.lock:
+        watcher, live.watcher = live.watcher, None
+    if watcher is not None:
+        watcher.finish_open = False
+        watcher.stop_event.set()
+
+
+def get_live_group(group_id: str) -> LiveGroup:
+    """
+    The live state of a group, created on first use. Raises group_not_found
+    or live_group_elsewhere (see `_claim`).
+    """
+    with _groups_lock:
+        live = _groups.get(group_id)
+        if live is not None:
+            return live
+    _claim(group_id)
+    with _groups_lock:
+        live = _groups.get(group_id)
+        if live is None:
+            live = _groups[group_id] = LiveGroup(group_id)
+            live.stored = _stored_rollup(group_id)
+        return live
+
+
+def _summary_json(rollup: WeldRollupBase) -> str:
+    return dumps(rollup_to_summary(rollup).model_dump(mode="json"))
+
+
+def _chunk_event(live: LiveGroup, layer: LiveLayer, kind: str, cols) -> str:
+    if kind == "scandata":
+        points = {
+            "seq": encode_array(cols.seq, "int"),
+            "x": encode_array(cols.x, "float"),
+            "y": encode_array(cols.y, "float"),
+            "z": encode_array(cols.z, "float"),
+            "scan_value": encode_array(transform_scan_values(cols.raw), "float?"),
+        }
+    else:
+        points = {
+            "seq": encode_array(cols.seq, "int"),
+            "x": encode_array(cols.x, "float"),
+            "y": encode_array(cols.y, "float"),
+            "z": encode_array(cols.z, "float"),
+            "wire_feed_rate": encode_array(cols.wire_feed_rate, "float?"),
+            "travel_speed": encode_array(cols.robot_speed, "float?"),
+            "voltage": encode_array(cols.voltage, "float?"),
+            "current": encode_array(cols.current, "float?"),
+        }
+    return encode_object(
+        {
+            "group_id": live.group_id,
+            "layer_number": layer.layer_number,
+            "kind": kind,
+            "count": int(cols.seq.shape[0]),
+            "scan_rows": layer.counts["scandata"],
+            "weld_rows": layer.counts["welddat"],
+        },
+        {
+            **points,
+            "layer_summary": _summary_json(layer.rollup),
+            "group_summary": _summary_json(live.group_rollup()),
+        },
+    )
+
+
+def feed_chunk(group_id: str, layer_number: int, kind: str, text: str) -> dict:
+    """
+    Add a chunk of lines to an open layer (opening it if needed) and publish
+    the parsed rows. Raises `layer_exists` if the layer is already stored or
+    `layer_finishing` while it is being stored.
+    """
+    live = get_live_group(group_id)
+    with live.lock:
+        if layer_number in live.finishing:
+            raise ValueError("layer_finishing")
+        layer = live.layers.get(layer_number)
+        if layer is None:
+            with get_session() as session:
+                if layer_number in existing_layer_numbers(session, group_id):
+                    raise ValueError("layer_exists")
+            layer = live.layers[layer_number] = LiveLayer(layer_number)
+        cols = layer.feed(kind, text)
+        if cols.seq.shape[0]:
+            live.publish("chunk", _chunk_event(live, layer, kind, cols))
+        return {
+            "layer_number": layer_number,
+            "kind": kind,
+            "parsed": int(cols.seq.shape[0]),
+            "scan_rows": layer.counts["scandata"],
+            "weld_rows": layer.counts["welddat"],
+        }
+
+
+def _store_layer(
+    group_id: str,
+    layer_number: int,
+    scan: ScanColumns,
+    weld: WeldColumns,
+    files: Tuple[Optional[str], Optional[str]],
+) -> str:
+    with get_session() as session:
+        lease = session.get(LiveSession, group_id)
+        if lease is None or lease.owner != OWNER:
+            raise ValueError("live_group_elsewhere")
+        busy = session.exec(
+            select(func.count())
+            .select_from(IngestJob)
+            .where(IngestJob.group_id == group_id)
+            .where(IngestJob.status.in_(("queued", "running")))  # type: ignore
+        ).one()
+        if busy:
+            raise ValueError("group_busy")
+        group = session.get(WeldGroup, group_id)
+        if not group:
+            raise ValueError("group_not_found")
+        return append_layer(session, group, layer_number, scan, weld, *files).id
+
+
+def finish_layer(group_id: str, layer_number: int, files: Tuple[Optional[str], Optional[str]] = (None, None)) -> str:
+    """
+    Store an open layer like an appended one (see `append_layer`) and
+    publish `layer_finished`. Returns the new layer id. Raises
+    `live_layer_not_found`, `group_busy` while an ingest job is active for
+    the group, or `layer_exists`; the layer stays open if it is not stored.
+
+    The buffered columns are taken under the group lock, which is released
+    for the database write, so chunks of other layers are not held up.
+    """
+    live = get_live_group(group_id)
+    with live.write_lock:
+        with live.lock:
+            layer = live.layers.pop(layer_number, None)
+            if layer is None:
+                raise ValueError("live_layer_not_found")
+            live.finishing[layer_number] = layer
+            scan, weld = layer.columns()
+        try:
+            layer_id = _store_layer(group_id, layer_number, scan, weld, files)
+        except BaseException:
+            with live.lock:
+                live.layers[layer_number] = live.finishing.pop(layer_number)
+            raise
+        stored = _stored_rollup(group_id)
+        with live.lock:
+            del live.finishing[layer_number]
+            live.stored = stored
+            live.publish(
+                "layer_finished",
+                encode_object(
+                    {
+                        "group_id": group_id,
+                        "layer_number": layer_number,
+                        "layer_id": layer_id,
+                        "scan_rows": int(scan.seq.shape[0]),
+                        "weld_rows": int(weld.seq.shape[0]),
+                    },
+                    {"group_summary": _summary_json(live.group_rollup())},
+                ),
+            )
+    return layer_id
+
+
+def snapshot_json(group_id: str) -> str:
+    """Open layers with their row counts and summaries, plus the group summary."""
+    live = get_live_group(group_id)
+    with live.lock:
+        layers = [
+            encode_object(
+                {
+                    "layer_number": layer.layer_number,
+                    "scan_rows": layer.counts["scandata"],
+                    "weld_rows": layer.counts["welddat"],
+                },
+                {"summary": _summary_json(layer.rollup)},
+            )
+            for layer in sorted(live.layers.values(), key=lambda l: l.layer_number)
+        ]
+        return encode_object(
+            {
+                "group_id": group_id,
+                "watching": live.watcher.path if live.watcher else None,
+            },
+            {"layers": "[" + ",".join(layers) + "]", "group_summary": _summary_json(live.group_rollup())},
+        )
+
+
+def subscribe(group_id: str, loop: asyncio.AbstractEventLoop) -> _Subscriber:
+    live = get_live_group(group_id)
+    sub = _Subscriber(loop)
+    with live.lock:
+        live.subscribers.add(sub)
+    return sub
+
+
+def unsubscribe(group_id: str, sub: _Subscriber) -> None:
+    live = _groups.get(group_id)
+    if live is not None:
+        with live.lock:
+            live.subscribers.discard(sub)
+
+
+class _Watcher(threading.Thread):
+    """
+    Polls a directory every LIVE_POLL_INTERVAL and feeds the bytes appended
+    to each w### file since the last poll. Layers already stored are
+    ignored; an open layer is finished once a higher-numbered layer has
+    data, and every open layer is finished when the watcher stops.
+    """
+
+    def __init__(self, group_id: str, path: str) -> None:
+        super().__init__(name=f"live-watch-{group_id[:8]}", daemon=True)
+        self.group_id = group_id
+        self.path = path
+        self.offsets: Dict[str, int] = {}
+        self.stop_event = threading.Event()
+        self.finish_open = True
+        with get_session() as session:
+            self.done: Set[int] = existing_layer_numbers(session, group_id)
+
+    def _files(self) -> List[Tuple[int, str, str]]:
+        out = []
+        for name in os.listdir(self.path):
+            m = PAIR_RE.match(name)
+            if not m:
+                continue
+            kind = m.group(2).lower()
+            kind = "scandata" if "scan" in kind else "welddat" if "weld" in kind else None
+            if kind and int(m.group(1)) not in self.done:
+                out.append((int(m.group(1)), kind, name))
+        return sorted(out)
+
+    def _finish(self, layer_number: int) -> None:
+        name = f"w{layer_number:03d}"
+        try:
+            finish_layer(
+                self.group_id, layer_number, (f"{name}_scandata.txt", f"{name}_welddat.txt")
+            )
+        except ValueError as e:
+            if str(e) != "group_busy":
+                logger.warning("Live layer %s of %s not stored: %s", layer_number, self.group_id, e)
+                self.done.add(layer_number)
+            return
+        self.done.add(layer_number)
+
+    def poll(self) -> None:
+        for layer_number, kind, name in self._files():
+            full = os.path.join(self.path, name)
+            offset = self.offsets.get(name, 0)
+            try:
+                size = os.path.getsize(full)
+            except FileNotFoundError:
+                continue
+            if size <= offset:
+                continue
+            with open(full, "rb") as f:
+                f.seek(offset)
+                data = f.read(size - offset)
+            # Only consume whole lines, so a multi-byte character is never split.
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                continue
+            self.offsets[name] = offset + cut
+            try:
+                feed_chunk(self.group_id, layer_number, kind, data[:cut].decode("utf-8", "replace"))
+            except ValueError as e:
+                if str(e) in ("layer_exists", "layer_finishing"):
+                    self.done.add(layer_number)
+                    continue
+                raise
+        live = get_live_group(self.group_id)
+        with live.lock:
+            open_layers = sorted(live.layers)
+        for layer_number in open_layers[:-1]:
+            self._finish(layer_number)
+
+    def run(self) -> None:
+        while not self.stop_event.wait(LIVE_POLL_INTERVAL):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Live watcher for %s failed to poll %s", self.group_id, self.path)
+        if not self.finish_open:
+            return
+        try:
+            self.poll()
+        finally:
+            live = get_live_group(self.group_id)
+            with live.lock:
+                open_layers = sorted(live.layers)
+            for layer_number in open_layers:
+                self._finish(layer_number)
+
+
+def start_watch(group_id: str, path: str) -> str:
+    """Tail `path` (below LIVE_WATCH_ROOT) into the group; returns the resolved path."""
+    if not LIVE_WATCH_ROOT:
+        raise ValueError("watch_disabled")
+    root = Path(LIVE_WATCH_ROOT).resolve()
+    target = (root / path).resolve()
+    if target != root and root not in target.parents:
+        raise ValueError("watch_path_outside_root")
+    if not target.is_dir():
+        raise ValueError("watch_path_not_found")
+    live = get_live_group(group_id)
+    with live.lock:
+        if live.watcher is not None:
+            raise ValueError("already_watching")
+        live.watcher = _Watcher(group_id, str(target))
+        live.watcher.start()
+    return str(target)
+
+
+def stop_watch(group_id: str) -> None:
+    """Stop the group's watcher after a last poll; its open layers are finished."""
+    live = get_live_group(group_id)
+    with live.lock:
+        watcher, live.watcher = live.watcher, None
+    if watcher is None:
+        raise ValueError("not_watching")
+    watcher.stop_event.set()
+    watcher.join()
+
+
+def shutdown() -> None:
+    """
+    Stop every watcher without storing its open layers: they may still be
+    growing, and watching the directory again re-reads them from the start.
+    Then release this process's leases so another process can take over.
+    """
+    global _renewer
+    for live in list(_groups.values()):
+        watcher, live.watcher = live.watcher, None
+        if watcher is not None:
+            watcher.finish_open = False
+            watcher.stop_event.set()
+            watcher.join(timeout=10)
+    _renewer_stop.set()
+    _renewer = None
+    with _groups_lock:
+        _groups.clear()
+    with get_session() as session:
+        session.exec(delete(LiveSession).where(LiveSession.owner == OWNER))  # type: ignore
+        session.commit()
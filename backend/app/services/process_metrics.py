@@ -0,0 +1,272 @@
+# app/services/process_metrics.py
+"""
+Derived process metrics from the raw weld columns.
+
+Per sample, from one vectorized pass over a layer's weld samples in seq order:
+- arc power V * I (W);
+- heat input arc_efficiency * V * I / travel speed (J/mm);
+- wire fed per sample, wire feed * sample_period_s (mm), and its mass
+  (wire cross-section * density, g);
+- toolpath step, the distance from the previous sample's x, y, z (mm).
+
+Per layer, ingest stores the totals in LayerProcess next to LayerSummary:
+arc time and energy, the sums/counts/maxima of power and heat input, fed
+wire length and mass, and path length. Group totals are SUM/MAX over the
+layers. Constants come from `process_vars` in the config
+(app/config/v0.1/process_vars.json). Layers stored with other constants, or
+before the table existed, are recomputed on request once the group's ingest
+is complete.
+"""
+import hashlib
+import json
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, delete, select
+
+import app.utils.config_loader as cfg
+from app.database.models import Layer, LayerProcess, ProcessRollupBase
+from app.database.schemas import GroupProcessOut, LayerProcessOut, ProcessMetricsOut
+from app.services.storage import load_weld_columns
+from app.utils.parsers import WeldColumns
+
+DEFAULT_PROCESS_VARS = {
+    "wire_diameter_mm": 1.2,
+    "wire_density_g_cm3": 7.85,
+    "arc_efficiency": 0.8,
+    "sample_period_s": 0.01,
+    "wire_feed_rate_to_mm_s": 1000.0 / 60.0,  # m/min
+    "travel_speed_to_mm_s": 1.0,
+}
+
+# Per-sample columns of `sample_metrics`. All but power and heat input are
+# running totals from the layer's first sample, so they stay meaningful after
+# downsampling.
+SAMPLE_COLUMNS = (
+    "arc_power_w",
+    "heat_input_j_mm",
+    "arc_energy_j",
+    "wire_length_mm",
+    "deposited_mass_g",
+    "path_length_mm",
+)
+
+
+def process_vars() -> Dict[str, float]:
+    conf = cfg.CONFIG.get("process_vars", {})
+    return {k: float(conf.get(k, v)) for k, v in DEFAULT_PROCESS_VARS.items()}
+
+
+def _params_hash(pv: Dict[str, float]) -> str:
+    return hashlib.sha1(json.dumps(pv, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _ordered(weld: WeldColumns) -> WeldColumns:
+    if weld.seq.size > 1 and np.any(np.diff(weld.seq) < 0):
+        order = np.argsort(weld.seq, kind="stable")
+        return WeldColumns(*(c[order] for c in weld))
+    return weld
+
+
+def _per_sample(weld: WeldColumns, pv: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """Pointwise quantities of samples in seq order (NaN where an input is missing)."""
+    dt = pv["sample_period_s"]
+    area = np.pi * (pv["wire_diameter_mm"] / 2) ** 2  # mm^2
+    density = pv["wire_density_g_cm3"] / 1000.0  # g/mm^3
+    power = weld.voltage * weld.current
+    speed = weld.robot_speed * pv["travel_speed_to_mm_s"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        heat = np.where(speed > 0, pv["arc_efficiency"] * power / speed, np.nan)
+    wire = weld.wire_feed_rate * pv["wire_feed_rate_to_mm_s"] * dt
+    step = np.zeros(weld.seq.shape[0])
+    if step.size > 1:
+        step[1:] = np.sqrt(np.diff(weld.x) ** 2 + np.diff(weld.y) ** 2 + np.diff(weld.z) ** 2)
+    return {
+        "power": power,
+        "heat": heat,
+        "energy": power * dt,
+        "wire": wire,
+        "mass": wire * area * density,
+        "step": step,
+    }
+
+
+def sample_metrics(weld: WeldColumns) -> Dict[str, np.ndarray]:
+    """
+    SAMPLE_COLUMNS for every sample of `weld` (in its given order, which must
+    be seq order): power and heat input per sample, the rest as running
+    totals. Missing inputs are skipped by the running totals.
+    """
+    s = _per_sample(weld, process_vars())
+    return {
+        "arc_power_w": s["power"],
+        "heat_input_j_mm": s["heat"],
+        "arc_energy_j": np.cumsum(np.nan_to_num(s["energy"])),
+        "wire_length_mm": np.cumsum(np.nan_to_num(s["wire"])),
+        "deposited_mass_g": np.cumsum(np.nan_to_num(s["mass"])),
+        "path_length_mm": np.cumsum(np.nan_to_num(s["step"])),
+    }
+
+
+def process_fields(weld: WeldColumns, pv: Optional[Dict[str, float]] = None) -> Dict[str, Optional[float]]:
+    """ProcessRollupBase fields for one layer's weld samples."""
+    pv = process_vars() if pv is None else pv
+    s = _per_sample(_ordered(weld), pv)
+    power = s["power"][~np.isnan(s["power"])]
+    heat = s["heat"][~np.isnan(s["heat"])]
+    return {
+        "samples": int(weld.seq.shape[0]),
+        "arc_time_s": float(power.size * pv["sample_period_s"]),
+        "arc_energy_j": float(np.nansum(s["energy"])),
+        "arc_power_count": int(power.size),
+        "arc_power_sum": float(power.sum()) if power.size else None,
+        "arc_power_max": float(power.max()) if power.size else None,
+        "heat_input_count": int(heat.size),
+        "heat_input_sum": float(heat.sum()) if heat.size else None,
+        "heat_input_max": float(heat.max()) if heat.size else None,
+        "wire_length_mm": float(np.nansum(s["wire"])),
+        "deposited_mass_g": float(np.nansum(s["mass"])),
+        "path_length_mm": float(np.nansum(s["step"])),
+    }
+
+
+def write_layer_process(session: Session, layer: Layer, weld: WeldColumns) -> None:
+    """Add the LayerProcess row for a freshly written layer (no commit)."""
+    pv = process_vars()
+    session.add(
+        LayerProcess(
+            layer_id=layer.id,
+            group_id=layer.group_id,
+            layer_number=layer.layer_number,
+            params=_params_hash(pv),
+            **process_fields(weld, pv),
+        )
+    )
+
+
+def build_layer_process(session: Session, layers: Sequence[Layer]) -> int:
+    """
+    Recompute the layers among `layers` without a LayerProcess row for the
+    current constants, one layer in memory at a time. Commits per layer;
+    returns the number of layers computed.
+    """
+    current = _params_hash(process_vars())
+    ids = [layer.id for layer in layers]
+    done = set(
+        session.exec(
+            select(LayerProcess.layer_id)
+            .where(LayerProcess.layer_id.in_(ids))  # type: ignore
+            .where(LayerProcess.params == current)
+        ).all()
+    )
+    todo = [(layer.id, layer) for layer in layers if layer.id not in done]
+    for layer_id, layer in todo:
+        session.exec(delete(LayerProcess).where(LayerProcess.layer_id == layer_id))  # type: ignore
+        write_layer_process(session, layer, load_weld_columns(session, layer_id))
+        session.commit()
+    return len(todo)
+
+
+def process_to_out(r: ProcessRollupBase) -> ProcessMetricsOut:
+    return ProcessMetricsOut(
+        samples=r.samples,
+        arc_time_s=r.arc_time_s,
+        arc_energy_j=r.arc_energy_j,
+        arc_power_avg_w=r.arc_power_sum / r.arc_power_count if r.arc_power_count else None,
+        arc_power_max_w=r.arc_power_max,
+        heat_input_avg_j_mm=r.heat_input_sum / r.heat_input_count if r.heat_input_count else None,
+        heat_input_max_j_mm=r.heat_input_max,
+        wire_length_mm=r.wire_length_mm,
+        deposited_mass_g=r.deposited_mass_g,
+        deposition_rate_g_s=r.deposited_mass_g / r.arc_time_s if r.arc_time_s else None,
+        path_length_mm=r.path_length_mm,
+    )
+
+
+def _layer_rollups(
+    session: Session, layers: Sequence[Layer], complete: bool
+) -> Dict[str, ProcessRollupBase]:
+    """
+    Rollup per layer id, from the LayerProcess rows. Missing or outdated
+    rows are recomputed and stored when `complete`; otherwise those layers
+    are computed on the fly.
+    """
+    if complete:
+        build_layer_process(session, layers)
+    ids = [layer.id for layer in layers]
+    current = _params_hash(process_vars())
+    rows = {
+        r.layer_id: r
+        for r in session.exec(
+            select(LayerProcess).where(LayerProcess.layer_id.in_(ids))  # type: ignore
+        ).all()
+        if r.params == current
+    }
+    out: Dict[str, ProcessRollupBase] = {}
+    for layer_id in ids:
+        r = rows.get(layer_id)
+        if r is None:
+            r = ProcessRollupBase(**process_fields(load_weld_columns(session, layer_id)))
+        out[layer_id] = r
+    return out
+
+
+def layers_process(
+    session: Session, layers: Sequence[Layer], complete: bool
+) -> Dict[str, ProcessMetricsOut]:
+    """Totals per layer id (see `_layer_rollups`)."""
+    return {k: process_to_out(r) for k, r in _layer_rollups(session, layers, complete).items()}
+
+
+def _group_totals(session: Session, group_id: str) -> ProcessRollupBase:
+    """SUM/MAX of the group's LayerProcess rows in one query."""
+    sums = [f for f in ProcessRollupBase.model_fields if not f.endswith("_max")]
+    maxes = [f for f in ProcessRollupBase.model_fields if f.endswith("_max")]
+    row = session.exec(
+        select(
+            *(func.sum(getattr(LayerProcess, f)) for f in sums),
+            *(func.max(getattr(LayerProcess, f)) for f in maxes),
+        ).where(LayerProcess.group_id == group_id)
+    ).one()
+    fields = {f: v for f, v in zip(sums + maxes, row) if v is not None}
+    return ProcessRollupBase(**fields)
+
+
+def group_process(
+    session: Session, group_id: str, layers: Sequence[Layer], complete: bool
+) -> GroupProcessOut:
+    """
+    Group totals and per-layer totals of `layers` (every layer of the
+    group), in layer order. Once ingest is complete the group totals come
+    from one SUM/MAX query; before that they are merged in memory.
+    """
+    layers = sorted(layers, key=lambda layer: layer.layer_number)
+    refs = [(layer.id, layer.layer_number) for layer in layers]
+    rollups = _layer_rollups(session, layers, complete)
+    per_layer = {k: process_to_out(r) for k, r in rollups.items()}
+    if complete:
+        summary = process_to_out(_group_totals(session, group_id))
+    else:
+        summary = process_to_out(ProcessRollupBase(**merge_process(list(rollups.values()))))
+    return GroupProcessOut(
+        summary=summary,
+        per_layer=[
+            LayerProcessOut(layer_id=layer_id, layer_number=number, **per_layer[layer_id].model_dump())
+            for layer_id, number in refs
+        ],
+    )
+
+
+def merge_process(rollups: Sequence[ProcessRollupBase]) -> Dict[str, Optional[float]]:
+    """Merge layer rollups the way `_group_totals` does in SQL."""
+    out: Dict[str, Optional[float]] = {}
+    for name, field in ProcessRollupBase.model_fields.items():
+        vals = [getattr(r, name) for r in rollups if getattr(r, name) is not None]
+        if name.endswith("_max"):
+            out[name] = max(vals) if vals else None
+        elif name in ("arc_power_sum", "heat_input_sum"):
+            out[name] = sum(vals) if vals else None
+        else:
+            out[name] = sum(vals) if vals else field.default
+    return out
@@ -0,0 +1,227 @@
+# app/services/response_cache.py
+"""
+Versioned response cache for the group/layer data endpoints.
+
+Entries are keyed by what was requested plus a version token built from the
+group's `ingest_version`, its status and the config fingerprint, so a
+re-ingest, a failure or a config change can never serve stale bytes even
+across worker processes. Only groups with `ingest_complete` are cached; their
+data does not change until the version moves. The ETag is derived from the
+key, which lets a matching If-None-Match be answered with 304 before any
+data is loaded.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.database.db import get_session, run_db
+from app.database.models import Layer, WeldGroup
+import app.utils.config_loader as cfg
+from app.utils.metrics import REGISTRY
+
+# Upper bound on cached body bytes per process.
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+    etag: str
+
+
+class ResponseCache:
+    """Thread-safe LRU bounded by the total size of the cached bodies."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._by_group: Dict[str, Set[Hashable]] = {}
+        self._group_of: Dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, group_id: str, entry: CachedResponse) -> None:
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._by_group.setdefault(group_id, set()).add(key)
+            self._group_of[key] = group_id
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def invalidate_group(self, group_id: str) -> int:
+        with self._lock:
+            keys = list(self._by_group.get(group_id, ()))
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_group.clear()
+            self._group_of.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= len(entry.body)
+        group_id = self._group_of.pop(key)
+        keys = self._by_group.get(group_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_group[group_id]
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
+
+def _cache_metrics() -> List[str]:
+    stats = response_cache.stats()
+    lines = []
+    for key, kind in (
+        ("entries", "gauge"),
+        ("bytes", "gauge"),
+        ("hits", "counter"),
+        ("misses", "counter"),
+        ("not_modified", "counter"),
+        ("evictions", "counter"),
+    ):
+        name = f"response_cache_{key}" + ("_total" if kind == "counter" else "")
+        lines += [f"# TYPE {name} {kind}", f"{name} {stats[key]}"]
+    return lines
+
+
+REGISTRY.add_collector(_cache_metrics)
+
+
+def _version_token(group: WeldGroup) -> Optional[str]:
+    if not group.ingest_complete:
+        return None
+    return f"{group.ingest_version}:{group.status}:{cfg.fingerprint()}"
+
+
+def group_cache_version(group_id: str) -> Optional[str]:
+    """Version token for a group, or None if its responses must not be cached."""
+    with get_session() as session:
+        group = session.get(WeldGroup, group_id)
+        if not group:
+            raise ValueError("group_not_found")
+        return _version_token(group)
+
+
+def layer_cache_version(layer_id: str) -> Tuple[str, Optional[str]]:
+    """(group_id, version token) for a layer; token is None if not cacheable."""
+    with get_session() as session:
+        layer = session.get(Layer, layer_id)
+        if not layer:
+            raise ValueError("layer_not_found")
+        group = session.get(WeldGroup, layer.group_id)
+        return layer.group_id, _version_token(group) if group else None
+
+
+def json_body(model: Any) -> bytes:
+    """Serialize a response model exactly as FastAPI's default JSONResponse would."""
+    return JSONResponse(content=jsonable_encoder(model)).body
+
+
+def json_response(model: Any, status_code: int = 200) -> Response:
+    """
+    Pre-rendered JSON response, so routes can serialize on the DB thread pool
+    instead of having FastAPI do it on the event loop.
+    """
+    return Response(content=json_body(model), status_code=status_code, media_type="application/json")
+
+
+def etag_for(key: Hashable) -> str:
+    return '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    # If-None-Match uses weak comparison.
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+async def serve_cached(
+    request: Request,
+    key: Tuple,
+    group_id: str,
+    version: Optional[str],
+    build: Callable[[], Tuple[bytes, str]],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Answer from the cache (or with 304) when `version` allows it, otherwise
+    run `build` on the DB thread pool and cache its (body, media_type).
+    """
+    if version is None:
+        body, media_type = await run_db(build)
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    full_key = key + (group_id, version)
+    etag = etag_for(full_key)
+    if _etag_matches(request, etag):
+        response_cache.record_not_modified()
+        return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
+
+    entry = response_cache.get(full_key)
+    if entry is None:
+        body, media_type = await run_db(build)
+        entry = CachedResponse(body, media_type, etag)
+        response_cache.put(full_key, group_id, entry)
+    return Response(
+        content=entry.body,
+        media_type=entry.media_type,
+        headers={"ETag": entry.etag, **(headers or {})},
+    )
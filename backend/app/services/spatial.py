@@ -0,0 +1,276 @@
+# app/services/spatial.py
+"""
+Per-layer spatial tile index and bounding-box queries.
+
+At ingest every layer's scan and weld points are bucketed into a uniform x/y
+grid of SPATIAL_TILE_SIZE; each non-empty cell becomes one LayerTile row with
+its exact x/y/z bounds and the seq numbers of its points. A region query
+selects the tiles whose bounds intersect the box within the layer range
+(through the (group_id, kind, layer_number) index), loads only the indexed
+points of those tiles and tests them exactly, so it never reads the rest of
+the group.
+"""
+import os
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.database.db import get_session
+from app.database.models import Layer, LayerTile, LayerTileRun, WeldGroup, WeldRollupBase
+from app.database.schemas import ScanValueSummary
+from app.services.storage import load_scan_columns, load_weld_columns
+from app.services.summaries import merge_rollups, rollup_fields, rollup_to_summary
+from app.utils.json_format import concat_arrays, dumps, encode_object, encode_rows
+from app.utils.parsers import WeldColumns
+
+# Grid cell edge in x/y (same units as the data, mm).
+SPATIAL_TILE_SIZE = float(os.getenv("SPATIAL_TILE_SIZE", "10.0"))
+
+
+class Box(NamedTuple):
+    """Axis-aligned query box; None leaves that side unbounded."""
+    min_x: Optional[float] = None
+    max_x: Optional[float] = None
+    min_y: Optional[float] = None
+    max_y: Optional[float] = None
+    min_z: Optional[float] = None
+    max_z: Optional[float] = None
+
+
+def _layer_tiles(layer: Layer, kind: str, cols, tile: float) -> List[LayerTile]:
+    x, y, z = cols.x, cols.y, cols.z
+    pos = np.flatnonzero(np.isfinite(x) & np.isfinite(y) & np.isfinite(z))
+    if pos.size == 0:
+        return []
+    ix = np.floor(x[pos] / tile).astype(np.int64)
+    iy = np.floor(y[pos] / tile).astype(np.int64)
+    order = np.lexsort((pos, iy, ix))
+    ix, iy, pos = ix[order], iy[order], pos[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(ix) != 0) | (np.diff(iy) != 0)])
+    ends = np.append(starts[1:], pos.size)
+    px, py, pz = x[pos], y[pos], z[pos]
+    bounds = [
+        (np.minimum.reduceat(v, starts), np.maximum.reduceat(v, starts)) for v in (px, py, pz)
+    ]
+    seqs = cols.seq[pos].astype("<u4")
+    return [
+        LayerTile(
+            layer_id=layer.id,
+            kind=kind,
+            ix=int(ix[s]),
+            iy=int(iy[s]),
+            group_id=layer.group_id,
+            layer_number=layer.layer_number,
+            n=int(e - s),
+            min_x=float(bounds[0][0][i]),
+            max_x=float(bounds[0][1][i]),
+            min_y=float(bounds[1][0][i]),
+            max_y=float(bounds[1][1][i]),
+            min_z=float(bounds[2][0][i]),
+            max_z=float(bounds[2][1][i]),
+            seqs=seqs[s:e].tobytes(),
+        )
+        for i, (s, e) in enumerate(zip(starts.tolist(), ends.tolist()))
+    ]
+
+
+def write_layer_tiles(session: Session, layer: Layer, scan, weld: WeldColumns) -> None:
+    """Add the LayerTile rows and LayerTileRun marker for a freshly written layer (no commit)."""
+    tiles = [
+        tile
+        for kind, cols in (("scan", scan), ("weld", weld))
+        for tile in _layer_tiles(layer, kind, cols, SPATIAL_TILE_SIZE)
+    ]
+    session.add_all(tiles)
+    session.add(LayerTileRun(layer_id=layer.id, group_id=layer.group_id, tiles=len(tiles)))
+
+
+def build_group_tiles(session: Session, group_id: str) -> int:
+    """
+    Backfill tiles for layers ingested before the index existed, one layer
+    in memory at a time. Every layer gets a LayerTileRun marker, empty ones
+    included, so once a group is indexed this is a single query. Layers
+    tiled before the marker existed only get their marker. Commits; returns
+    the number of layers indexed.
+    """
+    marked = select(LayerTileRun.layer_id).where(LayerTileRun.group_id == group_id)
+    layers = session.exec(
+        select(Layer).where(Layer.group_id == group_id).where(Layer.id.not_in(marked))  # type: ignore
+    ).all()
+    if not layers:
+        return 0
+    tiled = dict(
+        session.exec(
+            select(LayerTile.layer_id, func.count())
+            .where(LayerTile.layer_id.in_([layer.id for layer in layers]))  # type: ignore
+            .group_by(LayerTile.layer_id)
+        ).all()
+    )
+    built = 0
+    for layer in layers:
+        if layer.id in tiled:
+            session.add(LayerTileRun(layer_id=layer.id, group_id=group_id, tiles=tiled[layer.id]))
+        else:
+            scan = load_scan_columns(session, layer.id)
+            weld = load_weld_columns(session, layer.id)
+            write_layer_tiles(session, layer, scan, weld)
+            built += 1
+        session.commit()
+    return built
+
+
+def _tile_query(group_id: str, kind: str, box: Box, layer_min: Optional[int], layer_max: Optional[int]):
+    stmt = select(LayerTile).where(LayerTile.group_id == group_id).where(LayerTile.kind == kind)
+    if layer_min is not None:
+        stmt = stmt.where(LayerTile.layer_number >= layer_min)
+    if layer_max is not None:
+        stmt = stmt.where(LayerTile.layer_number <= layer_max)
+    for axis in ("x", "y", "z"):
+        lo = getattr(box, f"min_{axis}")
+        hi = getattr(box, f"max_{axis}")
+        if lo is not None:
+            stmt = stmt.where(getattr(LayerTile, f"max_{axis}") >= lo)
+        if hi is not None:
+            stmt = stmt.where(getattr(LayerTile, f"min_{axis}") <= hi)
+    return stmt.order_by(LayerTile.layer_number)  # type: ignore
+
+
+def _inside(cols, box: Box) -> np.ndarray:
+    mask = np.ones(cols.x.shape[0], dtype=bool)
+    for axis in ("x", "y", "z"):
+        vals = getattr(cols, axis)
+        lo = getattr(box, f"min_{axis}")
+        hi = getattr(box, f"max_{axis}")
+        if lo is not None:
+            mask &= vals >= lo
+        if hi is not None:
+            mask &= vals <= hi
+    return mask
+
+
+class RegionLayer(NamedTuple):
+    layer_id: str
+    layer_number: int
+    cols: tuple  # StoredScanColumns or WeldColumns restricted to the box
+
+
+def _region_layers(
+    session: Session,
+    group_id: str,
+    kind: str,
+    box: Box,
+    layer_min: Optional[int],
+    layer_max: Optional[int],
+) -> Tuple[List[RegionLayer], int]:
+    tiles = session.exec(_tile_query(group_id, kind, box, layer_min, layer_max)).all()
+    by_layer: Dict[str, List[LayerTile]] = defaultdict(list)
+    for t in tiles:
+        by_layer[t.layer_id].append(t)
+
+    loader = load_scan_columns if kind == "scan" else load_weld_columns
+    out: List[RegionLayer] = []
+    for layer_id, layer_tiles in by_layer.items():
+        seqs = np.concatenate([np.frombuffer(t.seqs, dtype="<u4") for t in layer_tiles])
+        subset = loader(session, layer_id, seqs)
+        keep = _inside(subset, box)
+        if keep.any():
+            out.append(
+                RegionLayer(
+                    layer_id, layer_tiles[0].layer_number, type(subset)(*(c[keep] for c in subset))
+                )
+            )
+    return out, len(tiles)
+
+
+def _scan_value_summary(layers: Sequence[RegionLayer]) -> ScanValueSummary:
+    vals = [r.cols.scan_value[~np.isnan(r.cols.scan_value)] for r in layers]
+    allv = np.concatenate(vals) if vals else np.empty(0)
+    if allv.size == 0:
+        return ScanValueSummary(n=0)
+    return ScanValueSummary(
+        n=int(allv.size), avg=float(allv.mean()), min=float(allv.min()), max=float(allv.max())
+    )
+
+
+def _points_json(layers: Sequence[RegionLayer], kind: str, limit: int) -> str:
+    chunks: List[str] = []
+    remaining = limit
+    for r in layers:
+        if remaining <= 0:
+            break
+        c = type(r.cols)(*(v[:remaining] for v in r.cols))
+        remaining -= c.seq.shape[0]
+        if kind == "scan":
+            columns = [
+                ("seq", c.seq, "int"),
+                ("x", c.x, "float"),
+                ("y", c.y, "float"),
+                ("z", c.z, "float"),
+                ("scan_value", c.scan_value, "float?"),
+            ]
+        else:
+            columns = [
+                ("seq", c.seq, "int"),
+                ("x", c.x, "float"),
+                ("y", c.y, "float"),
+                ("z", c.z, "float"),
+                ("wire_feed_rate", c.wire_feed_rate, "float?"),
+                ("travel_speed", c.robot_speed, "float?"),
+                ("voltage", c.voltage, "float?"),
+                ("current", c.current, "float?"),
+            ]
+        chunks.append(
+            encode_rows({"layer_id": r.layer_id, "layer_number": r.layer_number}, columns)
+        )
+    return concat_arrays(chunks)
+
+
+def query_region_json(
+    group_id: str,
+    box: Box,
+    layer_min: Optional[int] = None,
+    layer_max: Optional[int] = None,
+    limit: int = 100000,
+) -> bytes:
+    """
+    Points and aggregates of a group inside `box` and the layer range, as a
+    RegionOut JSON body. At most `limit` points per kind are returned (0 for
+    aggregates only); the aggregates always cover every matching point.
+    """
+    with get_session() as session:
+        group = session.get(WeldGroup, group_id)
+        if not group:
+            raise ValueError("group_not_found")
+        if group.ingest_complete:
+            build_group_tiles(session, group_id)
+
+        scan_layers, scan_tiles = _region_layers(session, group_id, "scan", box, layer_min, layer_max)
+        weld_layers, weld_tiles = _region_layers(session, group_id, "weld", box, layer_min, layer_max)
+
+    weld_summary = rollup_to_summary(
+        WeldRollupBase(**merge_rollups(WeldRollupBase(**rollup_fields(r.cols)) for r in weld_layers))
+    )
+    scan_count = sum(r.cols.seq.shape[0] for r in scan_layers)
+    weld_count = sum(r.cols.seq.shape[0] for r in weld_layers)
+    return encode_object(
+        {
+            "group_id": group_id,
+            "box": box._asdict(),
+            "layer_min": layer_min,
+            "layer_max": layer_max,
+            "tiles_scanned": scan_tiles + weld_tiles,
+            "layers_matched": len({r.layer_id for r in scan_layers} | {r.layer_id for r in weld_layers}),
+            "scan_count": scan_count,
+            "weld_count": weld_count,
+            "truncated": max(scan_count, weld_count) > limit,
+        },
+        {
+            "scan_value": dumps(_scan_value_summary(scan_layers).model_dump(mode="json")),
+            "weld_summary": dumps(weld_summary.model_dump(mode="json")),
+            "scan_data": _points_json(scan_layers, "scan", limit),
+            "weld_data": _points_json(weld_layers, "weld", limit),
+        },
+    ).encode("utf-8")
@@ -0,0 +1,329 @@
+# app/services/storage.py
+"""
+Per-layer sample storage.
+
+Samples live either as one row per sample in ScanData/WeldData ("rows") or as
+packed column blobs in LayerColumns ("columnar"). Readers go through
+`load_scan_columns` / `load_weld_columns`, which return numpy arrays for
+either layout, so callers never need to know how a layer was stored.
+"""
+import os
+import sys
+import logging
+import argparse
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, delete, select
+
+from app.database.db import get_session
+from app.database.models import Layer, LayerColumns, ScanData, WeldData
+from app.utils.parsers import ScanColumns, WeldColumns
+from app.utils.transforms import transform_scan_values
+
+logger = logging.getLogger(__name__)
+
+# "rows" (ScanData/WeldData tables) or "columnar" (LayerColumns blobs).
+SAMPLE_STORAGE = os.getenv("SAMPLE_STORAGE", "rows")
+# Blob precision for the columnar layout: "float64" or "float32".
+SAMPLE_STORAGE_DTYPE = os.getenv("SAMPLE_STORAGE_DTYPE", "float64")
+
+# Max seq values per IN (...) when loading a subset of a row-stored layer.
+SEQ_CHUNK = 10000
+
+# Column order inside each blob.
+SCAN_BLOB_FIELDS = ("x", "y", "z", "scan_raw", "scan_value", "speed")
+WELD_BLOB_FIELDS = ("x", "y", "z", "wire_feed_rate", "robot_speed", "current", "voltage")
+
+
+class StoredScanColumns(NamedTuple):
+    """Scan samples as stored (after the scan transform). NaN means NULL."""
+    seq: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    scan_raw: np.ndarray
+    scan_value: np.ndarray
+    speed: np.ndarray
+
+
+def _blob_dtype(name: str) -> np.dtype:
+    if name not in ("float64", "float32"):
+        raise ValueError(f"unsupported SAMPLE_STORAGE_DTYPE: {name}")
+    return np.dtype(name).newbyteorder("<")
+
+
+def _pack(cols: List[np.ndarray], dtype: np.dtype) -> bytes:
+    return np.ascontiguousarray(np.vstack(cols), dtype=dtype).tobytes()
+
+
+def _unpack(row: LayerColumns, ncols: int) -> np.ndarray:
+    # Zero-copy view over the blob: shape (ncols, n), read-only.
+    return np.frombuffer(row.data, dtype=np.dtype(row.dtype)).reshape(ncols, row.n)
+
+
+def _add_blobs(
+    session: Session,
+    layer_id: str,
+    scan: StoredScanColumns,
+    weld: WeldColumns,
+    dt: np.dtype,
+) -> None:
+    for kind, fields, cols in (
+        ("scan", SCAN_BLOB_FIELDS, scan),
+        ("weld", WELD_BLOB_FIELDS, weld),
+    ):
+        session.add(
+            LayerColumns(
+                layer_id=layer_id,
+                kind=kind,
+                n=int(cols.seq.shape[0]),
+                dtype=dt.str,
+                data=_pack([getattr(cols, f) for f in fields], dt),
+            )
+        )
+
+
+def write_layer_columns(
+    session: Session,
+    layer: Layer,
+    scan: ScanColumns,
+    weld: WeldColumns,
+    dtype: Optional[str] = None,
+    scan_value: Optional[np.ndarray] = None,
+) -> None:
+    """
+    Store a parsed layer as two LayerColumns blobs (no commit). Pass
+    `scan_value` when the scan transform has already been applied.
+    """
+    if scan_value is None:
+        scan_value = transform_scan_values(scan.raw)
+    stored = StoredScanColumns(
+        seq=scan.seq,
+        x=scan.x,
+        y=scan.y,
+        z=scan.z,
+        scan_raw=scan.raw,
+        scan_value=scan_value,
+        speed=scan.v,
+    )
+    _add_blobs(session, layer.id, stored, weld, _blob_dtype(dtype or SAMPLE_STORAGE_DTYPE))
+
+
+def _column_array(vals: list) -> np.ndarray:
+    # None (SQL NULL) becomes NaN.
+    return np.array(vals, dtype=np.float64).reshape(-1)
+
+
+def _select_rows(session: Session, stmt, seq_col, seqs: Optional[np.ndarray]) -> list:
+    if seqs is None:
+        return session.exec(stmt.order_by(seq_col)).all()
+    rows: list = []
+    values = np.unique(seqs).tolist()
+    for i in range(0, len(values), SEQ_CHUNK):
+        rows += session.exec(stmt.where(seq_col.in_(values[i : i + SEQ_CHUNK]))).all()
+    rows.sort(key=lambda r: r[0])
+    return rows
+
+
+def _blob_subset(cols: np.ndarray, n: int, seqs: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    # (seq, columns) for every sample or only `seqs` (seq is the blob position).
+    if seqs is None:
+        return np.arange(n, dtype=np.int64), cols
+    pos = np.unique(seqs).astype(np.int64)
+    pos = pos[pos < n]
+    return pos, cols[:, pos]
+
+
+def load_scan_columns(
+    session: Session, layer_id: str, seqs: Optional[np.ndarray] = None
+) -> StoredScanColumns:
+    """A layer's scan samples in seq order; with `seqs`, only those samples."""
+    blob = session.get(LayerColumns, (layer_id, "scan"))
+    if blob is not None:
+        seq, t = _blob_subset(_unpack(blob, len(SCAN_BLOB_FIELDS)), blob.n, seqs)
+        return StoredScanColumns(seq, *t)
+
+    stmt = select(
+        ScanData.seq,
+        ScanData.x,
+        ScanData.y,
+        ScanData.z,
+        ScanData.scan_raw,
+        ScanData.scan_value,
+        ScanData.speed,
+    ).where(ScanData.layer_id == layer_id)
+    rows = _select_rows(session, stmt, ScanData.seq, seqs)
+    cols = list(zip(*rows)) if rows else [[] for _ in StoredScanColumns._fields]
+    return StoredScanColumns(
+        np.array(cols[0], dtype=np.int64),
+        *(_column_array(c) for c in cols[1:]),
+    )
+
+
+def load_weld_columns(
+    session: Session, layer_id: str, seqs: Optional[np.ndarray] = None
+) -> WeldColumns:
+    """A layer's weld samples in seq order; with `seqs`, only those samples."""
+    blob = session.get(LayerColumns, (layer_id, "weld"))
+    if blob is not None:
+        seq, t = _blob_subset(_unpack(blob, len(WELD_BLOB_FIELDS)), blob.n, seqs)
+        return WeldColumns(seq=seq, **dict(zip(WELD_BLOB_FIELDS, t)))
+
+    stmt = select(
+        WeldData.seq,
+        WeldData.wire_feed_rate,
+        WeldData.robot_speed,
+        WeldData.current,
+        WeldData.voltage,
+        WeldData.x,
+        WeldData.y,
+        WeldData.z,
+    ).where(WeldData.layer_id == layer_id)
+    rows = _select_rows(session, stmt, WeldData.seq, seqs)
+    cols = list(zip(*rows)) if rows else [[] for _ in WeldColumns._fields]
+    return WeldColumns(
+        np.array(cols[0], dtype=np.int64),
+        *(_column_array(c) for c in cols[1:]),
+    )
+
+
+def _load_many(
+    session: Session, layer_ids: Sequence[str], kind: str, table, fields: Tuple[str, ...]
+) -> Dict[str, Tuple[np.ndarray, List[np.ndarray]]]:
+    """
+    Columns of `kind` for several layers with set-based queries: one for the
+    LayerColumns blobs and, for the row-stored rest, a per-layer row count
+    plus one ordered fetch of every row. The fetch goes through the driver
+    cursor (plain tuples, no Row objects) and is split by the counts.
+    Returns layer_id -> (seq, columns in `fields` order).
+    """
+    out: Dict[str, Tuple[np.ndarray, List[np.ndarray]]] = {}
+    blobs = session.exec(
+        select(LayerColumns)
+        .where(LayerColumns.layer_id.in_(layer_ids))  # type: ignore
+        .where(LayerColumns.kind == kind)
+    ).all()
+    for blob in blobs:
+        seq, cols = _blob_subset(_unpack(blob, len(fields)), blob.n, None)
+        out[blob.layer_id] = (seq, list(cols))
+
+    rest = sorted(i for i in set(layer_ids) if i not in out)
+    if not rest:
+        return out
+    counts = session.exec(
+        select(table.layer_id, func.count())
+        .where(table.layer_id.in_(rest))
+        .group_by(table.layer_id)
+        .order_by(table.layer_id)
+    ).all()
+    sql = (
+        f"SELECT seq, {', '.join(fields)} FROM {table.__tablename__} "
+        f"WHERE layer_id IN ({', '.join('?' * len(rest))}) ORDER BY layer_id, seq"
+    )
+    rows = session.connection().exec_driver_sql(sql, tuple(rest)).fetchall()
+    cols = list(zip(*rows)) if rows else [[] for _ in range(len(fields) + 1)]
+    seq = np.array(cols[0], dtype=np.int64)
+    values = [_column_array(c) for c in cols[1:]]
+    start = 0
+    for layer_id, n in counts:
+        out[layer_id] = (seq[start : start + n], [v[start : start + n] for v in values])
+        start += n
+    return out
+
+
+def load_scan_columns_many(
+    session: Session, layer_ids: Sequence[str]
+) -> Dict[str, StoredScanColumns]:
+    """`load_scan_columns` for several layers at once (layers without samples are empty)."""
+    found = _load_many(session, layer_ids, "scan", ScanData, SCAN_BLOB_FIELDS)
+    out: Dict[str, StoredScanColumns] = {}
+    for layer_id in layer_ids:
+        if layer_id in found:
+            seq, cols = found[layer_id]
+        else:
+            seq, cols = np.empty(0, dtype=np.int64), [np.empty(0)] * len(SCAN_BLOB_FIELDS)
+        out[layer_id] = StoredScanColumns(seq, *cols)
+    return out
+
+
+def load_weld_columns_many(
+    session: Session, layer_ids: Sequence[str]
+) -> Dict[str, WeldColumns]:
+    """`load_weld_columns` for several layers at once (layers without samples are empty)."""
+    found = _load_many(session, layer_ids, "weld", WeldData, WELD_BLOB_FIELDS)
+    out: Dict[str, WeldColumns] = {}
+    for layer_id in layer_ids:
+        if layer_id in found:
+            seq, cols = found[layer_id]
+        else:
+            seq, cols = np.empty(0, dtype=np.int64), [np.empty(0)] * len(WELD_BLOB_FIELDS)
+        out[layer_id] = WeldColumns(seq=seq, **dict(zip(WELD_BLOB_FIELDS, cols)))
+    return out
+
+
+def migrate_layer_to_columnar(
+    session: Session, layer: Layer, dtype: Optional[str] = None
+) -> bool:
+    """
+    Move one layer's ScanData/WeldData rows into LayerColumns blobs and
+    delete the rows. Returns False if the layer is already columnar.
+    """
+    if session.get(LayerColumns, (layer.id, "weld")) is not None:
+        return False
+    dt = _blob_dtype(dtype or SAMPLE_STORAGE_DTYPE)
+    scan = load_scan_columns(session, layer.id)
+    weld = load_weld_columns(session, layer.id)
+    for seq in (scan.seq, weld.seq):
+        if not np.array_equal(seq, np.arange(seq.shape[0])):
+            raise ValueError(f"non_contiguous_seq: layer {layer.id}")
+
+    _add_blobs(session, layer.id, scan, weld, dt)
+    session.exec(delete(ScanData).where(ScanData.layer_id == layer.id))  # type: ignore
+    session.exec(delete(WeldData).where(WeldData.layer_id == layer.id))  # type: ignore
+    return True
+
+
+def migrate_to_columnar(group_id: Optional[str] = None, dtype: Optional[str] = None) -> int:
+    """
+    Migrate every layer (or one group's layers) from rows to columnar blobs,
+    committing after each layer. Returns the number of layers migrated.
+    """
+    migrated = 0
+    with get_session() as session:
+        stmt = select(Layer).order_by(Layer.group_id, Layer.layer_number)  # type: ignore
+        if group_id is not None:
+            stmt = stmt.where(Layer.group_id == group_id)
+        for layer in session.exec(stmt).all():
+            if migrate_layer_to_columnar(session, layer, dtype=dtype):
+                session.commit()
+                migrated += 1
+                logger.info("Migrated layer %s to columnar storage", layer.id)
+    return migrated
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.storage",
+        description="Migrate ScanData/WeldData rows into packed per-layer columns.",
+    )
+    parser.add_argument("--group", help="only migrate this group id")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default=None)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to reclaim space")
+    args = parser.parse_args(argv)
+
+    from app.database.db import engine, init_db
+
+    init_db()
+    count = migrate_to_columnar(args.group, args.dtype)
+    print(f"migrated {count} layer(s)")
+    if args.vacuum:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# app/services/summaries.py
+"""
+Materialized weld summaries.
+
+Ingest writes one LayerSummary per layer (count/sum/min/max per metric) and
+then merges them into a GroupSummary, so /api/groups/{id}/data is served in
+O(layers) instead of re-reading every WeldData sample.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, delete, select
+
+from app.database.models import (
+    GroupSummary,
+    Layer,
+    LayerColumns,
+    LayerSummary,
+    WeldData,
+    WeldRollupBase,
+)
+from app.database.schemas import WeldDataSummary
+from app.services.storage import load_weld_columns
+from app.utils.parsers import WeldColumns
+
+# Summary metric name -> WeldColumns field.
+SUMMARY_METRICS: Dict[str, str] = {
+    "wire_feed_rate": "wire_feed_rate",
+    "travel_speed": "robot_speed",
+    "voltage": "voltage",
+    "current": "current",
+}
+
+
+def rollup_fields(weld: WeldColumns) -> Dict[str, Optional[float]]:
+    """count/sum/min/max per metric for one batch of samples (NaN = NULL)."""
+    out: Dict[str, Optional[float]] = {"n": int(weld.seq.shape[0])}
+    for metric, column in SUMMARY_METRICS.items():
+        vals = getattr(weld, column)
+        clean = vals[~np.isnan(vals)]
+        out[f"{metric}_count"] = int(clean.size)
+        out[f"{metric}_sum"] = float(clean.sum()) if clean.size else None
+        out[f"{metric}_min"] = float(clean.min()) if clean.size else None
+        out[f"{metric}_max"] = float(clean.max()) if clean.size else None
+    return out
+
+
+def merge_rollups(rollups: Iterable[WeldRollupBase]) -> Dict[str, Optional[float]]:
+    out: Dict[str, Optional[float]] = {"n": 0}
+    for metric in SUMMARY_METRICS:
+        out[f"{metric}_count"] = 0
+        out[f"{metric}_sum"] = None
+        out[f"{metric}_min"] = None
+        out[f"{metric}_max"] = None
+    for r in rollups:
+        out["n"] += r.n
+        for metric in SUMMARY_METRICS:
+            count = getattr(r, f"{metric}_count")
+            if not count:
+                continue
+            out[f"{metric}_count"] += count
+            total = getattr(r, f"{metric}_sum")
+            lo = getattr(r, f"{metric}_min")
+            hi = getattr(r, f"{metric}_max")
+            if out[f"{metric}_sum"] is None:
+                out[f"{metric}_sum"] = total
+                out[f"{metric}_min"] = lo
+                out[f"{metric}_max"] = hi
+            else:
+                out[f"{metric}_sum"] += total
+                out[f"{metric}_min"] = min(out[f"{metric}_min"], lo)
+                out[f"{metric}_max"] = max(out[f"{metric}_max"], hi)
+    return out
+
+
+def _sql_layer_rollups(
+    session: Session, layer_ids: Sequence[str]
+) -> Dict[str, Dict[str, Optional[float]]]:
+    # One GROUP BY over the WeldData rows of `layer_ids`; NULL is skipped by
+    # COUNT/SUM/MIN/MAX exactly like NaN in `rollup_fields`.
+    aggregates = [func.count()]
+    for column in SUMMARY_METRICS.values():
+        col = getattr(WeldData, column)
+        aggregates += [func.count(col), func.sum(col), func.min(col), func.max(col)]
+    rows = session.exec(
+        select(WeldData.layer_id, *aggregates)
+        .where(WeldData.layer_id.in_(layer_ids))  # type: ignore
+        .group_by(WeldData.layer_id)
+    ).all()
+    out: Dict[str, Dict[str, Optional[float]]] = {}
+    for layer_id, n, *values in rows:
+        fields: Dict[str, Optional[float]] = {"n": n}
+        for i, metric in enumerate(SUMMARY_METRICS):
+            count, total, lo, hi = values[4 * i : 4 * i + 4]
+            fields[f"{metric}_count"] = count
+            fields[f"{metric}_sum"] = float(total) if count else None
+            fields[f"{metric}_min"] = float(lo) if count else None
+            fields[f"{metric}_max"] = float(hi) if count else None
+        out[layer_id] = fields
+    return out
+
+
+def stream_layer_rollups(
+    session: Session, group_id: str, layers: Sequence[Layer]
+) -> Iterator[Tuple[Layer, Dict[str, Optional[float]]]]:
+    """
+    `rollup_fields` of each of `layers` (any subset of group `group_id`)
+    computed from the stored samples in bounded memory: row-stored layers
+    are aggregated by SQLite in one GROUP BY statement, columnar layers are
+    loaded one blob at a time.
+    """
+    ids = [layer.id for layer in layers]
+    columnar = set(
+        session.exec(
+            select(LayerColumns.layer_id)
+            .where(LayerColumns.layer_id.in_(ids))  # type: ignore
+            .where(LayerColumns.kind == "weld")
+        ).all()
+    )
+    row_ids = [layer_id for layer_id in ids if layer_id not in columnar]
+    from_rows = _sql_layer_rollups(session, row_ids) if row_ids else {}
+    for layer in layers:
+        if layer.id in columnar:
+            yield layer, rollup_fields(load_weld_columns(session, layer.id))
+        else:
+            yield layer, from_rows.get(layer.id) or merge_rollups([])
+
+
+def rollup_to_summary(r: WeldRollupBase) -> WeldDataSummary:
+    fields: Dict[str, Optional[float]] = {}
+    for metric in SUMMARY_METRICS:
+        count = getattr(r, f"{metric}_count")
+        total = getattr(r, f"{metric}_sum")
+        fields[f"{metric}_avg"] = total / count if count else None
+        fields[f"{metric}_min"] = getattr(r, f"{metric}_min")
+        fields[f"{metric}_max"] = getattr(r, f"{metric}_max")
+    return WeldDataSummary(n=r.n, **fields)
+
+
+def write_layer_summary(session: Session, layer: Layer, weld: WeldColumns) -> LayerSummary:
+    """Add the LayerSummary for a freshly written layer (no commit)."""
+    row = LayerSummary(
+        layer_id=layer.id,
+        group_id=layer.group_id,
+        layer_number=layer.layer_number,
+        **rollup_fields(weld),
+    )
+    session.add(row)
+    return row
+
+
+def rebuild_group_summary(session: Session, group_id: str) -> GroupSummary:
+    """
+    Replace the GroupSummary by merging the group's LayerSummary rows
+    (no commit). Call whenever the group's layers change.
+    """
+    layer_rows = session.exec(
+        select(LayerSummary).where(LayerSummary.group_id == group_id)
+    ).all()
+    session.exec(delete(GroupSummary).where(GroupSummary.group_id == group_id))  # type: ignore
+    row = GroupSummary(
+        group_id=group_id,
+        layer_count=len(layer_rows),
+        **merge_rollups(layer_rows),
+    )
+    session.add(row)
+    return row
+
+
+def append_group_summary(
+    session: Session, group_id: str, new_rows: List[LayerSummary]
+) -> GroupSummary:
+    """
+    Fold the LayerSummary rows of newly appended layers into the existing
+    GroupSummary (no commit), without reading the other layers' rollups.
+    Falls back to a full rebuild if the group has no GroupSummary yet.
+    """
+    row = session.get(GroupSummary, group_id)
+    if row is None:
+        return rebuild_group_summary(session, group_id)
+    for name, value in merge_rollups([row, *new_rows]).items():
+        setattr(row, name, value)
+    row.layer_count += len(new_rows)
+    session.add(row)
+    return row
+
+
+def invalidate_group_summaries(session: Session, group_id: str) -> None:
+    """Drop every rollup of a group (no commit)."""
+    session.exec(delete(GroupSummary).where(GroupSummary.group_id == group_id))  # type: ignore
+    session.exec(delete(LayerSummary).where(LayerSummary.group_id == group_id))  # type: ignore
+
+
+def build_group_summaries(session: Session, group_id: str) -> Optional[GroupSummary]:
+    """
+    Backfill rollups for a group ingested before they existed: summarize any
+    layer without a LayerSummary (see `stream_layer_rollups`), then merge.
+    Commits. Returns None if another request built them concurrently.
+    """
+    have = set(
+        session.exec(
+            select(LayerSummary.layer_id).where(LayerSummary.group_id == group_id)
+        ).all()
+    )
+    layers: List[Layer] = session.exec(
+        select(Layer).where(Layer.group_id == group_id)
+    ).all()
+    missing = [layer for layer in layers if layer.id not in have]
+    if missing:
+        for layer, fields in stream_layer_rollups(session, group_id, missing):
+            session.add(
+                LayerSummary(
+                    layer_id=layer.id,
+                    group_id=layer.group_id,
+                    layer_number=layer.layer_number,
+                    **fields,
+                )
+            )
+    row = rebuild_group_summary(session, group_id)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return None
+    return row
@@ -0,0 +1,134 @@
+# app/services/voxels.py
+"""
+Voxel-grid downsampling of a whole group for the 3D view.
+
+Every stored scan and weld sample is binned into cubic voxels of
+`voxel_size`; each non-empty voxel becomes one point at the centroid of its
+samples, carrying the sample count and the mean weld metrics and scan_value
+(NaN where the voxel has none). Binning is vectorized per layer (one layer's
+columns in memory at a time) and the per-layer partial sums are merged with
+one more bincount pass at the end.
+"""
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from sqlmodel import select
+
+from app.database.db import get_session
+from app.database.models import Layer, WeldGroup
+from app.services.storage import load_scan_columns, load_weld_columns
+from app.services.summaries import SUMMARY_METRICS
+from app.utils.binary_format import encode_columns
+from app.utils.json_format import encode_array, encode_object
+
+# Voxel indices are packed into one int64 key, 21 bits per axis.
+_AXIS_BITS = 21
+_AXIS_OFFSET = 1 << (_AXIS_BITS - 1)
+_AXIS_MASK = (1 << _AXIS_BITS) - 1
+
+# Weld metrics averaged per voxel, plus scan_value.
+VOXEL_METRICS: Tuple[str, ...] = (*SUMMARY_METRICS, "scan_value")
+VOXEL_COLUMNS: Tuple[str, ...] = ("x", "y", "z", "n", *VOXEL_METRICS)
+
+
+class VoxelCloud(NamedTuple):
+    voxel_size: float
+    columns: Dict[str, np.ndarray]  # VOXEL_COLUMNS -> float64 arrays, one entry per voxel
+
+
+def _voxel_keys(x: np.ndarray, y: np.ndarray, z: np.ndarray, size: float) -> np.ndarray:
+    key = np.zeros(x.shape[0], dtype=np.int64)
+    for axis in (x, y, z):
+        idx = np.floor(axis / size).astype(np.int64) + _AXIS_OFFSET
+        if idx.size and (idx.min() < 0 or idx.max() > _AXIS_MASK):
+            raise ValueError("voxel_size_too_small")
+        key = (key << _AXIS_BITS) | idx
+    return key
+
+
+def _partial(keys: np.ndarray, values: Dict[str, np.ndarray]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Per-voxel sums of `values` ("<name>_sum") and counts of non-NaN values
+    ("<name>_count"), keyed by the unique `keys`.
+    """
+    uniq, inv = np.unique(keys, return_inverse=True)
+    out: Dict[str, np.ndarray] = {}
+    for name, vals in values.items():
+        ok = ~np.isnan(vals)
+        out[f"{name}_sum"] = np.bincount(inv[ok], weights=vals[ok], minlength=uniq.size)
+        out[f"{name}_count"] = np.bincount(inv[ok], minlength=uniq.size).astype(np.float64)
+    return uniq, out
+
+
+def _merge(parts: List[Tuple[np.ndarray, Dict[str, np.ndarray]]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    if not parts:
+        return np.empty(0, dtype=np.int64), {}
+    keys = np.concatenate([k for k, _ in parts])
+    uniq, inv = np.unique(keys, return_inverse=True)
+    names = parts[0][1].keys()
+    return uniq, {
+        name: np.bincount(inv, weights=np.concatenate([p[name] for _, p in parts]), minlength=uniq.size)
+        for name in names
+    }
+
+
+def _layer_partial(weld, scan, size: float) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    nan_w = np.full(weld.seq.shape[0], np.nan)
+    nan_s = np.full(scan.seq.shape[0], np.nan)
+    values = {
+        axis: np.concatenate((getattr(weld, axis), getattr(scan, axis))) for axis in ("x", "y", "z")
+    }
+    for metric, column in SUMMARY_METRICS.items():
+        values[metric] = np.concatenate((getattr(weld, column), nan_s))
+    values["scan_value"] = np.concatenate((nan_w, scan.scan_value))
+    # Samples without a finite position belong to no voxel; drop them before
+    # keying, or NaN would land outside the key range.
+    finite = np.isfinite(values["x"]) & np.isfinite(values["y"]) & np.isfinite(values["z"])
+    values = {k: v[finite] for k, v in values.items()}
+    return _partial(_voxel_keys(values["x"], values["y"], values["z"], size), values)
+
+
+def compute_group_voxels(group_id: str, voxel_size: float) -> VoxelCloud:
+    """Voxel-downsampled point cloud of every sample in a group."""
+    with get_session() as session:
+        if not session.get(WeldGroup, group_id):
+            raise ValueError("group_not_found")
+        layer_ids = session.exec(
+            select(Layer.id).where(Layer.group_id == group_id).order_by(Layer.layer_number)  # type: ignore
+        ).all()
+        parts = []
+        for layer_id in layer_ids:
+            weld = load_weld_columns(session, layer_id)
+            scan = load_scan_columns(session, layer_id)
+            parts.append(_layer_partial(weld, scan, voxel_size))
+
+    keys, sums = _merge(parts)
+    columns: Dict[str, np.ndarray] = {}
+    if keys.size == 0:
+        return VoxelCloud(voxel_size, {c: np.empty(0) for c in VOXEL_COLUMNS})
+    n = sums["x_count"]
+    for axis in ("x", "y", "z"):
+        columns[axis] = sums[f"{axis}_sum"] / n
+    columns["n"] = n
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for metric in VOXEL_METRICS:
+            count = sums[f"{metric}_count"]
+            columns[metric] = np.where(count > 0, sums[f"{metric}_sum"] / count, np.nan)
+    return VoxelCloud(voxel_size, {c: columns[c] for c in VOXEL_COLUMNS})
+
+
+def voxels_json(group_id: str, cloud: VoxelCloud) -> bytes:
+    """VoxelCloudOut JSON: one array per column (struct of arrays)."""
+    return encode_object(
+        {"group_id": group_id, "voxel_size": cloud.voxel_size, "count": int(cloud.columns["n"].size)},
+        {
+            name: encode_array(vals, "int" if name == "n" else "float?" if name in VOXEL_METRICS else "float")
+            for name, vals in cloud.columns.items()
+        },
+    ).encode("utf-8")
+
+
+def voxels_binary(group_id: str, cloud: VoxelCloud) -> bytes:
+    """The same cloud as an SSAL payload with a single "voxels" table."""
+    meta = {"group_id": group_id, "voxel_size": cloud.voxel_size, "count": int(cloud.columns["n"].size)}
+    return encode_columns(meta, {"voxels": cloud.columns})
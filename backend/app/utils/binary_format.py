@@ -0,0 +1,107 @@
+"""
+Packed binary columnar encoding for layer point data ("SSAL" v1).
+
+Layout (all integers little-endian):
+
+    0   4 bytes  magic b"SSAL"
+    4   uint16   format version (1)
+    6   uint16   reserved (0)
+    8   uint32   header length H in bytes
+    12  H bytes  UTF-8 JSON header
+    ...          zero padding to an 8-byte boundary, then each column buffer,
+                 each starting on an 8-byte boundary
+
+The JSON header carries the non-point fields (layer_id, group_id,
+layer_number, summary, ...) plus a `columns` list of
+{"table", "name", "dtype", "offset", "length"} entries; `offset` is absolute
+from the start of the payload and `length` is the element count. `seq` is
+"<u4" and every other column "<f4" with NaN standing in for null, so each
+column maps directly onto a JavaScript Uint32Array/Float32Array.
+"""
+import json
+import struct
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+MEDIA_TYPE = "application/vnd.ssa.layer+octet-stream"
+MAGIC = b"SSAL"
+VERSION = 1
+_PREFIX = struct.Struct("<4sHHI")
+_ALIGN = 8
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+def _column_dtype(name: str) -> np.dtype:
+    return np.dtype("<u4") if name == "seq" else np.dtype("<f4")
+
+
+def encode_columns(meta: Dict[str, Any], tables: Dict[str, Dict[str, np.ndarray]]) -> bytes:
+    """Encode `meta` plus named column tables into one SSAL payload."""
+    buffers = []
+    columns = []
+    for table, cols in tables.items():
+        for name, values in cols.items():
+            dt = _column_dtype(name)
+            buf = np.ascontiguousarray(values, dtype=dt).tobytes()
+            columns.append(
+                {"table": table, "name": name, "dtype": dt.str, "length": int(len(values))}
+            )
+            buffers.append(buf)
+
+    # Offsets depend on the header size, which depends on the offsets'
+    # digits; settle it by iterating until the header length is stable.
+    header_len = 0
+    while True:
+        offset = _PREFIX.size + header_len
+        offset += _pad(offset)
+        for col, buf in zip(columns, buffers):
+            col["offset"] = offset
+            offset += len(buf) + _pad(len(buf))
+        header = json.dumps({**meta, "columns": columns}, separators=(",", ":")).encode()
+        if len(header) == header_len:
+            break
+        header_len = len(header)
+
+    out = bytearray(_PREFIX.pack(MAGIC, VERSION, 0, header_len))
+    out += header
+    out += b"\0" * _pad(len(out))
+    for buf in buffers:
+        out += buf
+        out += b"\0" * _pad(len(buf))
+    return bytes(out)
+
+
+def decode_columns(payload: bytes) -> Tuple[Dict[str, Any], Dict[str, Dict[str, np.ndarray]]]:
+    """
+    Inverse of `encode_columns`; column arrays are views over `payload`.
+    Raises ValueError for anything that is not a complete SSAL v1 payload.
+    """
+    if len(payload) < _PREFIX.size:
+        raise ValueError("truncated SSAL payload")
+    magic, version, _, header_len = _PREFIX.unpack_from(payload, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not an SSAL v1 payload")
+    if _PREFIX.size + header_len > len(payload):
+        raise ValueError("truncated SSAL payload")
+    try:
+        meta = json.loads(payload[_PREFIX.size : _PREFIX.size + header_len])
+        columns = meta.pop("columns")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("corrupt SSAL header")
+    tables: Dict[str, Dict[str, np.ndarray]] = {}
+    for col in columns:
+        try:
+            dt = np.dtype(col["dtype"])
+            start, length = int(col["offset"]), int(col["length"])
+            table, name = col["table"], col["name"]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("corrupt SSAL header")
+        if start < 0 or length < 0 or start + length * dt.itemsize > len(payload):
+            raise ValueError("truncated SSAL payload")
+        arr = np.frombuffer(payload, dtype=dt, count=length, offset=start)
+        tables.setdefault(table, {})[name] = arr
+    return meta, tables
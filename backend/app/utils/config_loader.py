@@ -1,9 +1,11 @@
 from pathlib import Path
+import hashlib
 import json
 from typing import Any, Dict, Optional, Union
 
 CONFIG: Dict[str, Any] = {}
 _CONFIG_DIR: Optional[Path] = None
+_FINGERPRINT: str = ""
 
 
 def _deep_merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
@@ -31,17 +33,29 @@ def _load_dir(directory: Path) -> Dict[str, Any]:
     return out
 
 
+def _set(data: Dict[str, Any]) -> None:
+    global _FINGERPRINT
+    CONFIG.clear()
+    CONFIG.update(data)
+    _FINGERPRINT = hashlib.sha1(
+        json.dumps(CONFIG, sort_keys=True, default=str).encode()
+    ).hexdigest()[:12]
+
+
 def init_load(directory: Union[str, Path]) -> Dict[str, Any]:
     global _CONFIG_DIR
     _CONFIG_DIR = Path(directory).expanduser().resolve()
-    CONFIG.clear()
-    CONFIG.update(_load_dir(_CONFIG_DIR))
+    _set(_load_dir(_CONFIG_DIR))
     return CONFIG
 
 
 def reload() -> Dict[str, Any]:
     if _CONFIG_DIR is None:
         raise RuntimeError("Call init_load(directory) first")
-    CONFIG.clear()
-    CONFIG.update(_load_dir(_CONFIG_DIR))
-    return CONFIG
\ No newline at end of file
+    _set(_load_dir(_CONFIG_DIR))
+    return CONFIG
+
+
+def fingerprint() -> str:
+    """Short hash of the loaded config; changes whenever a value changes."""
+    return _FINGERPRINT
\ No newline at end of file
@@ -0,0 +1,113 @@
+from typing import List
+
+import numpy as np
+
+
+def _bucket_starts(start: int, stop: int, buckets: int) -> np.ndarray:
+    # `buckets` non-empty, contiguous [start, stop) segments (requires
+    # stop - start >= buckets).
+    return np.linspace(start, stop, buckets + 1)[:-1].astype(np.intp)
+
+
+def _segment_arg(
+    vals: np.ndarray, starts: np.ndarray, reducer: np.ufunc
+) -> np.ndarray:
+    """
+    Index of the first element equal to `reducer.reduceat(vals, starts)` in
+    each segment. Segments with no match (all NaN) fall back to their start.
+    """
+    ext = reducer.reduceat(vals, starts)
+    lengths = np.diff(np.append(starts, vals.shape[0]))
+    bucket = np.repeat(np.arange(starts.shape[0]), lengths)
+    hit = np.flatnonzero(vals == ext[bucket])
+    out = starts.copy()
+    found, first = np.unique(bucket[hit], return_index=True)
+    out[found] = hit[first]
+    return out
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets selection of at most `n_out` indices.
+
+    Vectorized variant: the triangle for a bucket is anchored on the mean of
+    the previous bucket instead of the previously selected point, which
+    removes the sequential dependency so every bucket is scored in one numpy
+    pass. First and last points are always kept.
+    """
+    n = x.shape[0]
+    if n <= n_out or n_out < 3:
+        return np.arange(n) if n <= n_out else np.array([0, n - 1])
+
+    x = x.astype(np.float64, copy=False)
+    y = np.nan_to_num(y.astype(np.float64, copy=False))
+    buckets = n_out - 2
+    starts = _bucket_starts(1, n - 1, buckets)
+    lengths = np.diff(np.append(starts, n - 1))
+
+    mid_x = x[1 : n - 1]
+    mid_y = y[1 : n - 1]
+    rel = starts - 1
+    mean_x = np.add.reduceat(mid_x, rel) / lengths
+    mean_y = np.add.reduceat(mid_y, rel) / lengths
+
+    # Anchors per bucket: previous bucket mean (A) and next bucket mean (C).
+    ax = np.concatenate(([x[0]], mean_x[:-1]))
+    ay = np.concatenate(([y[0]], mean_y[:-1]))
+    cx = np.concatenate((mean_x[1:], [x[-1]]))
+    cy = np.concatenate((mean_y[1:], [y[-1]]))
+
+    bucket = np.repeat(np.arange(buckets), lengths)
+    area = np.abs(
+        (ax[bucket] - cx[bucket]) * (mid_y - ay[bucket])
+        - (ax[bucket] - mid_x) * (cy[bucket] - ay[bucket])
+    )
+    picked = _segment_arg(area, rel, np.maximum) + 1
+    return np.concatenate(([0], picked, [n - 1]))
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Keep the min and max of each of `n_out // 2` equal-width buckets (plus the
+    end points), which preserves the envelope of a dense profile.
+    """
+    n = y.shape[0]
+    if n <= n_out:
+        return np.arange(n)
+    y = y.astype(np.float64, copy=False)
+    starts = _bucket_starts(0, n, max(1, n_out // 2 - 1))
+    lo = _segment_arg(y, starts, np.fmin)
+    hi = _segment_arg(y, starts, np.fmax)
+    return np.unique(np.concatenate(([0], lo, hi, [n - 1])))
+
+
+def lttb_union_indices(
+    x: np.ndarray, series: List[np.ndarray], n_out: int
+) -> np.ndarray:
+    """
+    LTTB over several series sharing the same x: each series gets an equal
+    share of `n_out` and the selections are merged, so every metric keeps
+    its own peaks while the total stays within `n_out`. The first and last
+    samples and the global min/max of each series are always included.
+    """
+    n = x.shape[0]
+    if n <= n_out:
+        return np.arange(n)
+    k = max(1, len(series))
+    # Each series adds at most `share` indices besides the shared end
+    # points: share - 2 from LTTB plus its min and max, so the union holds
+    # at most 2 + k * share <= n_out.
+    share = max(0, (n_out - 2) // k)
+    picked = [np.array([0, n - 1])]
+    picked += [lttb_indices(x, y, share) for y in series]
+    for y in series:
+        if not np.isnan(y).all():
+            picked.append(np.array([np.nanargmin(y), np.nanargmax(y)]))
+    idx = np.unique(np.concatenate(picked))
+    if idx.size > n_out:
+        # Fewer than two indices per series besides the end points: thin
+        # the rest evenly and keep the ends.
+        inner = idx[1:-1]
+        keep = np.linspace(0, inner.size - 1, max(0, n_out - 2)).round().astype(np.int64)
+        idx = np.concatenate(([0], inner[keep], [n - 1]))
+    return idx
@@ -0,0 +1,135 @@
+"""
+Fixed-radius nearest-neighbour search with uniform grid hashes.
+
+Reference points are bucketed into cubic cells of edge h and sorted by cell
+key (O(n log n)). Every point within h of a query lies in the query's cell or
+one of its 26 neighbours, so those 27 cells are looked up with
+`searchsorted` on the sorted keys of the occupied cells. A query whose nearest candidate is within
+h is therefore resolved exactly.
+
+The search runs over a cascade of cell sizes, from tol / 16 up to tol.
+Dense data such as a weld path, with many samples per millimetre, resolves
+almost every query in the fine grids, with a handful of candidates each.
+Only the queries still unresolved move on to the coarser grids, and the
+last grid (h = tol) settles the rest. Every step works on whole arrays.
+Queries are processed in chunks so the candidate lists stay bounded in
+memory.
+"""
+from typing import Tuple
+
+import numpy as np
+
+# Query points per chunk.
+CHUNK = 65536
+# Cell sizes as fractions of the tolerance, finest first; the last must be 1.
+CASCADE = (1 / 16, 1 / 4, 1.0)
+# Largest cell count a grid may span; cell keys are int64.
+MAX_CELLS = 2**60
+
+_OFFSETS = np.array(
+    [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)],
+    dtype=np.int64,
+)
+
+
+class _Grid:
+    def __init__(self, pts: np.ndarray, origin: np.ndarray, hi: np.ndarray, h: float):
+        self.origin = origin
+        self.h = h
+        # +1 margin on each side so neighbour offsets never alias another cell.
+        self.dims = np.floor((hi - origin) / h).astype(np.int64) + 3
+        keys = self.key(self.cells(pts))
+        self.order = np.argsort(keys, kind="stable")
+        self.pts = pts[self.order]
+        # Occupied cells: key, first sorted position, point count.
+        self.cell_keys, self.cell_start, self.cell_count = np.unique(
+            keys[self.order], return_index=True, return_counts=True
+        )
+        d = self.dims
+        # Keys are linear in the cell coordinates, so an offset is a constant.
+        self.deltas = (_OFFSETS[:, 0] * d[1] + _OFFSETS[:, 1]) * d[2] + _OFFSETS[:, 2]
+
+    def cells(self, p: np.ndarray) -> np.ndarray:
+        return np.floor((p - self.origin) / self.h).astype(np.int64)
+
+    def key(self, c: np.ndarray) -> np.ndarray:
+        d = self.dims
+        return ((c[:, 0] + 1) * d[1] + (c[:, 1] + 1)) * d[2] + (c[:, 2] + 1)
+
+    def nearest(self, q: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Squared distance (inf if none) and sorted position of the nearest candidate."""
+        base = self.key(self.cells(q))
+        # Sorted needles keep every searchsorted cache-friendly.
+        qo = np.argsort(base, kind="stable")
+        base = base[qo]
+        q = q[qo]
+        best_d2 = np.full(q.shape[0], np.inf)
+        best_pos = np.full(q.shape[0], -1, dtype=np.int64)
+        n_cells = self.cell_keys.size
+        for delta in self.deltas.tolist():
+            k = base + delta
+            i = np.minimum(np.searchsorted(self.cell_keys, k), n_cells - 1)
+            has = np.flatnonzero(self.cell_keys[i] == k)
+            if has.size == 0:
+                continue
+            c = self.cell_count[i[has]]
+            # Candidates grouped by query, groups contiguous.
+            group_start = np.cumsum(c) - c
+            total = int(c.sum())
+            pos = np.arange(total) - np.repeat(group_start, c) + np.repeat(self.cell_start[i[has]], c)
+            d2 = ((self.pts[pos] - np.repeat(q[has], c, axis=0)) ** 2).sum(axis=1)
+            m = np.minimum.reduceat(d2, group_start)
+            # First candidate of each group equal to its minimum.
+            at = np.flatnonzero(d2 == np.repeat(m, c))
+            owner = np.repeat(np.arange(has.size), c)[at]
+            first = at[np.r_[True, owner[1:] != owner[:-1]]]
+            better = m < best_d2[has]
+            best_d2[has[better]] = m[better]
+            best_pos[has[better]] = pos[first][better]
+        out_d2 = np.empty_like(best_d2)
+        out_pos = np.empty_like(best_pos)
+        out_d2[qo] = best_d2
+        out_pos[qo] = best_pos
+        return out_d2, out_pos
+
+
+def nearest_within(
+    ref: np.ndarray, query: np.ndarray, tol: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For each row of `query` (m x 3), the index into `ref` (n x 3) of the
+    nearest reference point at distance <= `tol`, and that distance. Index
+    -1 and distance NaN where there is none. Rows with NaN are never matched.
+    """
+    m = query.shape[0]
+    best = np.full(m, -1, dtype=np.int64)
+    dist = np.full(m, np.nan)
+    ref_ok = ~np.isnan(ref).any(axis=1)
+    q_ok = ~np.isnan(query).any(axis=1)
+    if m == 0 or not ref_ok.any() or not q_ok.any() or not tol > 0:
+        return best, dist
+
+    ref_idx = np.flatnonzero(ref_ok)
+    pts = ref[ref_idx]
+    origin = np.minimum(pts.min(axis=0), query[q_ok].min(axis=0))
+    hi = np.maximum(pts.max(axis=0), query[q_ok].max(axis=0))
+    # Fine grids that would overflow the cell keys are skipped; the last one
+    # (h = tol) is required.
+    spans = [np.prod((hi - origin) / (tol * f) + 3) for f in CASCADE]
+    if spans[-1] > MAX_CELLS:
+        raise ValueError("tolerance_too_small")
+    grids = [_Grid(pts, origin, hi, tol * f) for f, span in zip(CASCADE, spans) if span <= MAX_CELLS]
+
+    q_idx = np.flatnonzero(q_ok)
+    for start in range(0, q_idx.size, CHUNK):
+        open_ = q_idx[start : start + CHUNK]
+        for grid in grids:
+            if open_.size == 0:
+                break
+            d2, pos = grid.nearest(query[open_])
+            # Exact once the nearest candidate is within this grid's cell size.
+            done = d2 <= min(grid.h, tol) ** 2
+            best[open_[done]] = ref_idx[grid.order[pos[done]]]
+            dist[open_[done]] = np.sqrt(d2[done])
+            open_ = open_[~done]
+    return best, dist
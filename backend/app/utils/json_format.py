@@ -0,0 +1,94 @@
+"""
+Direct JSON encoding of columnar point data.
+
+Produces the same bytes as building one Pydantic model per point and
+rendering it through FastAPI's JSONResponse (stdlib `json`, compact
+separators, `ensure_ascii=False`, `allow_nan=False`), without creating the
+per-point models or dicts: each column is formatted to strings once and the
+rows are stitched together with a per-table `%`-template.
+"""
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_OUT_OF_RANGE = "Out of range float values are not JSON compliant"
+
+
+def dumps(obj: Any) -> str:
+    """json.dumps with the settings starlette's JSONResponse renders with."""
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+
+
+def _int_strings(vals: np.ndarray) -> List[str]:
+    return list(map(str, vals.tolist()))
+
+
+def _float_strings(vals: np.ndarray, nullable: bool) -> List[str]:
+    # NaN is NULL in nullable columns; any other non-finite value is an
+    # error, exactly as with allow_nan=False.
+    vals = np.asarray(vals, dtype=np.float64)
+    nan = np.isnan(vals)
+    bad = ~np.isfinite(vals)
+    if nullable:
+        bad &= ~nan
+    if bad.any():
+        raise ValueError(_OUT_OF_RANGE)
+    out = list(map(float.__repr__, vals.tolist()))
+    if nullable and nan.any():
+        for i in np.flatnonzero(nan).tolist():
+            out[i] = "null"
+    return out
+
+
+def _column_strings(vals: np.ndarray, kind: str) -> List[str]:
+    if kind == "int":
+        return _int_strings(np.asarray(vals).astype(np.int64, copy=False))
+    return _float_strings(vals, nullable=kind == "float?")
+
+
+def encode_array(vals: np.ndarray, kind: str) -> str:
+    """One column as a JSON array; `kind` as in `encode_rows`."""
+    return "[" + ",".join(_column_strings(vals, kind)) + "]"
+
+
+def encode_rows(
+    constants: Dict[str, Any],
+    columns: Sequence[Tuple[str, np.ndarray, str]],
+) -> str:
+    """
+    JSON array of objects. Each object starts with the `constants` fields
+    (same value in every row) followed by one field per column. Column kinds
+    are "int", "float" or "float?" (nullable: NaN becomes null).
+    """
+    if not columns:
+        return "[]"
+    n = columns[0][1].shape[0]
+    if n == 0:
+        return "[]"
+
+    head = ",".join(f"{dumps(k)}:{dumps(v)}" for k, v in constants.items())
+    parts = [head.replace("%", "%%")] if head else []
+    strings = []
+    for name, vals, kind in columns:
+        parts.append(dumps(name).replace("%", "%%") + ":%s")
+        strings.append(_column_strings(vals, kind))
+    template = "{" + ",".join(parts) + "}"
+    return "[" + ",".join([template % row for row in zip(*strings)]) + "]"
+
+
+def concat_arrays(arrays: Sequence[str]) -> str:
+    """Join already-encoded JSON arrays into one array."""
+    items = [a[1:-1] for a in arrays if a != "[]"]
+    return "[" + ",".join(items) + "]"
+
+
+def encode_object(fields: Dict[str, Any], raw: Dict[str, str]) -> str:
+    """
+    JSON object from plain `fields` plus `raw` fields whose values are
+    already-encoded JSON text; keys keep their insertion order with `fields`
+    first, then `raw`.
+    """
+    parts = [f"{dumps(k)}:{dumps(v)}" for k, v in fields.items()]
+    parts += [f"{dumps(k)}:{v}" for k, v in raw.items()]
+    return "{" + ",".join(parts) + "}"
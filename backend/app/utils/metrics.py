@@ -0,0 +1,242 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+A small, dependency-free registry of counters and fixed-bucket histograms.
+Recording is a dict lookup plus a bisect under a lock, so it is cheap enough
+to leave on. Values are per process: ingest job workers hand their stats back
+to the API process, which records them (see app/services/ingest_jobs.py).
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0,
+)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for labels, v in items:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_num(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, doc: str, buckets: Sequence[float], labels: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [per-bucket counts..., +Inf count], sum.
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[i] += 1
+            self._sums[labels] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(labels, ()))
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v), self._sums[k]) for k, v in self._counts.items())
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = 'le="' + _num(float(bound)) + '"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn: Callable[[], Iterable[str]]) -> None:
+        """`fn` returns extra exposition lines (e.g. gauges read at scrape time)."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            lines.extend(fn())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(
+    Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+)
+HTTP_LATENCY = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time from request start to the last response byte.",
+        LATENCY_BUCKETS,
+        ("method", "route"),
+    )
+)
+HTTP_RESPONSE_SIZE = REGISTRY.register(
+    Histogram(
+        "http_response_size_bytes", "Response body size.", SIZE_BUCKETS, ("method", "route")
+    )
+)
+DB_QUERY_LATENCY = REGISTRY.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "SQL statement execution time (cursor execute only, not fetch).",
+        QUERY_BUCKETS,
+        ("operation",),
+    )
+)
+DB_QUERY_ROWS = REGISTRY.register(
+    Counter(
+        "db_query_rows_total",
+        "Rows affected by INSERT/UPDATE/DELETE (SQLite reports no count for SELECT).",
+        ("operation",),
+    )
+)
+INGEST_LAYERS = REGISTRY.register(Counter("ingest_layers_total", "Layers ingested."))
+INGEST_FILES = REGISTRY.register(Counter("ingest_files_total", "Layer files parsed."))
+INGEST_ROWS = REGISTRY.register(Counter("ingest_rows_total", "Sample rows written."))
+INGEST_BYTES = REGISTRY.register(
+    Counter("ingest_bytes_total", "Uncompressed bytes of the parsed layer files.")
+)
+INGEST_PHASE_SECONDS = REGISTRY.register(
+    Counter(
+        "ingest_phase_seconds_total",
+        "Time spent per ingest phase (parse, transform, insert).",
+        ("phase",),
+    )
+)
+
+INGEST_PHASES = ("parse", "transform", "insert")
+
+
+def record_ingest(stats: dict) -> None:
+    """Add one ingest's `stats` (see app/services/ingest.py) to the counters."""
+    INGEST_LAYERS.inc(stats.get("layers", 0))
+    INGEST_FILES.inc(stats.get("files", 0))
+    INGEST_ROWS.inc(stats.get("rows", 0))
+    INGEST_BYTES.inc(stats.get("bytes", 0))
+    for phase in INGEST_PHASES:
+        INGEST_PHASE_SECONDS.inc(stats.get(f"{phase}_seconds", 0.0), phase)
+
+
+def statement_operation(statement: str) -> str:
+    head = statement.lstrip()[:8].split(None, 1)
+    op = head[0].upper() if head else ""
+    return op if op in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency, status and response
+    size. The route label is the matched path template, so ids do not blow
+    up cardinality; unmatched paths are grouped as "<unmatched>".
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(1, method, path, str(status))
+            HTTP_LATENCY.observe(time.perf_counter() - started, method, path)
+            HTTP_RESPONSE_SIZE.observe(size, method, path)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -1,6 +1,9 @@
-from typing import List, Tuple, Iterable, Optional
+from typing import List, NamedTuple, Tuple, Iterable, Optional, Union, TextIO
+from itertools import chain, compress
 import re
 
+import numpy as np
+
 def _to_floats(line: str) -> Optional[List[float]]:
     parts = re.split(r"[,\s]+", line.strip())
     nums: List[float] = []
@@ -60,4 +63,137 @@ def parse_welddat(
         z = nums[5]
         out.append((seq, wfr, rs, cur, volt, x, y, z))
         seq += 1
-    return out
\ No newline at end of file
+    return out
+
+
+# Columnar parsers: same line rules as above, but the whole file is converted
+# in one numpy pass and returned as a struct-of-arrays.
+
+
+class ScanColumns(NamedTuple):
+    seq: np.ndarray
+    raw: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    v: np.ndarray  # NaN where the line had no V column
+
+
+class WeldColumns(NamedTuple):
+    seq: np.ndarray
+    wire_feed_rate: np.ndarray
+    robot_speed: np.ndarray
+    current: np.ndarray
+    voltage: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+
+
+def _read_lines(source: Union[Iterable[str], TextIO]) -> List[str]:
+    read = getattr(source, "read", None)
+    if read is not None:
+        return read().split("\n")
+    return list(source)
+
+
+_PLAIN_LINE = re.compile(r"[0-9eE+\-. ]*")
+
+
+def _all_floats(toks: List[str]) -> bool:
+    try:
+        for t in toks:
+            float(t)
+    except ValueError:
+        return False
+    return True
+
+
+def _floats(rows: List[List[str]]) -> np.ndarray:
+    flat = list(chain.from_iterable(rows))
+    return np.fromiter(map(float, flat), dtype=np.float64, count=len(flat))
+
+
+def _numeric_table(
+    source: Union[Iterable[str], TextIO], min_cols: int, max_cols: int
+) -> np.ndarray:
+    """
+    Tokenize every line on commas/whitespace and convert all tokens with a
+    single pass. Lines with fewer than `min_cols` numbers or with any
+    non-numeric token are dropped, matching `_to_floats`. Returns an
+    (n, max_cols) float64 table, NaN-padded where a line is short.
+    """
+    rows = [line.replace(",", " ").split() for line in _read_lines(source)]
+    lengths = np.fromiter(map(len, rows), dtype=np.intp, count=len(rows))
+    keep = lengths >= min_cols
+    kept = list(compress(rows, keep))
+    lengths = lengths[keep]
+
+    try:
+        values = _floats(kept)
+    except ValueError:
+        # Rare path: at least one token is not a number. Lines made only of
+        # digits/signs/dots/exponents are assumed fine; anything else is
+        # checked token by token. If an odd plain-looking token still slips
+        # through, every line is checked.
+        good = np.fromiter(
+            (
+                _PLAIN_LINE.fullmatch(" ".join(toks)) is not None
+                or _all_floats(toks)
+                for toks in kept
+            ),
+            dtype=bool,
+            count=len(kept),
+        )
+        try:
+            values = _floats(list(compress(kept, good)))
+        except ValueError:
+            good = np.fromiter(map(_all_floats, kept), dtype=bool, count=len(kept))
+            values = _floats(list(compress(kept, good)))
+        kept = list(compress(kept, good))
+        lengths = lengths[good]
+
+    n = len(kept)
+    table = np.full((n, max_cols), np.nan, dtype=np.float64)
+    if n == 0:
+        return table
+    starts = np.zeros(n, dtype=np.intp)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    for k in range(max_cols):
+        has = lengths > k
+        table[has, k] = values[starts[has] + k]
+    return table
+
+
+def parse_scandata_columns(source: Union[Iterable[str], TextIO]) -> ScanColumns:
+    """
+    Columnar variant of `parse_scandata`.
+    Format: [ScanValue, Xpos, Ypos, Zpos, V]
+    """
+    t = _numeric_table(source, min_cols=4, max_cols=5)
+    return ScanColumns(
+        seq=np.arange(t.shape[0], dtype=np.int64),
+        raw=t[:, 0].copy(),
+        x=t[:, 1].copy(),
+        y=t[:, 2].copy(),
+        z=t[:, 3].copy(),
+        v=t[:, 4].copy(),
+    )
+
+
+def parse_welddat_columns(source: Union[Iterable[str], TextIO]) -> WeldColumns:
+    """
+    Columnar variant of `parse_welddat`.
+    Format:[Feedrate, CurrentValue, VoltageValue, Xpos, Ypos, Zpos, TravelSpeed]
+    """
+    t = _numeric_table(source, min_cols=7, max_cols=7)
+    return WeldColumns(
+        seq=np.arange(t.shape[0], dtype=np.int64),
+        wire_feed_rate=t[:, 0].copy(),
+        robot_speed=t[:, 6].copy(),
+        current=t[:, 1].copy(),
+        voltage=t[:, 2].copy(),
+        x=t[:, 3].copy(),
+        y=t[:, 4].copy(),
+        z=t[:, 5].copy(),
+    )
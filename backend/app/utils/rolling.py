@@ -0,0 +1,66 @@
+"""
+Trailing-window statistics over a 1-D series in O(n).
+
+Window sums come from differences of cumulative sums, so every sample's
+mean and standard deviation cost the same whatever the window length. The
+window of sample i is the `window` samples before it (i itself excluded),
+so a spike does not raise the baseline it is compared against. NaN samples
+are skipped: they neither count towards a window nor get a z-score.
+"""
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+
+class Rolling(NamedTuple):
+    mean: np.ndarray  # NaN where the window holds no samples
+    std: np.ndarray
+    count: np.ndarray  # valid samples in each window (int64)
+    z: np.ndarray  # NaN where the sample or its window is empty
+
+
+def rolling_zscore(values: np.ndarray, window: int, min_std: float = 0.0) -> Rolling:
+    """
+    Trailing mean, standard deviation and z-score of `values`. The standard
+    deviation is floored at `min_std` when dividing, so a step out of a flat
+    signal gets a finite, large z instead of infinity.
+    """
+    vals = np.asarray(values, dtype=np.float64)
+    n = vals.shape[0]
+    valid = ~np.isnan(vals)
+    # Centre on the series mean before summing squares: keeps the
+    # E[x^2] - E[x]^2 difference well conditioned for large offsets.
+    ref = float(vals[valid].mean()) if valid.any() else 0.0
+    centred = np.where(valid, vals - ref, 0.0)
+
+    s1 = np.concatenate(([0.0], np.cumsum(centred)))
+    s2 = np.concatenate(([0.0], np.cumsum(centred * centred)))
+    c = np.concatenate(([0], np.cumsum(valid, dtype=np.int64)))
+    hi = np.arange(n)
+    lo = np.maximum(hi - window, 0)
+    count = c[hi] - c[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        m = (s1[hi] - s1[lo]) / count
+        var = (s2[hi] - s2[lo]) / count - m * m
+        # A single sample has no spread; the difference above leaves rounding
+        # residue that would turn into a huge finite z.
+        var[count == 1] = 0.0
+        std = np.sqrt(np.maximum(var, 0.0))
+        z = (centred - m) / np.maximum(std, min_std)
+    z[~valid] = np.nan
+    return Rolling(m + ref, std, count, z)
+
+
+def flag_ranges(mask: np.ndarray, merge_gap: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Runs of True in `mask` as (starts, ends) index arrays, ends inclusive.
+    Runs separated by at most `merge_gap` False samples are joined.
+    """
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    breaks = np.flatnonzero(np.diff(idx) > merge_gap + 1)
+    starts = idx[np.r_[0, breaks + 1]]
+    ends = idx[np.r_[breaks, idx.size - 1]]
+    return starts, ends
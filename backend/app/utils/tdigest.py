@@ -0,0 +1,121 @@
+"""
+Mergeable quantile sketch (merging t-digest) and fixed-bin histograms.
+
+A digest is a sorted set of centroids (mean, weight). Centroids are formed
+by cutting the cumulative-weight axis into unit steps of the k1 scale
+function k(q) = compression / (2*pi) * asin(2q - 1), which keeps centroids
+small in the tails (accurate p1/p99) and large around the median. Building
+from raw values and merging digests are the same operation: sort the
+points, assign each to the k-step its centre falls in, and collapse the
+steps with `reduceat`, so both are vectorized. The number of centroids is
+bounded by about `compression`, whatever the input size.
+"""
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+
+class Digest(NamedTuple):
+    means: np.ndarray  # float64, ascending
+    weights: np.ndarray  # float64
+    min: float
+    max: float
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+
+EMPTY = Digest(np.empty(0), np.empty(0), float("nan"), float("nan"))
+
+
+def _compress(means: np.ndarray, weights: np.ndarray, compression: float) -> np.ndarray:
+    """Centroid id per (sorted) point."""
+    total = weights.sum()
+    centre = (np.cumsum(weights) - weights / 2) / total
+    k = compression / (2 * np.pi) * np.arcsin(np.clip(2 * centre - 1, -1.0, 1.0))
+    return np.floor(k - k[0]).astype(np.int64)
+
+
+def _collapse(means: np.ndarray, weights: np.ndarray, lo: float, hi: float, compression: float) -> Digest:
+    if means.size == 0:
+        return EMPTY
+    ids = _compress(means, weights, compression)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    w = np.add.reduceat(weights, starts)
+    m = np.add.reduceat(means * weights, starts) / w
+    return Digest(m, w, lo, hi)
+
+
+def build(values: np.ndarray, compression: float = 100.0) -> Digest:
+    """Digest of `values`; NaN and infinities are ignored."""
+    vals = np.sort(values[np.isfinite(values)])
+    if vals.size == 0:
+        return EMPTY
+    return _collapse(vals, np.ones(vals.size), float(vals[0]), float(vals[-1]), compression)
+
+
+def merge(digests: Sequence[Digest], compression: float = 100.0) -> Digest:
+    parts = [d for d in digests if d.means.size]
+    if not parts:
+        return EMPTY
+    means = np.concatenate([d.means for d in parts])
+    weights = np.concatenate([d.weights for d in parts])
+    order = np.argsort(means, kind="stable")
+    return _collapse(
+        means[order],
+        weights[order],
+        min(d.min for d in parts),
+        max(d.max for d in parts),
+        compression,
+    )
+
+
+def quantiles(digest: Digest, qs: Sequence[float]) -> np.ndarray:
+    """
+    Estimated quantiles (0..1) by linear interpolation between centroid
+    centres, anchored at the exact min and max. NaN for an empty digest.
+    """
+    qs = np.asarray(qs, dtype=np.float64)
+    if digest.means.size == 0:
+        return np.full(qs.shape, np.nan)
+    total = digest.count
+    centres = np.cumsum(digest.weights) - digest.weights / 2
+    x = np.concatenate(([0.0], centres, [total]))
+    y = np.concatenate(([digest.min], digest.means, [digest.max]))
+    return np.interp(qs * total, x, y)
+
+
+def to_bytes(digest: Digest) -> bytes:
+    """Little-endian float64: min, max, then means and weights."""
+    head = np.array([digest.min, digest.max], dtype="<f8")
+    return np.concatenate((head, digest.means, digest.weights)).astype("<f8").tobytes()
+
+
+def from_bytes(data: bytes) -> Digest:
+    arr = np.frombuffer(data, dtype="<f8")
+    n = (arr.size - 2) // 2
+    return Digest(arr[2 : 2 + n], arr[2 + n :], float(arr[0]), float(arr[1]))
+
+
+class HistogramSpec(NamedTuple):
+    min: float
+    max: float
+    bins: int
+
+
+def histogram(values: np.ndarray, spec: HistogramSpec) -> np.ndarray:
+    """
+    Counts per bin of `spec` plus underflow and overflow: `bins + 2` int64
+    values, [underflow, bin 0 .. bin n-1, overflow]. NaN is ignored and
+    -inf/+inf count as underflow/overflow; the upper edge of the last bin
+    is inclusive.
+    """
+    vals = values[~np.isnan(values)]
+    width = (spec.max - spec.min) / spec.bins
+    # Clip before the cast: infinity has no int64 value.
+    pos = np.clip((vals - spec.min) / width, -1, spec.bins)
+    idx = np.floor(pos).astype(np.int64)
+    idx[vals == spec.max] = spec.bins - 1
+    idx = np.clip(idx, -1, spec.bins) + 1
+    return np.bincount(idx, minlength=spec.bins + 2).astype(np.int64)
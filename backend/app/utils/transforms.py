@@ -1,6 +1,14 @@
+import numpy as np
+
 import app.utils.config_loader as cfg
 
 def transform_scan_value(raw: float) -> float:
     value_a = cfg.CONFIG["equations_vars"]["distance_a"]
     value_b = cfg.CONFIG["equations_vars"]["distance_b"]
-    return raw * value_a + value_b
\ No newline at end of file
+    return raw * value_a + value_b
+
+def transform_scan_values(raw: np.ndarray) -> np.ndarray:
+    """Vectorized `transform_scan_value` over a whole column."""
+    value_a = cfg.CONFIG["equations_vars"]["distance_a"]
+    value_b = cfg.CONFIG["equations_vars"]["distance_b"]
+    return raw * value_a + value_b
@@ -0,0 +1,87 @@
+"""
+Microbenchmark for GET /api/layers/{id}/data JSON encoding: the Pydantic
+path (compute_layer_data + JSONResponse rendering) against the direct
+column encoder (compute_layer_json). Checks the two bodies are identical
+and reports the per-point cost of each.
+
+    cd backend
+    python -m benchmarks.layer_json --points 50000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--storage", choices=["rows", "columnar"], default="columnar")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        # Both are read at import time.
+        os.environ["SSA_DB_PATH"] = os.path.join(td, "bench.db")
+        os.environ["SAMPLE_STORAGE"] = args.storage
+
+        from sqlmodel import select
+
+        from app.database.db import engine, get_session, init_db
+        from app.database.models import Layer, WeldGroup
+        from app.services.compute_metrics import compute_layer_data, compute_layer_json
+        from app.services.ingest import ingest_directory_into_group
+        from app.services.response_cache import json_body
+        from app.utils.config_loader import init_load
+        from benchmarks.synthetic import write_group
+
+        init_db()
+        init_load(Path(__file__).resolve().parents[1] / "app/config/v0.1")
+        data_dir = write_group(os.path.join(td, "data"), 1, args.points)
+        with get_session() as session:
+            group = WeldGroup(name="layer_json")
+            session.add(group)
+            session.commit()
+            group_id = group.id
+        ingest_directory_into_group(data_dir, group_id)
+        with get_session() as session:
+            layer_id = session.exec(select(Layer.id).where(Layer.group_id == group_id)).one()
+
+        def timed(fn) -> float:
+            samples = []
+            for _ in range(args.repeats):
+                t = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - t)
+            return median(samples)
+
+        model_body = json_body(compute_layer_data(layer_id))
+        fast_body = compute_layer_json(layer_id)
+        if model_body != fast_body:
+            print("bodies differ", file=sys.stderr)
+            return 1
+
+        points = model_body.count(b'"seq":')
+        model_s = timed(lambda: json_body(compute_layer_data(layer_id)))
+        fast_s = timed(lambda: compute_layer_json(layer_id))
+        engine.dispose()
+
+    print(json.dumps({
+        "storage": args.storage,
+        "points": points,
+        "body_bytes": len(fast_body),
+        "model_s": round(model_s, 4),
+        "fast_s": round(fast_s, 4),
+        "model_us_per_point": round(model_s / points * 1e6, 3),
+        "fast_us_per_point": round(fast_s / points * 1e6, 3),
+        "speedup": round(model_s / fast_s, 2),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Compare row-per-sample storage against packed per-layer columns on a
+synthetic group: DB size on disk and compute_* latency.
+
+    cd backend
+    python -m benchmarks.storage_compare --layers 20 --points 20000
+
+Each storage mode runs in its own subprocess against its own scratch DB
+(SSA_DB_PATH / SAMPLE_STORAGE are read at import time).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+
+MODES = [
+    ("rows", "float64"),
+    ("columnar", "float64"),
+    ("columnar", "float32"),
+]
+
+
+def _child(data_dir: str, repeats: int) -> dict:
+    from pathlib import Path
+    from sqlmodel import select
+
+    from app.database.db import DB_PATH, engine, get_session, init_db
+    from app.database.models import Layer, WeldGroup
+    from app.services.compute_metrics import compute_group_data, compute_layer_data
+    from app.services.ingest import ingest_directory_into_group
+    from app.utils.config_loader import init_load
+
+    init_db()
+    init_load(Path(__file__).resolve().parents[1] / "app/config/v0.1")
+    with get_session() as session:
+        group = WeldGroup(name="storage_compare")
+        session.add(group)
+        session.commit()
+        group_id = group.id
+
+    t0 = time.perf_counter()
+    ingest_directory_into_group(data_dir, group_id)
+    ingest_s = time.perf_counter() - t0
+
+    with get_session() as session:
+        layer_id = session.exec(
+            select(Layer.id).where(Layer.group_id == group_id).order_by(Layer.layer_number)  # type: ignore
+        ).first()
+
+    def timed(fn, *args) -> float:
+        samples = []
+        for _ in range(repeats):
+            t = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - t)
+        return median(samples)
+
+    group_s = timed(compute_group_data, group_id)
+    layer_s = timed(compute_layer_data, layer_id)
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.exec_driver_sql("VACUUM")
+    engine.dispose()
+
+    return {
+        "db_bytes": os.path.getsize(DB_PATH),
+        "ingest_s": round(ingest_s, 3),
+        "compute_group_data_s": round(group_s, 4),
+        "compute_layer_data_s": round(layer_s, 4),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--layers", type=int, default=20)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_child(args.child, args.repeats)))
+        return 0
+
+    from benchmarks.synthetic import write_group
+
+    results = []
+    with tempfile.TemporaryDirectory() as td:
+        data_dir = write_group(os.path.join(td, "data"), args.layers, args.points)
+        for storage, dtype in MODES:
+            env = dict(
+                os.environ,
+                SSA_DB_PATH=os.path.join(td, f"{storage}_{dtype}.db"),
+                SAMPLE_STORAGE=storage,
+                SAMPLE_STORAGE_DTYPE=dtype,
+            )
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.storage_compare",
+                 "--child", data_dir, "--repeats", str(args.repeats)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            results.append({"storage": storage, "dtype": dtype, **json.loads(out.splitlines()[-1])})
+
+    print(json.dumps({"layers": args.layers, "points": args.points, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
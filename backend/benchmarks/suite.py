@@ -0,0 +1,257 @@
+"""
+End-to-end benchmark suite on a synthetic group: ingest, compute_* and the
+HTTP routes through an in-process ASGI client. Every case reports latency
+percentiles, throughput and the peak traced memory of one extra run, and the
+whole result is written as JSON so runs can be diffed between commits.
+
+    cd backend
+    python -m benchmarks.suite --layers 20 --points 20000 --out bench.json
+    python -m benchmarks.suite --compare bench.json      # ratios vs an earlier run
+
+The suite runs against a scratch DB (SSA_DB_PATH) with the response cache
+disabled unless --cache is given, so route timings measure the real work.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _percentiles(samples: List[float]) -> dict:
+    ms = np.asarray(samples) * 1e3
+    return {
+        "runs": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "min_ms": round(float(ms.min()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def measure(fn: Callable[[int], int], repeats: int, unit: str) -> dict:
+    """
+    Time `fn(i)` `repeats` times; `fn` returns how many `unit`s it processed,
+    which gives the throughput. One more call under tracemalloc records the
+    peak Python/NumPy allocation.
+    """
+    samples, items = [], 0
+    for i in range(repeats):
+        t = time.perf_counter()
+        items += fn(i)
+        samples.append(time.perf_counter() - t)
+
+    tracemalloc.start()
+    fn(repeats)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(samples)
+    return {
+        **_percentiles(samples),
+        "throughput": round(items / total, 1) if total > 0 else 0.0,
+        "throughput_unit": f"{unit}/s",
+        "peak_mem_bytes": peak,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args: argparse.Namespace, td: str) -> dict:
+    # All of these are read at import time.
+    os.environ["SSA_DB_PATH"] = os.path.join(td, "bench.db")
+    os.environ["INGEST_SPOOL_DIR"] = os.path.join(td, "spool")
+    if args.storage:
+        os.environ["SAMPLE_STORAGE"] = args.storage
+    if not args.cache:
+        os.environ["RESPONSE_CACHE_MAX_BYTES"] = "0"
+
+    import asyncio
+    import httpx
+    from sqlmodel import select
+
+    from app.database.db import engine, get_session, init_db
+    from app.database.models import Layer, WeldGroup
+    from app.main import app
+    from app.services.compute_metrics import compute_group_data, compute_layer_data
+    from app.services.ingest import ingest_zip_into_group
+    from app.services.storage import SAMPLE_STORAGE
+    from app.utils.config_loader import init_load
+    from benchmarks.synthetic import write_group, write_zip
+
+    init_db()
+    init_load(ROOT / "app/config/v0.1")
+    data_dir = write_group(
+        os.path.join(td, "data"), args.layers, args.points, args.seed, noise=args.noise
+    )
+    zip_path = write_zip(os.path.join(td, "group.zip"), data_dir)
+
+    def new_group(i: int) -> str:
+        with get_session() as session:
+            group = WeldGroup(name=f"bench-{i}")
+            session.add(group)
+            session.commit()
+            return group.id
+
+    group_ids: List[str] = []
+    rows_per_ingest = 2 * args.layers * args.points
+
+    def ingest(i: int) -> int:
+        group_id = new_group(i)
+        group_ids.append(group_id)
+        ingest_zip_into_group(zip_path, group_id, workers=args.workers)
+        return rows_per_ingest
+
+    results: Dict[str, dict] = {}
+    results["ingest_zip_into_group"] = measure(ingest, args.ingest_repeats, "rows")
+
+    group_id = group_ids[0]
+    with get_session() as session:
+        layer_ids = session.exec(
+            select(Layer.id).where(Layer.group_id == group_id).order_by(Layer.layer_number)  # type: ignore
+        ).all()
+
+    def layer_at(i: int) -> str:
+        return layer_ids[i % len(layer_ids)]
+
+    def layer_data(i: int) -> int:
+        out = compute_layer_data(layer_at(i))
+        return len(out.scan_data) + len(out.weld_data)
+
+    results["compute_layer_data"] = measure(layer_data, args.repeats, "points")
+    results["compute_group_data"] = measure(
+        lambda i: (compute_group_data(group_id), 1)[1], args.repeats, "calls"
+    )
+
+    routes = {
+        "GET /api/groups": lambda i: "/api/groups",
+        "GET /api/groups/{id}": lambda i: f"/api/groups/{group_id}",
+        "GET /api/groups/{id}/data": lambda i: f"/api/groups/{group_id}/data",
+        "GET /api/layers/{id}/data": lambda i: f"/api/layers/{layer_at(i)}/data",
+        "GET /api/layers/{id}/data?max_points=5000": (
+            lambda i: f"/api/layers/{layer_at(i)}/data?max_points=5000"
+        ),
+        "GET /api/layers/{id}/data (binary)": lambda i: f"/api/layers/{layer_at(i)}/data",
+    }
+    binary_accept = {"accept": "application/vnd.ssa.layer+octet-stream"}
+
+    async def http_cases() -> None:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, url in routes.items():
+                headers = binary_accept if name.endswith("(binary)") else {}
+                sizes: List[int] = []
+                samples: List[float] = []
+                for i in range(args.repeats):
+                    t = time.perf_counter()
+                    r = await client.get(url(i), headers=headers)
+                    samples.append(time.perf_counter() - t)
+                    r.raise_for_status()
+                    sizes.append(len(r.content))
+                tracemalloc.start()
+                await client.get(url(args.repeats), headers=headers)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                total = sum(samples)
+                results[name] = {
+                    **_percentiles(samples),
+                    "throughput": round(len(samples) / total, 1),
+                    "throughput_unit": "requests/s",
+                    "bytes_per_sec": round(sum(sizes) / total, 1),
+                    "response_bytes": int(np.median(sizes)),
+                    "peak_mem_bytes": peak,
+                }
+
+    asyncio.run(http_cases())
+    engine.dispose()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "storage": SAMPLE_STORAGE,
+            "response_cache": bool(args.cache),
+            "layers": args.layers,
+            "points": args.points,
+            "noise": args.noise,
+            "seed": args.seed,
+            "ingest_workers": args.workers,
+            "repeats": args.repeats,
+            "ingest_repeats": args.ingest_repeats,
+            "zip_bytes": os.path.getsize(zip_path),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, previous: dict) -> dict:
+    """p50 and throughput ratios (current / previous) for cases present in both."""
+    out = {}
+    for name, cur in current["results"].items():
+        prev = previous["results"].get(name)
+        if not prev:
+            continue
+        out[name] = {
+            "p50_ratio": round(cur["p50_ms"] / prev["p50_ms"], 3) if prev["p50_ms"] else None,
+            "throughput_ratio": (
+                round(cur["throughput"] / prev["throughput"], 3) if prev["throughput"] else None
+            ),
+        }
+    return out
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--layers", type=int, default=10)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--noise", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--ingest-repeats", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=1, help="INGEST_WORKERS for the ingest case")
+    parser.add_argument("--storage", choices=["rows", "columnar"], default=None)
+    parser.add_argument("--cache", action="store_true", help="keep the response cache enabled")
+    parser.add_argument("--out", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", help="earlier result JSON to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as td:
+        result = run_suite(args, td)
+
+    if args.compare:
+        with open(args.compare) as f:
+            result["compare"] = compare(result, json.load(f))
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Reproducible synthetic w###_scandata.txt / w###_welddat.txt generator used by
+the benchmark scripts. Files follow the formats documented in
+app/utils/parsers.py:
+
+    scandata: ScanValue, Xpos, Ypos, Zpos, V           (comma separated)
+    welddat:  Feedrate CurrentValue VoltageValue Xpos Ypos Zpos TravelSpeed
+                                                        (tab separated)
+
+Each layer is a closed elliptical bead path. The torch slows down on the
+tight ends of the ellipse, the weld metrics follow the speed with Gaussian
+noise and a small per-layer drift, and the scan profile sees a slowly growing
+bead. The same seed always gives byte-identical files.
+
+    cd backend
+    python -m benchmarks.synthetic out_dir --layers 20 --points 20000 --zip out.zip
+"""
+import argparse
+import math
+import os
+import sys
+import zipfile
+from typing import Optional
+
+import numpy as np
+
+
+def write_group(
+    out_dir: str,
+    layers: int = 10,
+    points: int = 20000,
+    seed: int = 0,
+    layer_height: float = 2.0,
+    noise: float = 1.0,
+    missing_v: float = 0.0,
+) -> str:
+    """
+    Write `layers` file pairs of `points` samples each into `out_dir`.
+    `noise` scales every noise term (0 gives smooth signals) and `missing_v`
+    is the fraction of scandata lines written without the trailing V column.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0.0, 2.0 * math.pi, points, endpoint=False)
+    x = 50.0 * np.cos(t)
+    y = 30.0 * np.sin(t)
+    # Path curvature peaks at the ends of the major axis; slow down there.
+    curvature = np.abs(np.cos(t)) ** 4
+    speed = 10.0 - 2.0 * curvature
+    for n in range(1, layers + 1):
+        drift = 1.0 + 0.002 * (n - 1)
+        z = np.full(points, n * layer_height)
+        weld = np.column_stack(
+            [
+                8.0 * drift + 0.4 * curvature + rng.normal(0.0, 0.3 * noise, points),
+                150.0 * drift + 8.0 * curvature + rng.normal(0.0, 5.0 * noise, points),
+                22.0 + 0.5 * curvature + rng.normal(0.0, 1.0 * noise, points),
+                x,
+                y,
+                z,
+                speed + rng.normal(0.0, 0.5 * noise, points),
+            ]
+        )
+        scan = np.column_stack(
+            [
+                1.0 + 0.02 * n + 0.05 * curvature + rng.normal(0.0, 0.05 * noise, points),
+                x,
+                y,
+                z,
+                speed + rng.normal(0.0, 0.2 * noise, points),
+            ]
+        )
+        _write_scan(os.path.join(out_dir, f"w{n:03d}_scandata.txt"), scan, rng, missing_v)
+        np.savetxt(os.path.join(out_dir, f"w{n:03d}_welddat.txt"), weld, fmt="%.4f", delimiter="\t")
+    return out_dir
+
+
+def _write_scan(path: str, scan: np.ndarray, rng: np.random.Generator, missing_v: float) -> None:
+    if missing_v <= 0.0:
+        np.savetxt(path, scan, fmt="%.5f", delimiter=", ")
+        return
+    drop = rng.random(scan.shape[0]) < missing_v
+    with open(path, "w") as f:
+        for row, short in zip(scan.tolist(), drop.tolist()):
+            f.write(", ".join(f"{v:.5f}" for v in (row[:4] if short else row)) + "\n")
+
+
+def write_zip(zip_path: str, data_dir: str) -> str:
+    """Pack the pairs in `data_dir` into `zip_path` (deflated, sorted names)."""
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name in sorted(os.listdir(data_dir)):
+            zf.write(os.path.join(data_dir, name), name)
+    return zip_path
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--layers", type=int, default=10)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layer-height", type=float, default=2.0)
+    parser.add_argument("--noise", type=float, default=1.0)
+    parser.add_argument("--missing-v", type=float, default=0.0)
+    parser.add_argument("--zip", help="also write the pairs into this ZIP")
+    args = parser.parse_args(argv)
+
+    write_group(
+        args.out_dir, args.layers, args.points, args.seed,
+        args.layer_height, args.noise, args.missing_v,
+    )
+    if args.zip:
+        write_zip(args.zip, args.out_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
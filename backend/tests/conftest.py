@@ -0,0 +1,102 @@
+"""
+Shared fixtures. SSA_DB_PATH is read when app.database.db is imported, so it
+points at a scratch SQLite file before any test module imports the app.
+"""
+import math
+import os
+import random
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+os.environ["SSA_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="ssa_test_"), "test.db")
+
+import app.utils.config_loader as cfg  # noqa: E402
+from app.database.db import get_session, init_db  # noqa: E402
+from app.database.models import WeldGroup  # noqa: E402
+
+CONFIG_DIR = Path(__file__).resolve().parents[1] / "app/config/v0.1"
+
+init_db()
+cfg.init_load(CONFIG_DIR)
+
+
+def write_layers(directory: Path, layers: int, n: int, seed: int = 0, junk: bool = True) -> Path:
+    """
+    Synthetic w###_scandata/w###_welddat pairs: one ellipse per layer at
+    z = 2 * layer, noisy metrics with a current spike every 997 samples and,
+    with `junk`, unparseable lines sprinkled in.
+    """
+    rnd = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    for layer in range(1, layers + 1):
+        with open(directory / f"w{layer:03d}_scandata.txt", "w") as f:
+            for i in range(n):
+                t = i / n * 2 * math.pi
+                vals = [rnd.gauss(1.0, 0.05), 50 * math.cos(t), 30 * math.sin(t), layer * 2.0]
+                if i % 7:
+                    vals.append(rnd.uniform(5, 10))
+                f.write(", ".join(f"{v:.5f}" for v in vals) + "\n")
+                if junk and i % 500 == 3:
+                    f.write("garbage line here\n1,2\n\n1 2 3 abc 5\n")
+        with open(directory / f"w{layer:03d}_welddat.txt", "w") as f:
+            for i in range(n):
+                t = i / n * 2 * math.pi
+                vals = [
+                    rnd.gauss(8, 0.3),
+                    rnd.gauss(150, 5) + (80 if i % 997 == 0 else 0),
+                    rnd.gauss(22, 1),
+                    50 * math.cos(t),
+                    30 * math.sin(t),
+                    layer * 2.0,
+                    rnd.gauss(10, 0.5),
+                ]
+                f.write("\t".join(f"{v:.4f}" for v in vals) + "\n")
+                if junk and i % 400 == 5:
+                    f.write("1,2,3,4,5,6\nx y\n1,2,3,4,5,6,7,8\n")
+    return directory
+
+
+def zip_layers(directory: Path, zip_path: Path) -> Path:
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        for path in sorted(directory.iterdir()):
+            zf.write(path, path.name)
+    return zip_path
+
+
+@pytest.fixture
+def new_group() -> Callable[[], str]:
+    """Factory for empty groups with unique names; returns the group id."""
+
+    def make() -> str:
+        with get_session() as session:
+            group = WeldGroup(name=f"test-{os.urandom(6).hex()}")
+            session.add(group)
+            session.commit()
+            return group.id
+
+    return make
+
+
+@pytest.fixture
+def ingested_group(tmp_path, new_group) -> Callable[..., str]:
+    """Factory: a group ingested from `write_layers(layers, n)`."""
+    from app.services.ingest import ingest_directory_into_group
+
+    def make(layers: int = 3, n: int = 2000, seed: int = 0) -> str:
+        gid = new_group()
+        ingest_directory_into_group(str(write_layers(tmp_path / f"data-{gid}", layers, n, seed)), gid)
+        return gid
+
+    return make
+
+
+@pytest.fixture
+def config():
+    """The config module; whatever a test changes is restored afterwards."""
+    saved = dict(cfg.CONFIG)
+    yield cfg
+    cfg._set(saved)
@@ -0,0 +1,127 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database.db import get_session
+from app.database.models import WeldGroup
+from app.main import app
+from app.services.ingest import append_layer
+from app.utils.binary_format import MEDIA_TYPE, decode_columns, encode_columns
+from app.utils.parsers import ScanColumns, WeldColumns
+
+# JSON field -> SSAL column of the same table.
+SCAN_FIELDS = ("seq", "x", "y", "z", "scan_value")
+WELD_FIELDS = ("seq", "x", "y", "z", "wire_feed_rate", "travel_speed", "voltage", "current")
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def _layer(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    seq = np.arange(n)
+
+    def col(scale: float, nan_every: int = 0) -> np.ndarray:
+        vals = rng.normal(scale, 1.0, n)
+        if nan_every:
+            vals[::nan_every] = np.nan
+        return vals
+
+    scan = ScanColumns(seq, col(1.0, 5), col(50.0), col(30.0), np.full(n, 2.0), col(7.0, 3))
+    weld = WeldColumns(
+        seq, col(8.0, 4), col(10.0), col(150.0, 6), col(22.0), col(50.0), col(30.0), np.full(n, 2.0)
+    )
+    return scan, weld
+
+
+@pytest.fixture
+def layers(new_group):
+    """Layer ids of a group holding a layer with null metrics and an empty layer."""
+    gid = new_group()
+    with get_session() as session:
+        group = session.get(WeldGroup, gid)
+        full = append_layer(session, group, 1, *_layer(500)).id
+        empty = append_layer(session, group, 2, *_layer(0)).id
+    return full, empty
+
+
+def _as_array(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+@pytest.mark.parametrize("max_points", [None, 64])
+def test_layer_round_trip_matches_json(client, layers, max_points):
+    for layer_id in layers:
+        url = f"/api/layers/{layer_id}/data" + (f"?max_points={max_points}" if max_points else "")
+        body = client.get(url).json()
+        resp = client.get(url, headers={"Accept": MEDIA_TYPE})
+        assert resp.headers["content-type"] == MEDIA_TYPE
+        meta, tables = decode_columns(resp.content)
+
+        for key in ("layer_id", "group_id", "layer_number", "summary"):
+            assert meta[key] == body[key]
+        for table, fields in (("scan_data", SCAN_FIELDS), ("weld_data", WELD_FIELDS)):
+            points = body[table]
+            assert list(tables[table]) == list(fields)
+            for name in fields:
+                col = tables[table][name]
+                expected = _as_array([p.get(name) for p in points])
+                assert col.shape == expected.shape
+                if name == "seq":
+                    assert col.dtype == np.dtype("<u4")
+                    np.testing.assert_array_equal(col, expected.astype(np.uint32))
+                else:
+                    assert col.dtype == np.dtype("<f4")
+                    np.testing.assert_array_equal(col, expected.astype(np.float32))
+
+
+def test_nulls_are_nan(client, layers):
+    meta, tables = decode_columns(
+        client.get(f"/api/layers/{layers[0]}/data", headers={"Accept": MEDIA_TYPE}).content
+    )
+    assert np.isnan(tables["scan_data"]["scan_value"]).sum() > 0
+    assert np.isnan(tables["weld_data"]["wire_feed_rate"]).sum() == 125
+
+
+def test_empty_layer(client, layers):
+    meta, tables = decode_columns(
+        client.get(f"/api/layers/{layers[1]}/data", headers={"Accept": MEDIA_TYPE}).content
+    )
+    assert meta["summary"]["n"] == 0
+    assert all(col.size == 0 for table in tables.values() for col in table.values())
+
+
+def test_columns_are_aligned():
+    payload = encode_columns(
+        {"k": "v" * 13},
+        {"t": {"seq": np.arange(3), "a": np.array([1.5, np.nan, -2.0]), "b": np.array([])}},
+    )
+    meta, tables = decode_columns(payload)
+    assert meta == {"k": "v" * 13}
+    header = json.loads(payload[12 : 12 + int.from_bytes(payload[8:12], "little")])
+    assert all(col["offset"] % 8 == 0 for col in header["columns"])
+    np.testing.assert_array_equal(tables["t"]["a"], np.array([1.5, np.nan, -2.0], dtype=np.float32))
+    assert tables["t"]["b"].size == 0
+
+
+@pytest.mark.parametrize(
+    "mangle",
+    [
+        lambda p: p[:0],
+        lambda p: p[:6],  # inside the fixed prefix
+        lambda p: p[:20],  # inside the header
+        lambda p: p[:-4],  # last column cut short
+        lambda p: b"XXXX" + p[4:],  # magic
+        lambda p: p[:4] + b"\x02\x00" + p[6:],  # version
+        lambda p: p[:12] + b"\xff" * 8 + p[20:],  # header bytes
+        lambda p: p[:8] + (10**6).to_bytes(4, "little") + p[12:],  # header length
+    ],
+)
+def test_corrupt_payload_raises(mangle):
+    payload = encode_columns({"n": 1}, {"t": {"seq": np.arange(10), "v": np.ones(10)}})
+    with pytest.raises(ValueError):
+        decode_columns(mangle(payload))
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import select
+
+from app.database.db import engine, get_session, run_db
+from app.database.models import Layer, WeldGroup
+from app.main import app
+from app.services.compute_metrics import compute_group_data
+from app.services.ingest import append_layer
+from app.services.response_cache import response_cache
+from app.utils.parsers import ScanColumns, WeldColumns
+
+APPENDS = 12
+READERS = 8
+
+
+def _layer(n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    seq = np.arange(n)
+    scan = ScanColumns(seq, rng.normal(1, 0.1, n), rng.normal(0, 9, n), rng.normal(0, 9, n), np.full(n, 2.0), rng.normal(7, 1, n))
+    weld = WeldColumns(
+        seq, rng.normal(8, 1, n), rng.normal(10, 1, n), rng.normal(150, 5, n), rng.normal(22, 1, n),
+        rng.normal(0, 9, n), rng.normal(0, 9, n), np.full(n, 2.0),
+    )
+    return scan, weld
+
+
+def test_database_is_wal():
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+
+
+def test_reads_during_ingest_commits(ingested_group):
+    busy = ingested_group(layers=3, n=1500)
+    steady = ingested_group(layers=2, n=1500, seed=1)
+    errors = []
+
+    def writer() -> None:
+        # One commit per layer, like an ingest job or an append.
+        try:
+            for i in range(APPENDS):
+                with get_session() as session:
+                    append_layer(session, session.get(WeldGroup, busy), 100 + i, *_layer(4000, i))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    async def readers():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            baseline = (await client.get(f"/api/groups/{steady}/data")).content
+            seen = set()
+            thread = threading.Thread(target=writer)
+            thread.start()
+            while thread.is_alive():
+                results = await asyncio.gather(
+                    *(client.get(f"/api/groups/{busy}/data") for _ in range(READERS // 2)),
+                    *(client.get(f"/api/groups/{steady}/data") for _ in range(READERS // 4)),
+                    *(run_db(compute_group_data, busy) for _ in range(READERS // 4)),
+                    return_exceptions=True,
+                )
+                for r in results:
+                    if isinstance(r, Exception):
+                        errors.append(r)
+                        continue
+                    data = r.model_dump() if not isinstance(r, httpx.Response) else None
+                    if data is None:
+                        assert r.status_code == 200, r.text
+                        if r.json()["group_id"] == steady:
+                            assert r.content == baseline
+                            continue
+                        data = r.json()
+                    # Every read sees one committed state: the group summary
+                    # covers exactly the layers listed with it.
+                    assert data["summary"]["n"] == sum(layer["n"] for layer in data["per_layer"])
+                    seen.add(len(data["per_layer"]))
+            thread.join()
+            return seen
+
+    seen = asyncio.run(readers())
+    locked = [e for e in errors if isinstance(e, OperationalError) or "locked" in str(e)]
+    assert not locked, locked
+    assert not errors, errors
+    assert len(seen) > 1  # reads really overlapped the commits
+    final = compute_group_data(busy)
+    assert len(final.per_layer) == 3 + APPENDS
+
+
+LIGHT_CALLS = 40
+
+
+def _p95(samples):
+    return float(np.percentile(samples, 95))
+
+
+def test_light_latency_while_heavy_request_runs(ingested_group):
+    heavy_group = ingested_group(layers=6, n=10000)
+    with get_session() as session:
+        layer_id = session.exec(select(Layer.id).where(Layer.group_id == heavy_group)).first()
+
+    async def light(client):
+        # Sequential light calls: each one's latency is what a UI click sees.
+        times = []
+        for i in range(LIGHT_CALLS):
+            url = "/api/groups" if i % 2 else f"/api/layers/{layer_id}"
+            t0 = time.perf_counter()
+            resp = await client.get(url)
+            times.append(time.perf_counter() - t0)
+            assert resp.status_code == 200
+        return times
+
+    async def heavy(client, stop):
+        runs = 0
+        while not stop.is_set() or runs == 0:
+            # Uncached every time: full-resolution layers with distributions.
+            response_cache.invalidate_group(heavy_group)
+            resp = await client.get(f"/api/groups/{heavy_group}/layers/data?distributions=true")
+            assert resp.status_code == 200
+            runs += 1
+        return runs
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await light(client)  # warm up
+            baseline = await light(client)
+            stop = asyncio.Event()
+            heavy_task = asyncio.create_task(heavy(client, stop))
+            await asyncio.sleep(0.05)
+            loaded = await light(client)
+            # The heavy loop never idles, so every light call overlapped one.
+            assert not heavy_task.done()
+            stop.set()
+            await heavy_task
+            return baseline, loaded
+
+    baseline, loaded = asyncio.run(run())
+    # Flat within a bounded factor (plus a small floor for scheduler noise).
+    assert _p95(loaded) <= 5 * _p95(baseline) + 0.05
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from app.utils.downsample import lttb_indices, lttb_union_indices, minmax_indices
+
+N = 5000
+
+
+def _series(k: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    series = [np.cumsum(rng.normal(0, 1, N)) for _ in range(k)]
+    series[0][::7] = np.nan  # a nullable metric
+    return np.arange(N, dtype=float), series
+
+
+# k=4 is the weld case; the API allows max_points >= 16.
+@pytest.mark.parametrize("n_out", [*range(14, 24), 64, 500])
+@pytest.mark.parametrize("k", [1, 4])
+def test_union_keeps_endpoints_and_extremes(n_out, k):
+    x, series = _series(k)
+    idx = lttb_union_indices(x, series, n_out)
+    assert idx.size <= n_out
+    assert np.all(np.diff(idx) > 0)
+    assert (idx[0], idx[-1]) == (0, N - 1)
+    for y in series:
+        assert np.nanargmin(y) in idx and np.nanargmax(y) in idx
+    # The budget is used, not just the end points and extremes.
+    assert idx.size >= n_out // 2
+
+
+@pytest.mark.parametrize("n_out", [2, 3, 5, 9])
+def test_union_below_one_point_per_series(n_out):
+    x, series = _series(4)
+    idx = lttb_union_indices(x, series, n_out)
+    assert idx.size == n_out
+    assert (idx[0], idx[-1]) == (0, N - 1)
+
+
+def test_short_input_is_kept():
+    x, series = _series(4)
+    np.testing.assert_array_equal(lttb_union_indices(x[:10], [y[:10] for y in series], 16), np.arange(10))
+
+
+@pytest.mark.parametrize("fn", [lttb_indices, minmax_indices])
+def test_single_series_selectors(fn):
+    x, (y,) = _series(1, seed=3)
+    idx = fn(x, y, 100) if fn is lttb_indices else fn(y, 100)
+    assert idx.size <= 100 and (idx[0], idx[-1]) == (0, N - 1)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from app.utils import gridhash
+from app.utils.gridhash import nearest_within
+
+
+def _brute(ref, query, tol):
+    d = np.sqrt(((query[:, None, :] - ref[None, :, :]) ** 2).sum(axis=2))
+    d = np.where(np.isnan(d), np.inf, d)
+    idx = d.argmin(axis=1)
+    best = d[np.arange(query.shape[0]), idx]
+    hit = best <= tol
+    return np.where(hit, idx, -1), np.where(hit, best, np.nan)
+
+
+def _assert_same(ref, query, tol):
+    idx, dist = nearest_within(ref, query, tol)
+    want_idx, want_dist = _brute(ref, query, tol)
+    np.testing.assert_array_equal(idx, want_idx)
+    np.testing.assert_allclose(dist, want_dist, rtol=1e-12, equal_nan=True)
+    return idx
+
+
+def _path(n, seed):
+    """A dense weld-like path: an ellipse with jitter, many samples per mm."""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2 * np.pi, n)
+    pts = np.c_[50 * np.cos(t), 30 * np.sin(t), np.full(n, 2.0)]
+    return pts + rng.normal(0, 0.05, pts.shape)
+
+
+@pytest.mark.parametrize("tol", [0.05, 0.5, 3.0])
+def test_scattered_points(tol):
+    rng = np.random.default_rng(0)
+    ref = rng.uniform(-10, 10, (1500, 3))
+    query = rng.uniform(-11, 11, (800, 3))
+    ref[::100] = np.nan
+    query[::50, 1] = np.nan
+    idx = _assert_same(ref, query, tol)
+    assert np.all(idx[::50] == -1)
+
+
+def test_dense_path(monkeypatch):
+    # Small chunks so the chunk loop and every cascade level run.
+    monkeypatch.setattr(gridhash, "CHUNK", 257)
+    ref = _path(4000, 1)
+    query = _path(1500, 2) + [0.0, 0.0, 0.3]
+    idx = _assert_same(ref, query, 0.5)
+    assert (idx >= 0).mean() > 0.9
+
+
+def test_nothing_to_match():
+    ref = np.random.default_rng(3).uniform(0, 1, (10, 3))
+    for query, tol in ((np.empty((0, 3)), 1.0), (ref + 100, 1.0), (ref, 0.0)):
+        idx, dist = nearest_within(ref, query, tol)
+        assert np.all(idx == -1) and np.all(np.isnan(dist))
+
+
+def test_tolerance_too_small():
+    ref = np.array([[0.0, 0.0, 0.0], [1e6, 1e6, 1e6]])
+    with pytest.raises(ValueError, match="tolerance_too_small"):
+        nearest_within(ref, ref, 1e-9)
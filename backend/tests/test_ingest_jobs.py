@@ -0,0 +1,265 @@
+import os
+import subprocess
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.database.db import get_session
+from app.database.models import IngestJob, Layer, WeldGroup, _utcnow
+from app.main import app
+from app.routers import ingest as ingest_router
+from app.services import ingest_jobs
+from app.services.ingest_jobs import BOOT, HOST
+from conftest import write_layers, zip_layers
+
+
+@pytest.fixture
+def queued_job(tmp_path, new_group):
+    made = []
+
+    def make() -> str:
+        gid = new_group()
+        spool = zip_layers(write_layers(tmp_path / gid, 2, 300), tmp_path / f"{gid}.zip")
+        made.append(ingest_jobs.create_job(gid, str(spool)).id)
+        return made[-1]
+
+    yield make
+    # Jobs left active would count against the queue bound of later tests.
+    for job_id in made:
+        if _job(job_id).status in ingest_jobs.ACTIVE_STATUSES:
+            _set(job_id, status="cancelled")
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """Record submissions instead of starting worker processes."""
+    calls = []
+    monkeypatch.setattr(ingest_jobs, "submit_job", lambda job_id, group_id: calls.append(job_id))
+    return calls
+
+
+def _set(job_id: str, **fields) -> None:
+    with get_session() as session:
+        job = session.get(IngestJob, job_id)
+        for name, value in fields.items():
+            setattr(job, name, value)
+        session.commit()
+
+
+def _set_group(group_id: str, **fields) -> None:
+    with get_session() as session:
+        group = session.get(WeldGroup, group_id)
+        for name, value in fields.items():
+            setattr(group, name, value)
+        session.commit()
+
+
+def _job(job_id: str) -> IngestJob:
+    with get_session() as session:
+        return session.get(IngestJob, job_id)
+
+
+def _layer_count(group_id: str) -> int:
+    with get_session() as session:
+        return len(session.exec(select(Layer.id).where(Layer.group_id == group_id)).all())
+
+
+def test_job_runs_once(queued_job):
+    job_id = queued_job()
+    assert ingest_jobs._run_job(job_id, "a")[0] == "succeeded"
+    # A second submission (another API process) finds it already taken.
+    assert ingest_jobs._run_job(job_id, "b") == ("succeeded", None)
+    job = _job(job_id)
+    assert (job.attempts, job.owner) == (1, "a")
+    assert _layer_count(job.group_id) == 2
+
+
+def test_claimed_job_is_not_run_again(queued_job):
+    job_id = queued_job()
+    _set(job_id, status="running", owner="other", heartbeat=_utcnow())
+    assert ingest_jobs._run_job(job_id, "a") == ("running", None)
+    assert _job(job_id).owner == "other"
+
+
+def test_recover_leaves_live_jobs_alone(queued_job, submitted):
+    job_id = queued_job()
+    assert ingest_jobs._run_job(job_id, "a")[0] == "succeeded"
+    group_id = _job(job_id).group_id
+    # Pretend the job is still running in another process that checked in just now.
+    _set(job_id, status="running", owner="other", heartbeat=_utcnow())
+    ingest_jobs.recover_jobs()
+    job = _job(job_id)
+    assert (job.status, job.owner) == ("running", "other")
+    assert _layer_count(group_id) == 2
+    assert job_id not in submitted
+
+
+def test_recover_requeues_expired_jobs(tmp_path, queued_job, submitted):
+    job_id = queued_job()
+    spool = _job(job_id).zip_path
+    assert ingest_jobs._run_job(job_id, "a")[0] == "succeeded"
+    group_id = _job(job_id).group_id
+    # The finished run removed the spooled upload; a requeued job needs it.
+    zip_layers(write_layers(tmp_path / "again", 1, 10), Path(spool))
+    stale = _utcnow() - timedelta(seconds=ingest_jobs.INGEST_JOB_LEASE + 5)
+    _set(job_id, status="running", owner="dead", heartbeat=stale)
+    ingest_jobs.recover_jobs()
+    job = _job(job_id)
+    assert (job.status, job.owner, job.heartbeat) == ("queued", None, None)
+    assert _layer_count(group_id) == 0
+    assert job_id in submitted
+    with get_session() as session:
+        assert session.get(WeldGroup, group_id).status == "queued"
+    ingest_jobs._remove_spool(spool)
+
+
+def test_crashed_worker_fails_job(queued_job):
+    job_id = queued_job()
+    ingest_jobs._fail_crashed(job_id, "worker_crashed: boom")
+    job = _job(job_id)
+    assert (job.status, job.error) == ("failed", "worker_crashed: boom")
+    with get_session() as session:
+        group = session.get(WeldGroup, job.group_id)
+        assert (group.status, group.ingest_error) == ("failed", "worker_crashed: boom")
+
+
+def test_crash_leaves_other_owners_job(queued_job):
+    job_id = queued_job()
+    _set(job_id, status="running", owner="other", heartbeat=_utcnow())
+    ingest_jobs._fail_crashed(job_id, "worker_crashed: boom")
+    assert _job(job_id).status == "running"
+
+
+def test_broken_pool_is_replaced():
+    pool = ingest_jobs._get_pool()
+    ingest_jobs._drop_pool(pool)
+    fresh = ingest_jobs._get_pool()
+    try:
+        assert fresh is not pool
+    finally:
+        ingest_jobs.shutdown()
+
+
+def test_worker_stops_after_takeover(queued_job, monkeypatch):
+    job_id = queued_job()
+
+    def ingest(zip_path, group_id, progress, **kwargs):
+        # Another process recovers the job between two layers.
+        _set(job_id, status="queued", owner=None, heartbeat=None)
+        progress(1, 2, 100)
+        raise AssertionError("progress should have stopped the ingest")
+
+    monkeypatch.setattr(ingest_jobs, "ingest_zip_into_group", ingest)
+    assert ingest_jobs._run_job(job_id, "a") == ("lost", None)
+    job = _job(job_id)
+    assert (job.status, job.finished_at) == ("queued", None)
+    assert Path(job.zip_path).is_file()
+
+
+def _exited_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+@pytest.mark.parametrize(
+    "owner",
+    [
+        lambda: f"{HOST}:{os.getpid()}:{BOOT}:0ldn0nce",  # pid reused by the restarted API
+        lambda: f"{HOST}:{_exited_pid()}:{BOOT}:0ldn0nce",
+        lambda: f"{HOST}:{os.getppid()}:0ldb00t:0ldn0nce",  # earlier boot
+    ],
+    ids=["same-pid", "exited-pid", "earlier-boot"],
+)
+def test_restart_recovers_job_of_dead_owner(queued_job, submitted, owner):
+    # The API restarted well inside the lease: the heartbeat is still fresh.
+    job_id = queued_job()
+    _set(job_id, status="running", owner=owner(), heartbeat=_utcnow())
+    ingest_jobs.recover_jobs()
+    job = _job(job_id)
+    assert (job.status, job.owner) == ("queued", None)
+    assert job_id in submitted
+
+
+def test_running_sibling_keeps_its_job(queued_job, submitted):
+    # Another live API process on this host (here: the test runner's parent).
+    job_id = queued_job()
+    owner = f"{HOST}:{os.getppid()}:{BOOT}:s1bl1ng0"
+    _set(job_id, status="running", owner=owner, heartbeat=_utcnow())
+    ingest_jobs.recover_jobs()
+    assert (_job(job_id).status, _job(job_id).owner) == ("running", owner)
+    assert job_id not in submitted
+
+
+def test_sweep_requeues_expired_lease(queued_job, submitted):
+    job_id = queued_job()
+    fresh = queued_job()
+    stale = _utcnow() - timedelta(seconds=ingest_jobs.INGEST_JOB_LEASE + 5)
+    _set(job_id, status="running", owner="other", heartbeat=stale)
+    _set(fresh, status="running", owner="other", heartbeat=_utcnow())
+    ingest_jobs.sweep_jobs()
+    assert _job(job_id).status == "queued" and _job(fresh).status == "running"
+    assert job_id in submitted and fresh not in submitted
+
+
+def test_sweep_submits_stranded_queued_jobs(queued_job, submitted):
+    old, new, mine = queued_job(), queued_job(), queued_job()
+    long_ago = _utcnow() - timedelta(seconds=ingest_jobs.INGEST_JOB_LEASE + 5)
+    _set(old, created_at=long_ago)
+    _set(mine, created_at=long_ago)
+    ingest_jobs._submitted.add(mine)
+    try:
+        ingest_jobs.sweep_jobs()
+    finally:
+        ingest_jobs._submitted.discard(mine)
+    assert old in submitted
+    assert new not in submitted and mine not in submitted
+
+
+def test_failed_spool_frees_group_name(monkeypatch):
+    async def broken(zip_file):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ingest_router, "check_capacity", lambda: None)
+    monkeypatch.setattr(ingest_router, "_spool_upload", broken)
+    name = f"spool-{os.urandom(4).hex()}"
+    client = TestClient(app, raise_server_exceptions=False)
+    resp = client.post(
+        "/api/ingest/upload-zip", data={"group_name": name}, files={"zip_file": ("a.zip", b"PK")}
+    )
+    assert resp.status_code == 500
+    with get_session() as session:
+        assert session.exec(select(WeldGroup).where(WeldGroup.name == name)).first() is None
+
+
+@pytest.mark.parametrize("status", ["failed", "cancelled", "ingesting"])
+def test_append_needs_ingested_group(tmp_path, new_group, monkeypatch, status):
+    gid = new_group()
+    _set_group(gid, status=status, ingest_complete=False)
+    spool = zip_layers(write_layers(tmp_path / "new", 1, 50), tmp_path / "new.zip")
+    with pytest.raises(ValueError, match="group_not_ingested"):
+        ingest_jobs.create_job(gid, str(spool), append="skip")
+
+    monkeypatch.setattr(ingest_router, "check_capacity", lambda: None)
+    resp = TestClient(app).post(
+        f"/api/ingest/groups/{gid}/append-zip", files={"zip_file": ("new.zip", spool.read_bytes())}
+    )
+    assert resp.status_code == 409
+    with get_session() as session:
+        assert session.exec(select(IngestJob).where(IngestJob.group_id == gid)).first() is None
+
+
+def test_undone_append_restores_group_status(tmp_path, ingested_group):
+    gid = ingested_group(layers=2, n=200)
+    _set_group(gid, status="reviewed")
+    spool = zip_layers(write_layers(tmp_path / "new", 3, 50), tmp_path / "new.zip")
+    job_id = ingest_jobs.create_job(gid, str(spool), append="skip").id
+    assert ingest_jobs._finish_job(job_id, "failed", error="boom")
+    with get_session() as session:
+        group = session.get(WeldGroup, gid)
+        assert (group.status, group.ingest_complete) == ("reviewed", True)
+    assert _layer_count(gid) == 2
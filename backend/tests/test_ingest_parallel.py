@@ -0,0 +1,60 @@
+import numpy as np
+from sqlmodel import select
+
+from app.database.db import get_session
+from app.database.models import Layer, LayerSummary
+from app.services.ingest import ingest_directory_into_group
+from app.services.storage import load_scan_columns, load_weld_columns
+from conftest import write_layers
+
+
+def _fixture(directory):
+    """Junk lines, a layer missing its welddat, an empty layer and a gap in numbering."""
+    write_layers(directory, 5, 1500, seed=4)
+    (directory / "w003_welddat.txt").unlink()
+    (directory / "w004_scandata.txt").write_text("")
+    (directory / "w004_welddat.txt").write_text("junk only\n")
+    (directory / "w005_scandata.txt").rename(directory / "w009_scandata.txt")
+    (directory / "w005_welddat.txt").rename(directory / "w009_welddat.txt")
+    return directory
+
+
+def _stored(group_id):
+    with get_session() as session:
+        layers = session.exec(
+            select(Layer).where(Layer.group_id == group_id).order_by(Layer.layer_number)
+        ).all()
+        out = []
+        for layer in layers:
+            summary = session.get(LayerSummary, layer.id)
+            out.append(
+                (
+                    (layer.layer_number, layer.scandata_file, layer.welddat_file),
+                    load_scan_columns(session, layer.id),
+                    load_weld_columns(session, layer.id),
+                    summary.model_dump(exclude={"layer_id", "group_id"}) if summary else None,
+                )
+            )
+        return out
+
+
+def test_parallel_matches_serial(tmp_path, new_group):
+    data = _fixture(tmp_path / "data")
+    serial, parallel = new_group(), new_group()
+    a = ingest_directory_into_group(str(data), serial, workers=1)
+    b = ingest_directory_into_group(str(data), parallel, workers=2)
+
+    for key in ("created", "skipped", "errors", "details"):
+        assert a[key] == b[key], key
+    assert a["stats"]["rows"] == b["stats"]["rows"]
+    assert {d["status"] for d in a["details"]} == {"created", "error"}
+
+    stored_a, stored_b = _stored(serial), _stored(parallel)
+    assert [s[0] for s in stored_a] == [s[0] for s in stored_b]
+    assert [s[0][0] for s in stored_a] == [1, 2, 4, 9]
+    for (_, scan_a, weld_a, sum_a), (_, scan_b, weld_b, sum_b) in zip(stored_a, stored_b):
+        for cols_a, cols_b in ((scan_a, scan_b), (weld_a, weld_b)):
+            assert cols_a._fields == cols_b._fields
+            for x, y in zip(cols_a, cols_b):
+                np.testing.assert_array_equal(x, y)
+        assert sum_a == sum_b
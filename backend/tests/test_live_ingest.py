@@ -0,0 +1,124 @@
+import os
+import threading
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database.db import get_session
+from app.database.models import LiveSession, _utcnow
+from app.main import app
+from app.services import live_ingest
+from app.services.ingest_jobs import OWNER
+from conftest import write_layers
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def files(tmp_path):
+    """Text of w001_scandata/w001_welddat (300 samples each, no junk)."""
+    directory = write_layers(tmp_path, 1, 300, junk=False)
+    return {
+        kind: (directory / f"w001_{kind}.txt").read_text() for kind in live_ingest.KINDS
+    }
+
+
+def _stream(client, gid, layer_number, files):
+    for kind, text in files.items():
+        # Split mid-line, so the first chunk's last line waits for the second.
+        cut = len(text) // 2 + 3
+        for chunk in (text[:cut], text[cut:]):
+            resp = client.post(f"/api/live/groups/{gid}/layers/{layer_number}/{kind}", content=chunk)
+            assert resp.status_code == 202, resp.text
+    return resp.json()
+
+
+def _set_lease(gid, owner, age=0.0):
+    with get_session() as session:
+        lease = session.get(LiveSession, gid) or LiveSession(group_id=gid, owner=owner)
+        lease.owner = owner
+        lease.heartbeat = _utcnow() - timedelta(seconds=age)
+        session.add(lease)
+        session.commit()
+
+
+def test_stream_into_empty_group(client, files):
+    name = f"live-{os.urandom(4).hex()}"
+    resp = client.post("/api/live/groups", json={"name": name})
+    assert resp.status_code == 201
+    gid = resp.json()["groupId"]
+    assert client.post("/api/live/groups", json={"name": name}).status_code == 409
+
+    assert _stream(client, gid, 1, files)["weld_rows"] == 300
+    resp = client.post(f"/api/live/groups/{gid}/layers/1/finish")
+    assert resp.status_code == 201
+    data = client.get(f"/api/groups/{gid}/data").json()
+    assert [layer["n"] for layer in data["per_layer"]] == [300]
+    assert data["summary"]["n"] == 300
+    assert client.post(f"/api/live/groups/{gid}/layers/1/scandata", content="1 2 3 4\n").status_code == 409
+
+
+def test_finish_does_not_block_other_layers(new_group, files, monkeypatch):
+    gid = new_group()
+    for kind, text in files.items():
+        live_ingest.feed_chunk(gid, 1, kind, text)
+    writing, release = threading.Event(), threading.Event()
+    append_layer = live_ingest.append_layer
+
+    def slow_append(*args, **kwargs):
+        writing.set()
+        assert release.wait(10)
+        return append_layer(*args, **kwargs)
+
+    monkeypatch.setattr(live_ingest, "append_layer", slow_append)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(id=live_ingest.finish_layer(gid, 1)))
+    thread.start()
+    try:
+        assert writing.wait(10)
+        # Layer 1 is being written: another layer still takes chunks, and the
+        # group summary still counts layer 1 exactly once.
+        assert live_ingest.feed_chunk(gid, 2, "welddat", files["welddat"])["weld_rows"] == 300
+        with pytest.raises(ValueError, match="layer_finishing"):
+            live_ingest.feed_chunk(gid, 1, "welddat", "1 2 3 4 5 6 7\n")
+        assert live_ingest.get_live_group(gid).group_rollup().n == 600
+    finally:
+        release.set()
+        thread.join()
+    live = live_ingest.get_live_group(gid)
+    assert result["id"] and not live.finishing and sorted(live.layers) == [2]
+    assert live.stored.n == 300 and live.group_rollup().n == 600
+
+
+def test_failed_finish_keeps_layer_open(new_group, files):
+    gid = new_group()
+    live_ingest.feed_chunk(gid, 1, "welddat", files["welddat"])
+    # The lease moved to another process, which now owns the group's writes.
+    _set_lease(gid, "other")
+    with pytest.raises(ValueError, match="live_group_elsewhere"):
+        live_ingest.finish_layer(gid, 1)
+    live = live_ingest.get_live_group(gid)
+    assert sorted(live.layers) == [1] and not live.finishing
+
+
+def test_group_live_in_another_process(client, new_group, files):
+    gid = new_group()
+    _set_lease(gid, "other")
+    resp = client.post(f"/api/live/groups/{gid}/layers/1/welddat", content=files["welddat"])
+    assert resp.status_code == 409
+    assert client.get(f"/api/live/groups/{gid}").status_code == 409
+
+    # The other process stopped renewing its lease: this one takes over.
+    _set_lease(gid, "other", age=live_ingest.LIVE_SESSION_LEASE + 5)
+    resp = client.post(f"/api/live/groups/{gid}/layers/1/welddat", content=files["welddat"])
+    assert resp.status_code == 202
+    with get_session() as session:
+        assert session.get(LiveSession, gid).owner == OWNER
+
+
+def test_unknown_group(client):
+    assert client.get("/api/live/groups/nope").status_code == 404
@@ -0,0 +1,94 @@
+import io
+
+import numpy as np
+import pytest
+
+from app.utils.parsers import (
+    parse_scandata,
+    parse_scandata_columns,
+    parse_welddat,
+    parse_welddat_columns,
+)
+from conftest import write_layers
+
+SCAN_TEXT = (
+    "1.0, 2.0, 3.0, 4.0, 5.0\n"
+    "\n"
+    "   \n"
+    "1.5 2.5 3.5 4.5\n"  # no V
+    "garbage line here\n"
+    "1,2\n"  # short
+    "1 2 3 abc 5\n"  # junk token
+    "2.0,\t-3.0 ,4e2,  +5.5, 6.25\r\n"  # mixed separators, CRLF
+    "7, 8, 9, 10, 11, 12, 13\n"  # long: extra columns ignored
+    ",,1, 2, 3, 4,\n"  # empty tokens
+    "1.0x 2 3 4\n"
+    "-1e-3 0 0 0 nan\n"
+    "9 9 9 9"  # last line without a newline
+)
+
+WELD_TEXT = (
+    "8.0\t150.0\t22.0\t1.0\t2.0\t3.0\t10.0\n"
+    "\n"
+    "1,2,3,4,5,6\n"  # short
+    "x y\n"
+    "1,2,3,4,5,6,7,8\n"  # long
+    "8.1 151 22.5 1.5 2.5 3.5 abc\n"  # junk token
+    " 8.2 , 152 , 23 , 4 , 5 , 6 , 11 \r\n"
+    "1e1 2e2 3e1 -1 -2 -3 0.5\n"
+    "\t\t\n"
+    "7 7 7 7 7 7 7"  # last line without a newline
+)
+
+
+def _expected(rows, width):
+    """Per-line parser output as a float matrix, None -> NaN."""
+    return np.array(
+        [[np.nan if v is None else v for v in row] for row in rows], dtype=float
+    ).reshape(-1, width)
+
+
+def _assert_same(columns, expected: np.ndarray) -> None:
+    assert len(columns) == expected.shape[1]
+    for i, col in enumerate(columns):
+        assert col.shape == (expected.shape[0],)
+        np.testing.assert_array_equal(np.isnan(col), np.isnan(expected[:, i]))
+        np.testing.assert_array_equal(col, expected[:, i])
+
+
+@pytest.mark.parametrize("as_file", [False, True])
+def test_scandata_columns_match_line_parser(as_file):
+    lines = SCAN_TEXT.splitlines(keepends=True)
+    source = io.StringIO(SCAN_TEXT) if as_file else lines
+    expected = _expected(parse_scandata(lines), 6)
+    assert expected.shape[0] == 7
+    _assert_same(parse_scandata_columns(source), expected)
+
+
+@pytest.mark.parametrize("as_file", [False, True])
+def test_welddat_columns_match_line_parser(as_file):
+    lines = WELD_TEXT.splitlines(keepends=True)
+    source = io.StringIO(WELD_TEXT) if as_file else lines
+    expected = _expected(parse_welddat(lines), 8)
+    assert expected.shape[0] == 5
+    _assert_same(parse_welddat_columns(source), expected)
+
+
+@pytest.mark.parametrize("text", ["", "\n\n", "junk\n1 2\n"])
+def test_nothing_parseable(text):
+    lines = text.splitlines(keepends=True)
+    assert parse_scandata(lines) == [] and parse_welddat(lines) == []
+    assert all(c.shape == (0,) for c in parse_scandata_columns(io.StringIO(text)))
+    assert all(c.shape == (0,) for c in parse_welddat_columns(io.StringIO(text)))
+
+
+def test_generated_files_match(tmp_path):
+    write_layers(tmp_path, 1, 3000)
+    for name, line_parser, column_parser, width in (
+        ("w001_scandata.txt", parse_scandata, parse_scandata_columns, 6),
+        ("w001_welddat.txt", parse_welddat, parse_welddat_columns, 8),
+    ):
+        with open(tmp_path / name) as f:
+            expected = _expected(line_parser(f), width)
+        with open(tmp_path / name) as f:
+            _assert_same(column_parser(f), expected)
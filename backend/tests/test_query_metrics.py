@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app.database.db import engine
+from app.utils.metrics import DB_QUERY_LATENCY
+
+
+def test_failed_statement_leaves_no_timer_behind(new_group):
+    gid = new_group()
+    with engine.connect() as conn:
+        inserts = DB_QUERY_LATENCY.count("INSERT")
+        selects = DB_QUERY_LATENCY.count("SELECT")
+        for _ in range(3):
+            with pytest.raises(IntegrityError):
+                conn.execute(
+                    text("INSERT INTO weldgroup (id, name, ingest_complete, ingest_version) VALUES (:id, 'x', 0, 0)"),
+                    {"id": gid},
+                )
+            conn.rollback()
+        assert conn.execute(text("SELECT count(*) FROM weldgroup WHERE id = :id"), {"id": gid}).scalar() == 1
+        # Failed statements are not timed and leave nothing on the pooled connection.
+        assert DB_QUERY_LATENCY.count("INSERT") == inserts
+        assert DB_QUERY_LATENCY.count("SELECT") >= selects + 1
+        assert not conn.info.get("query_started")
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.utils.rolling import flag_ranges, rolling_zscore
+
+
+def _naive(values, window, min_std):
+    """Per-sample loop over the `window` samples before each one."""
+    n = len(values)
+    mean, std, count, z = (np.full(n, np.nan) for _ in range(4))
+    for i in range(n):
+        prev = [v for v in values[max(0, i - window) : i] if v == v]
+        count[i] = len(prev)
+        if not prev:
+            continue
+        mean[i] = np.mean(prev)
+        std[i] = np.std(prev)
+        if values[i] == values[i]:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z[i] = (values[i] - mean[i]) / np.float64(max(std[i], min_std))
+    return mean, std, count, z
+
+
+def _series(n: int, offset: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vals = offset + rng.normal(0, 1, n)
+    vals[::97] += 25  # spikes
+    vals[5::13] = np.nan
+    vals[300:340] = np.nan  # a gap longer than the window
+    return vals
+
+
+@pytest.mark.parametrize("offset", [0.0, 1e6])
+@pytest.mark.parametrize("window", [1, 5, 32])
+def test_matches_naive(offset, window):
+    values = _series(1000, offset)
+    got = rolling_zscore(values, window)
+    mean, std, count, z = _naive(values, window, 0.0)
+    np.testing.assert_array_equal(got.count, count.astype(np.int64))
+    np.testing.assert_allclose(got.mean, mean, rtol=1e-12, atol=1e-9)
+    # A one-sample window has zero spread; only compare where z is defined.
+    ok = np.isfinite(z)
+    np.testing.assert_array_equal(np.isfinite(got.z), ok)
+    np.testing.assert_allclose(got.std[count > 0], std[count > 0], rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(got.z[ok], z[ok], rtol=1e-6, atol=1e-6)
+
+
+def test_min_std_floors_flat_signal():
+    values = np.r_[np.full(50, 3.0), 4.0]
+    got = rolling_zscore(values, 10, min_std=0.1)
+    mean, std, count, z = _naive(values, 10, 0.1)
+    assert got.z[-1] == pytest.approx(10.0) == z[-1]
+    assert np.isnan(got.z[0])
+    np.testing.assert_allclose(got.z[1:], z[1:], atol=1e-12)
+
+
+def test_spike_not_in_own_baseline():
+    values = np.r_[np.random.default_rng(1).normal(0, 1, 200), 50.0]
+    assert rolling_zscore(values, 100).z[-1] > 20
+
+
+def _naive_ranges(mask, gap):
+    runs = []
+    for i, on in enumerate(mask):
+        if not on:
+            continue
+        if runs and i - runs[-1][1] - 1 <= gap:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return runs
+
+
+@pytest.mark.parametrize("gap", [0, 1, 3])
+def test_flag_ranges(gap):
+    mask = np.random.default_rng(gap).random(500) > 0.8
+    starts, ends = flag_ranges(mask, gap)
+    assert [[s, e] for s, e in zip(starts.tolist(), ends.tolist())] == _naive_ranges(mask, gap)
+    empty = flag_ranges(np.zeros(5, dtype=bool))
+    assert empty[0].size == empty[1].size == 0
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from sqlmodel import delete, select
+
+from app.database.db import get_session
+from app.database.models import Layer, LayerTile, LayerTileRun, WeldGroup
+from app.services import spatial
+from app.services.ingest import append_layer
+from app.services.spatial import Box, build_group_tiles, query_region_json
+from app.utils.parsers import ScanColumns, WeldColumns
+
+
+def _empty_layer():
+    empty = np.empty(0)
+    return (
+        ScanColumns(np.empty(0, dtype=np.int64), *(empty,) * 5),
+        WeldColumns(np.empty(0, dtype=np.int64), *(empty,) * 7),
+    )
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Layers whose samples the index backfill loads."""
+    seen = []
+    load = spatial.load_scan_columns
+
+    def counting(session, layer_id, *seqs):
+        if not seqs:  # a whole layer, not a region query's subset
+            seen.append(layer_id)
+        return load(session, layer_id, *seqs)
+
+    monkeypatch.setattr(spatial, "load_scan_columns", counting)
+    return seen
+
+
+def _markers(gid):
+    with get_session() as session:
+        return dict(
+            session.exec(
+                select(LayerTileRun.layer_id, LayerTileRun.tiles).where(LayerTileRun.group_id == gid)
+            ).all()
+        )
+
+
+def test_empty_layer_is_indexed_once(ingested_group, loads):
+    gid = ingested_group(layers=2, n=500)
+    with get_session() as session:
+        empty = append_layer(session, session.get(WeldGroup, gid), 3, *_empty_layer()).id
+    markers = _markers(gid)
+    assert len(markers) == 3 and markers[empty] == 0
+    for _ in range(2):
+        query_region_json(gid, Box(min_x=0, max_x=20))
+    assert loads == []
+
+
+def test_backfill_marks_layers(ingested_group, loads):
+    gid = ingested_group(layers=3, n=500)
+    with get_session() as session:
+        layers = session.exec(select(Layer).where(Layer.group_id == gid).order_by(Layer.layer_number)).all()
+        ids = [layer.id for layer in layers]
+        tiles = session.exec(select(LayerTile.layer_id).where(LayerTile.group_id == gid)).all()
+        # An index from before the markers, with layer 2 never tiled.
+        session.exec(delete(LayerTileRun).where(LayerTileRun.group_id == gid))
+        session.exec(delete(LayerTile).where(LayerTile.layer_id == ids[1]))
+        session.commit()
+    body = query_region_json(gid, Box())
+    # Only the untiled layer is loaded; the others just get their marker.
+    assert loads == [ids[1]]
+    assert set(_markers(gid)) == set(ids)
+    with get_session() as session:
+        assert build_group_tiles(session, gid) == 0
+        assert len(session.exec(select(LayerTile.layer_id).where(LayerTile.group_id == gid)).all()) == len(tiles)
+    assert query_region_json(gid, Box()) == body
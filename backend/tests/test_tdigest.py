@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from app.utils import tdigest
+from app.utils.tdigest import HistogramSpec
+
+QS = [0.0, 0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999, 1.0]
+
+
+def _values(n: int = 200_000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Skewed and bimodal, like a current trace with arc spikes.
+    return np.concatenate((rng.normal(150, 5, n // 2), rng.lognormal(5.5, 0.4, n - n // 2)))
+
+
+def _rank_error(values: np.ndarray, estimates: np.ndarray) -> np.ndarray:
+    """|empirical CDF at each estimate - its q|."""
+    s = np.sort(values)
+    ranks = (np.searchsorted(s, estimates, "left") + np.searchsorted(s, estimates, "right")) / 2
+    return np.abs(ranks / s.size - np.asarray(QS))
+
+
+def _check(digest, values):
+    est = tdigest.quantiles(digest, QS)
+    assert (est[0], est[-1]) == (values.min(), values.max())
+    assert np.all(np.diff(est) >= 0)
+    err = _rank_error(values, est)
+    # k1 scale: tight in the tails, looser around the median.
+    assert err[[1, 2, -3, -2]].max() < 1e-3
+    assert err.max() < 5e-3
+    # In value terms only away from the sparse extreme tails.
+    np.testing.assert_allclose(est[2:-2], np.quantile(values, QS[2:-2]), rtol=0.02)
+
+
+def test_build_quantiles():
+    values = _values()
+    digest = tdigest.build(values)
+    assert digest.count == values.size
+    assert digest.means.size <= 100
+    assert np.all(np.diff(digest.means) >= 0)
+    _check(digest, values)
+
+
+def test_merge_matches_whole():
+    values = _values(seed=1)
+    # Uneven chunks, as layers of different lengths are.
+    parts = np.split(values, [5_000, 60_000, 61_000, 150_000])
+    merged = tdigest.merge([tdigest.build(p) for p in parts] + [tdigest.EMPTY])
+    assert merged.count == values.size
+    assert merged.means.size <= 100
+    _check(merged, values)
+    # Merging merged digests again (group of groups) stays accurate.
+    twice = tdigest.merge([tdigest.merge([tdigest.build(p)]) for p in parts])
+    _check(twice, values)
+
+
+def test_nan_and_empty():
+    values = _values(10_000)
+    with_nan = values.copy()
+    with_nan[::3] = np.nan
+    digest = tdigest.build(with_nan)
+    assert digest.count == np.count_nonzero(~np.isnan(with_nan))
+    assert np.isnan(tdigest.quantiles(tdigest.build(np.full(4, np.nan)), [0.5])).all()
+    assert tdigest.merge([tdigest.EMPTY, tdigest.EMPTY]) is tdigest.EMPTY
+    assert tdigest.quantiles(tdigest.build(np.array([3.0])), [0.0, 0.5, 1.0]).tolist() == [3.0, 3.0, 3.0]
+
+
+def test_bytes_round_trip():
+    digest = tdigest.build(_values(5_000))
+    back = tdigest.from_bytes(tdigest.to_bytes(digest))
+    np.testing.assert_array_equal(back.means, digest.means)
+    np.testing.assert_array_equal(back.weights, digest.weights)
+    assert (back.min, back.max) == (digest.min, digest.max)
+
+
+def test_histogram_matches_numpy():
+    rng = np.random.default_rng(2)
+    values = np.concatenate((rng.normal(0, 2, 5_000), [np.nan, -10.0, 5.0, 10.0]))
+    spec = HistogramSpec(-5.0, 5.0, 20)
+    counts = tdigest.histogram(values, spec)
+    clean = values[~np.isnan(values)]
+    inside, _ = np.histogram(clean, bins=spec.bins, range=(spec.min, spec.max))
+    assert counts.tolist() == [(clean < -5).sum(), *inside.tolist(), (clean > 5).sum()]
+
+
+def test_infinities():
+    spec = HistogramSpec(0.0, 10.0, 5)
+    with np.errstate(all="raise"):
+        counts = tdigest.histogram(np.array([np.inf, 5.0, -np.inf, np.nan, 10.0]), spec)
+    assert counts.tolist() == [1, 0, 0, 1, 0, 1, 1]
+    digest = tdigest.build(np.array([1.0, 2.0, np.inf, -np.inf, 3.0]))
+    assert digest.count == 3 and (digest.min, digest.max) == (1.0, 3.0)
+    assert np.isfinite(digest.means).all()
+
+
+@pytest.mark.parametrize("compression", [25.0, 200.0])
+def test_compression_bounds_centroids(compression):
+    digest = tdigest.build(_values(50_000), compression)
+    assert digest.means.size <= compression
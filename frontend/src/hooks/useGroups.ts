@@ -1,6 +1,7 @@
 import { useQuery } from "@tanstack/react-query";
 import { api } from "../lib/api";
-import { type Group, type GroupData } from "../lib/types";
+import { decodeSsal, LAYER_BINARY_MEDIA_TYPE } from "../lib/layerBinary";
+import { type Group, type GroupData, type VoxelCloud } from "../lib/types";
 
 export function useGroups(
   options?: {
@@ -42,4 +43,27 @@ export function useGroupData(groupId?: string) {
     },
     enabled: !!groupId,
   });
+}
+
+// Whole-part voxel cloud for the 3D view, fetched as one packed SSAL payload.
+export function useGroupVoxels(groupId?: string, voxelSize: number = 2) {
+  return useQuery({
+    queryKey: ["groupVoxels", groupId, voxelSize],
+    queryFn: async (): Promise<VoxelCloud> => {
+      const { data } = await api.get<ArrayBuffer>(`/groups/${groupId}/voxels`, {
+        params: { voxel_size: voxelSize },
+        headers: { Accept: LAYER_BINARY_MEDIA_TYPE },
+        responseType: "arraybuffer",
+      });
+      const { header, tables } = decodeSsal(data);
+      return {
+        group_id: header.group_id as string,
+        voxel_size: header.voxel_size as number,
+        count: header.count as number,
+        columns: tables.voxels as VoxelCloud["columns"],
+      };
+    },
+    enabled: !!groupId,
+    staleTime: Infinity,
+  });
 }
\ No newline at end of file
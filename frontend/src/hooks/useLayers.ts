@@ -1,6 +1,6 @@
 import { useQuery } from "@tanstack/react-query";
 import { api } from "../lib/api";
-import { type Layer, type LayerData } from "../lib/types";
+import { type Layer, type LayerData, type LayersData } from "../lib/types";
 
 export function useLayer(layerId?: string) {
   return useQuery({
@@ -13,13 +13,45 @@ export function useLayer(layerId?: string) {
   });
 }
 
-export function useLayerData(layerId?: string) {
+// Server-side downsampling target for the chart and 3D scene.
+const LAYER_MAX_POINTS = 5000;
+
+export function useLayerData(layerId?: string, maxPoints: number = LAYER_MAX_POINTS) {
   return useQuery({
-    queryKey: ["layerData", layerId],
+    queryKey: ["layerData", layerId, maxPoints],
     queryFn: async () => {
-      const { data } = await api.get<LayerData>(`/layers/${layerId}/data`);
+      const { data } = await api.get<LayerData>(`/layers/${layerId}/data`, {
+        params: { max_points: maxPoints },
+      });
       return data;
     },
     enabled: !!layerId,
   });
 }
+
+export type LayerSelection = {
+  layerIds?: string[];
+  layerMin?: number;
+  layerMax?: number;
+};
+
+// Several layers of a group in one request (e.g. for layer comparisons).
+export function useLayersData(
+  groupId?: string,
+  selection: LayerSelection = {},
+  maxPoints: number = LAYER_MAX_POINTS
+) {
+  const { layerIds, layerMin, layerMax } = selection;
+  return useQuery({
+    queryKey: ["layersData", groupId, layerIds, layerMin, layerMax, maxPoints],
+    queryFn: async () => {
+      const params = new URLSearchParams({ max_points: String(maxPoints) });
+      layerIds?.forEach((id) => params.append("layer_ids", id));
+      if (layerMin !== undefined) params.set("layer_min", String(layerMin));
+      if (layerMax !== undefined) params.set("layer_max", String(layerMax));
+      const { data } = await api.get<LayersData>(`/groups/${groupId}/layers/data`, { params });
+      return data;
+    },
+    enabled: !!groupId,
+  });
+}
@@ -0,0 +1,79 @@
+import { useEffect, useRef, useState } from "react";
+import { useQueryClient } from "@tanstack/react-query";
+import { api } from "../lib/api";
+import {
+  type LiveChunk,
+  type LiveLayerFinished,
+  type LiveLayerState,
+  type LiveSnapshot,
+  type WeldDataSummary,
+} from "../lib/types";
+
+export type LiveGroupState = {
+  connected: boolean;
+  layers: Record<number, LiveLayerState>;
+  groupSummary?: WeldDataSummary;
+  lastChunk?: LiveChunk;
+};
+
+// Subscribes to a group's live ingest events. Open layers and the running
+// group summary are kept in state; when a layer is stored, the group queries
+// are invalidated so the regular views pick it up.
+export function useLiveGroup(groupId?: string, onChunk?: (chunk: LiveChunk) => void) {
+  const queryClient = useQueryClient();
+  const [state, setState] = useState<LiveGroupState>({ connected: false, layers: {} });
+  const onChunkRef = useRef(onChunk);
+  onChunkRef.current = onChunk;
+
+  useEffect(() => {
+    if (!groupId) return;
+    const source = new EventSource(`${api.defaults.baseURL}/live/groups/${groupId}/events`);
+
+    source.onopen = () => setState((s) => ({ ...s, connected: true }));
+    source.onerror = () => setState((s) => ({ ...s, connected: false }));
+
+    source.addEventListener("snapshot", (e) => {
+      const snap: LiveSnapshot = JSON.parse((e as MessageEvent).data);
+      setState({
+        connected: true,
+        layers: Object.fromEntries(snap.layers.map((l) => [l.layer_number, l])),
+        groupSummary: snap.group_summary,
+      });
+    });
+
+    source.addEventListener("chunk", (e) => {
+      const chunk: LiveChunk = JSON.parse((e as MessageEvent).data);
+      onChunkRef.current?.(chunk);
+      setState((s) => ({
+        ...s,
+        layers: {
+          ...s.layers,
+          [chunk.layer_number]: {
+            layer_number: chunk.layer_number,
+            scan_rows: chunk.scan_rows,
+            weld_rows: chunk.weld_rows,
+            summary: chunk.layer_summary,
+          },
+        },
+        groupSummary: chunk.group_summary,
+        lastChunk: chunk,
+      }));
+    });
+
+    source.addEventListener("layer_finished", (e) => {
+      const done: LiveLayerFinished = JSON.parse((e as MessageEvent).data);
+      setState((s) => {
+        const layers = { ...s.layers };
+        delete layers[done.layer_number];
+        return { ...s, layers, groupSummary: done.group_summary };
+      });
+      queryClient.invalidateQueries({ queryKey: ["group", groupId] });
+      queryClient.invalidateQueries({ queryKey: ["groupMetrics", groupId] });
+      queryClient.invalidateQueries({ queryKey: ["groups"] });
+    });
+
+    return () => source.close();
+  }, [groupId, queryClient]);
+
+  return state;
+}
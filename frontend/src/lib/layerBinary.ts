@@ -0,0 +1,73 @@
+import type { WeldDataSummary } from "./types";
+
+// Decoder for the packed "SSAL" v1 layer payload returned by
+// GET /api/layers/{layer_id}/data with `Accept: LAYER_BINARY_MEDIA_TYPE`.
+// Layout is documented in backend/app/utils/binary_format.py.
+
+export const LAYER_BINARY_MEDIA_TYPE = "application/vnd.ssa.layer+octet-stream";
+
+type ColumnInfo = {
+  table: string;
+  name: string;
+  dtype: "<u4" | "<f4";
+  offset: number;
+  length: number;
+};
+
+export type LayerColumns = {
+  layer_id: string;
+  group_id: string;
+  layer_number: number;
+  summary: WeldDataSummary;
+  // table name ("scan_data" | "weld_data") -> column name -> typed array (NaN = null)
+  tables: SsalTables;
+};
+
+type SsalTables = Record<string, Record<string, Uint32Array | Float32Array>>;
+
+// Generic SSAL decoding: the JSON header (minus `columns`) plus the tables.
+export function decodeSsal(buf: ArrayBuffer): {
+  header: Record<string, unknown>;
+  tables: SsalTables;
+} {
+  const view = new DataView(buf);
+  const magic = String.fromCharCode(
+    view.getUint8(0),
+    view.getUint8(1),
+    view.getUint8(2),
+    view.getUint8(3)
+  );
+  const version = view.getUint16(4, true);
+  if (magic !== "SSAL" || version !== 1) {
+    throw new Error("Unsupported layer payload");
+  }
+  const headerLen = view.getUint32(8, true);
+  const header = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buf, 12, headerLen))
+  );
+
+  const tables: SsalTables = {};
+  for (const col of header.columns as ColumnInfo[]) {
+    const arr =
+      col.dtype === "<u4"
+        ? new Uint32Array(buf, col.offset, col.length)
+        : new Float32Array(buf, col.offset, col.length);
+    (tables[col.table] ??= {})[col.name] = arr;
+  }
+  delete header.columns;
+  return { header, tables };
+}
+
+export function decodeLayerBinary(buf: ArrayBuffer): LayerColumns {
+  const { header, tables } = decodeSsal(buf) as {
+    header: Omit<LayerColumns, "tables">;
+    tables: SsalTables;
+  };
+  return {
+    layer_id: header.layer_id,
+    group_id: header.group_id,
+    layer_number: header.layer_number,
+    summary: header.summary,
+    tables,
+  };
+}
@@ -51,6 +51,14 @@ export interface WeldData {
   travel_speed?: number;
   voltage?: number;
   current?: number;
+  // `?process=true`: per-sample power and heat input; the rest are running
+  // totals from the layer's first sample.
+  arc_power_w?: number | null;
+  heat_input_j_mm?: number | null;
+  arc_energy_j?: number | null;
+  wire_length_mm?: number | null;
+  deposited_mass_g?: number | null;
+  path_length_mm?: number | null;
 }
 
 export type ScanData = {
@@ -70,11 +78,217 @@ export interface LayerData {
   weld_data: WeldData[];
   scan_data: ScanData[];
   summary: WeldDataSummary;
+  distributions?: Distributions;
+  process?: ProcessMetrics;
 }
 
+// `?process=true` on the data endpoints; constants in process_vars.json.
+export type ProcessMetrics = {
+  samples: number;
+  arc_time_s: number;
+  arc_energy_j: number;
+  arc_power_avg_w: number | null;
+  arc_power_max_w: number | null;
+  heat_input_avg_j_mm: number | null;
+  heat_input_max_j_mm: number | null;
+  wire_length_mm: number;
+  deposited_mass_g: number;
+  deposition_rate_g_s: number | null;
+  path_length_mm: number;
+};
+
+export type LayerProcessMetrics = ProcessMetrics & { layer_id: string; layer_number: number };
+
+// `?distributions=true` on the data endpoints.
+export type MetricDistribution = {
+  n: number;
+  percentiles: Record<string, number | null>;
+  histogram: {
+    min: number;
+    max: number;
+    bins: number;
+    counts: number[];
+    underflow: number;
+    overflow: number;
+  };
+};
+
+export type Distributions = Record<MetricKey, MetricDistribution>;
+
+// GET /api/groups/{id}/layers/data: one LayerData per selected layer.
+export type LayersData = {
+  group_id: string;
+  count: number;
+  layers: LayerData[];
+};
+
 export type GroupData = {
   group_id: string;
   name?: string;
   summary: WeldDataSummary;
   per_layer: WeldDataSummary[];
-};
\ No newline at end of file
+  distributions?: Distributions;
+  process?: { summary: ProcessMetrics; per_layer: LayerProcessMetrics[] };
+};
+
+// GET /api/layers/{id}/anomalies and /api/groups/{id}/anomalies
+export type Anomaly = {
+  layer_id: string;
+  layer_number: number;
+  metric: MetricKey;
+  direction: "high" | "low";
+  start_seq: number;
+  end_seq: number;
+  samples: number;
+  peak_seq: number;
+  peak_value: number;
+  peak_z: number;
+  baseline_mean: number;
+  baseline_std: number;
+};
+
+export type GroupAnomalies = {
+  group_id: string;
+  total: number;
+  by_metric: Partial<Record<MetricKey, number>>;
+  truncated: boolean;
+  anomalies: Anomaly[];
+};
+
+// GET /api/layers/{id}/correlation and /api/groups/{id}/correlation
+export type CorrelationStats = {
+  n: number;
+  r: number | null;
+  slope: number | null;
+  intercept: number | null;
+};
+
+export type CorrelationPoint = {
+  seq: number;
+  x: number;
+  y: number;
+  z: number;
+  scan_value: number | null;
+  weld_seq: number;
+  distance: number;
+} & Record<MetricKey, number | null>;
+
+type CorrelationSummary = {
+  tolerance: number;
+  scan_count: number;
+  weld_count: number;
+  matched: number;
+  match_rate: number | null;
+  mean_distance: number | null;
+  max_distance: number | null;
+  correlation: Record<MetricKey, CorrelationStats>;
+};
+
+export type LayerCorrelation = CorrelationSummary & {
+  layer_id: string;
+  group_id: string;
+  layer_number: number;
+  points?: CorrelationPoint[];
+};
+
+export type GroupCorrelation = CorrelationSummary & {
+  group_id: string;
+  layers: LayerCorrelation[];
+};
+
+// GET /api/layers/{id}/heightmap and /api/groups/{id}/heightmaps; grids are
+// row-major ny x nx, null = empty cell.
+export type HeightStats = {
+  cells: number;
+  area: number;
+  mean: number | null;
+  std: number | null;
+  min: number | null;
+  max: number | null;
+  rms: number | null;
+};
+
+export type HeightmapLayer = {
+  layer_id: string;
+  layer_number: number;
+  stats: HeightStats;
+  previous_layer_id: string | null;
+  delta_stats: HeightStats | null;
+  heights: (number | null)[];
+  delta?: (number | null)[];
+};
+
+type HeightmapExtent = {
+  cell: number;
+  ix0: number;
+  iy0: number;
+  nx: number;
+  ny: number;
+  x0: number;
+  y0: number;
+};
+
+export type LayerHeightmap = HeightmapLayer & HeightmapExtent & { group_id: string };
+
+export type HeightmapStack = HeightmapExtent & {
+  group_id: string;
+  count: number;
+  layers: HeightmapLayer[];
+};
+
+// GET /api/groups/{id}/voxels; NaN in a metric column means no samples.
+export type VoxelCloud = {
+  group_id: string;
+  voxel_size: number;
+  count: number;
+  columns: Record<
+    | "x" | "y" | "z" | "n"
+    | "wire_feed_rate" | "travel_speed" | "voltage" | "current" | "scan_value",
+    Float32Array
+  >;
+};
+
+// Server-sent events from GET /api/live/groups/{id}/events.
+export type LiveLayerState = {
+  layer_number: number;
+  scan_rows: number;
+  weld_rows: number;
+  summary: WeldDataSummary;
+};
+
+export type LiveSnapshot = {
+  group_id: string;
+  watching: string | null;
+  layers: LiveLayerState[];
+  group_summary: WeldDataSummary;
+};
+
+// One parsed batch of lines; point columns depend on `kind`.
+export type LiveChunk = {
+  group_id: string;
+  layer_number: number;
+  kind: "scandata" | "welddat";
+  count: number;
+  scan_rows: number;
+  weld_rows: number;
+  seq: number[];
+  x: number[];
+  y: number[];
+  z: number[];
+  scan_value?: (number | null)[];
+  wire_feed_rate?: (number | null)[];
+  travel_speed?: (number | null)[];
+  voltage?: (number | null)[];
+  current?: (number | null)[];
+  layer_summary: WeldDataSummary;
+  group_summary: WeldDataSummary;
+};
+
+export type LiveLayerFinished = {
+  group_id: string;
+  layer_number: number;
+  layer_id: string;
+  scan_rows: number;
+  weld_rows: number;
+  group_summary: WeldDataSummary;
+};